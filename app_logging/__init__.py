@@ -1,3 +1,3 @@
 from .db import SessionLocal
-from .service import save_attack_log, get_attack_logs
+from .service import save_attack_log, get_attack_logs, save_attack_log_async, save_attack_logs_bulk_async, get_attack_logs_async, get_attack_log_rows_async
 from .router import router
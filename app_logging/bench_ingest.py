@@ -0,0 +1,107 @@
+# bench_ingest.py（在專案根目錄執行：python -m app_logging.bench_ingest）
+
+"""
+比較同時寫入 N 筆攻擊紀錄時：
+
+- sync ：在 async 函式裡直接呼叫同步的 save_attack_log（舊的 report_attack 寫法）
+- async：用 AsyncSession 的 save_attack_log_async（現在的 router 寫法）
+
+除了總時間，也量 event loop 的最大延遲：另外跑一個每 5 ms 醒來一次的 task，
+看它最晚晚了多久才被排到。同步寫法每次 commit 都卡住整個 event loop，延遲會跟著筆數變大。
+
+預設用暫存的 SQLite 檔（需要 aiosqlite）；要測 MySQL 就先設定 LOGGING_DB_URL。
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_TMP_DIR = None
+if "LOGGING_DB_URL" not in os.environ:
+    _TMP_DIR = tempfile.TemporaryDirectory()
+    os.environ["LOGGING_DB_URL"] = f"sqlite:///{os.path.join(_TMP_DIR.name, 'bench.db')}"
+
+from app_logging.db import Base, SessionLocal, dispose_async_engine, engine, get_async_sessionmaker  # noqa: E402
+from app_logging.service import save_attack_log, save_attack_log_async  # noqa: E402
+
+_FIELDS = dict(
+    ip_address="1.2.3.4",
+    url="/api/login",
+    payload="' OR 1=1 --",
+    attack_type="SQLI",
+    severity="HIGH",
+    user_agent="bench",
+)
+
+
+async def _heartbeat(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """回傳 event loop 最大延遲（秒）。"""
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - expected)
+    return worst
+
+
+async def ingest_sync(n: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            db = SessionLocal()
+            try:
+                save_attack_log(db, **_FIELDS)   # 卡住 event loop
+            finally:
+                db.close()
+
+    await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def ingest_async(n: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    sessionmaker = get_async_sessionmaker()
+
+    async def one():
+        async with sem:
+            async with sessionmaker() as db:
+                await save_attack_log_async(db, **_FIELDS)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def _measure(func, n: int, concurrency: int):
+    stop = asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(stop))
+    start = time.perf_counter()
+    await func(n, concurrency)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await beat
+
+
+async def main_async(n: int, concurrency: int) -> None:
+    for name, func in (("sync ", ingest_sync), ("async", ingest_async)):
+        elapsed, lag = await _measure(func, n, concurrency)
+        print(
+            f"{name} n={n:<6} concurrency={concurrency:<4} "
+            f"{n / elapsed:8.0f} rows/s   max event-loop lag={lag * 1000:8.1f} ms"
+        )
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sync vs async ingest into attack_logs")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(main_async(args.rows, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
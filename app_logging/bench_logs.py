@@ -0,0 +1,105 @@
+# bench_logs.py（在專案根目錄執行：python -m app_logging.bench_logs）
+
+"""
+比較 /api/logs 的兩種輸出方式（limit 筆）：
+
+- orm ：查 AttackLog ORM 物件 → 逐筆 AttackLogOut.from_orm → jsonable_encoder → json.dumps
+        （原本 response_model=List[AttackLogOut] 時 FastAPI 做的事）
+- fast：只選需要的欄位（tuple）→ fast_json.dumps_rows（有 orjson 就用 orjson）
+
+兩邊的輸出會先比對一次，確定 JSON 內容一樣。
+預設用暫存的 SQLite 檔（需要 aiosqlite）；要測 MySQL 就先設定 LOGGING_DB_URL。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_TMP_DIR = None
+if "LOGGING_DB_URL" not in os.environ:
+    _TMP_DIR = tempfile.TemporaryDirectory()
+    os.environ["LOGGING_DB_URL"] = f"sqlite:///{os.path.join(_TMP_DIR.name, 'bench.db')}"
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app_logging.db import Base, dispose_async_engine, engine, get_async_sessionmaker  # noqa: E402
+from app_logging.fast_json import dumps_rows, orjson  # noqa: E402
+from app_logging.router import AttackLogOut  # noqa: E402
+from app_logging.service import (  # noqa: E402
+    LOG_COLUMNS,
+    get_attack_log_rows_async,
+    get_attack_logs_async,
+    save_attack_logs_bulk_async,
+)
+
+
+async def seed(n: int) -> None:
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "timestamp": now - timedelta(seconds=i),
+            "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "url": f"/api/search?q={i}",
+            "payload": rng.choice(["' OR 1=1 --", "<script>alert(1)</script>", "../../etc/passwd", f"id={i}"]),
+            "attack_type": rng.choice(["SQLI", "XSS", "PATH_TRAVERSAL"]),
+            "severity": rng.choice(["HIGH", "MEDIUM", "LOW"]),
+            "user_agent": rng.choice(["sqlmap/1.7", "Mozilla/5.0", "curl/8.0"]),
+        }
+        for i in range(n)
+    ]
+    async with get_async_sessionmaker()() as db:
+        await save_attack_logs_bulk_async(db, rows)
+
+
+async def orm_path(limit: int) -> bytes:
+    async with get_async_sessionmaker()() as db:
+        logs = await get_attack_logs_async(db, limit=limit)
+    out = [AttackLogOut.from_orm(log) for log in logs]
+    return json.dumps(jsonable_encoder(out), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def fast_path(limit: int) -> bytes:
+    async with get_async_sessionmaker()() as db:
+        rows = await get_attack_log_rows_async(db, limit=limit)
+    return dumps_rows(LOG_COLUMNS, rows)
+
+
+async def _time(func, limit: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func(limit)
+    return (time.perf_counter() - start) / repeat
+
+
+async def main_async(rows: int, limits, repeat: int) -> None:
+    await seed(rows)
+    for limit in limits:
+        assert json.loads(await orm_path(limit)) == json.loads(await fast_path(limit)), "output differs"
+        orm = await _time(orm_path, limit, repeat)
+        fast = await _time(fast_path, limit, repeat)
+        print(
+            f"limit={limit:<6} orm {orm * 1000:8.2f} ms   fast {fast * 1000:8.2f} ms   "
+            f"x{orm / fast:5.1f}   (orjson={'yes' if orjson else 'no'})"
+        )
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/logs serialization: ORM + Pydantic vs tuples + fast JSON")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(main_async(args.rows, args.limits, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import AttackLog
+
+# 瀏覽器每次都要回來問（帶 If-None-Match），沒變就拿 304
+CACHE_CONTROL = "no-cache"
+
+
+async def logs_version(db: AsyncSession) -> str:
+    """
+    attack_logs 目前的「版本」：MAX(id) + COUNT(*) + MIN(id)。
+    有新資料 → MAX(id) 變；刪掉任何一筆（保留期限、DROP PARTITION、中間的 DELETE）→ COUNT(*) 變。
+    只看 MAX / MIN 的話，刪掉中間的資料頭尾都不會變，前端會一直拿到 304 和舊的列表。
+    COUNT(*) 要掃一次索引（InnoDB 會挑最小的二級索引），但比重新查詢 + 序列化一整頁便宜得多。
+    """
+    max_id, count, min_id = (await db.execute(
+        select(func.max(AttackLog.id), func.count(), func.min(AttackLog.id)).select_from(AttackLog)
+    )).one()
+    return f"{max_id or 0}-{count}-{min_id or 0}"
+
+
+def make_etag(*parts) -> str:
+    """
+    由資料版本 + 查詢參數組成的 ETag。用弱 ETag（W/）：
+    內容一樣但經過 gzip 之後 bytes 不同，仍然算同一份。
+    """
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match 跟 etag 一樣就回 304（完全不查資料、不序列化），否則回傳 None。"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    current = _strip_weak(etag)
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or _strip_weak(tag) == current:
+            return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
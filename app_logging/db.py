@@ -1,4 +1,7 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # ===== 請改成你們自己的 MySQL 設定 =====
@@ -9,15 +12,58 @@ MYSQL_PORT = 3306
 MYSQL_DB = "security_demo"      # 你們建 attack_logs 那個 DB 名稱
 # ====================================
 
-SQLALCHEMY_DATABASE_URL = (
+# 也可以用環境變數 LOGGING_DB_URL 整個換掉，例如本機測試用 SQLite：
+#   LOGGING_DB_URL=sqlite:///./attack_logs.db
+SQLALCHEMY_DATABASE_URL = os.environ.get(
+    "LOGGING_DB_URL",
     f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}"
-    f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
+    f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4",
 )
 
-# 建立 Engine
+# ===== 連線池大小（同步 / 非同步 engine 共用） =====
+DB_POOL_SIZE = 10          # 常駐連線數
+DB_MAX_OVERFLOW = 20       # 尖峰時最多再多開幾條
+DB_POOL_TIMEOUT = 30       # 等不到連線幾秒就放棄
+DB_POOL_RECYCLE = 1800     # 連線用多久就重建（避免 MySQL wait_timeout 斷線）
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _pool_options(url: str) -> dict:
+    # SQLite 用 SQLAlchemy 預設的 pool，不支援這些參數；FastAPI 會在不同執行緒使用同一條連線
+    if _is_sqlite(url):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_pre_ping": True,       # 斷線自動偵測
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def to_async_url(url: str) -> str:
+    """
+    同步 URL → 非同步 driver 的 URL：
+      mysql+pymysql://...  → mysql+aiomysql://...
+      sqlite:///...        → sqlite+aiosqlite:///...
+    """
+    if url.startswith("mysql+pymysql://") or url.startswith("mysql://"):
+        return "mysql+aiomysql://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+
+# 非同步 engine 的 URL（預設由同步 URL 換 driver 而來，也可用 LOGGING_ASYNC_DB_URL 指定）
+ASYNC_DATABASE_URL = os.environ.get("LOGGING_ASYNC_DB_URL", to_async_url(SQLALCHEMY_DATABASE_URL))
+
+# 建立 Engine（同步：給 create_all / reset_db.py / 舊的同步 service 使用）
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,       # 斷線自動偵測
+    **_pool_options(SQLALCHEMY_DATABASE_URL),
 )
 
 # 建立 Session 工廠
@@ -25,3 +71,41 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Base 給 models 繼承
 Base = declarative_base()
+
+
+# ===== 非同步 engine / session（router 的 API 使用，不會卡住 event loop） =====
+# 第一次用到才建立：只用同步功能（例如 reset_db.py）時不需要安裝 aiomysql / aiosqlite
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            **_pool_options(ASYNC_DATABASE_URL),
+        )
+    return _async_engine
+
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        _async_sessionmaker = async_sessionmaker(
+            get_async_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    """關閉服務時呼叫，把非同步連線池收乾淨。"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
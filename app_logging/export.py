@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Sequence
+
+from .db import get_async_sessionmaker
+from .models import AttackLog
+from .service import LOG_COLUMNS, select_log_columns
+
+EXPORT_BATCH_ROWS = 1000      # server-side cursor 一次拿幾筆（yield_per）
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+
+COLUMNS = LOG_COLUMNS
+
+_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportError(ValueError):
+    """格式不支援 / 缺少選用套件（pyarrow）。"""
+
+
+def _export_query(since: Optional[datetime], until: Optional[datetime]):
+    # 只選需要的欄位（tuple），不建立 ORM 物件；依 id 排序 = 依寫入順序
+    query = select_log_columns().order_by(AttackLog.id)
+    if since is not None:
+        query = query.where(AttackLog.timestamp >= since)
+    if until is not None:
+        query = query.where(AttackLog.timestamp < until)
+    return query
+
+
+async def iter_row_batches(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[List[Sequence]]:
+    """
+    用 server-side cursor 一批一批讀出來（每批 batch_rows 筆），記憶體用量跟總筆數無關。
+    自己開 session：StreamingResponse 送資料時，request 的 dependency 可能已經結束了。
+    """
+    query = _export_query(since, until).execution_options(yield_per=batch_rows)
+    async with get_async_sessionmaker()() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions(batch_rows):
+            yield partition
+
+
+# ---------- 各種格式：每批 rows → bytes ----------
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def encode_ndjson(rows: Iterable[Sequence]) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(zip(COLUMNS, row))
+        record["timestamp"] = _iso(record["timestamp"])
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+
+def encode_csv(rows: Iterable[Sequence], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(COLUMNS)
+    for row in rows:
+        row = list(row)
+        row[1] = _iso(row[1])
+        writer.writerow(row)
+    return buf.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """給 ParquetWriter 寫的假檔案：寫進來的 bytes 暫存，每個 row group 寫完就被 take() 拿走。"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _require_pyarrow():
+    # 選用套件：只有要匯出 parquet 才需要
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("parquet export requires pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+async def _parquet_chunks(pa, pq, batches: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("ip_address", pa.string()),
+        ("url", pa.string()),
+        ("payload", pa.string()),
+        ("attack_type", pa.string()),
+        ("severity", pa.string()),
+        ("user_agent", pa.string()),
+    ])
+    sink = _ChunkSink()
+    # 每批一個 row group，寫完就送出；欄位已經用 parquet 自己的壓縮
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    async for rows in batches:
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+async def _text_chunks(fmt: str, batches: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    first = True
+    async for rows in batches:
+        if fmt == "csv":
+            yield encode_csv(rows, header=first)
+        else:
+            yield encode_ndjson(rows)
+        first = False
+    if fmt == "csv" and first:
+        yield encode_csv([], header=True)   # 沒有資料也給表頭
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 → gzip 格式
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(
+    fmt: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = True,
+) -> AsyncIterator[bytes]:
+    """
+    匯出 attack_logs 的 bytes 串流（給 StreamingResponse）。
+    parquet 本身是壓縮過的欄式格式，不會再包 gzip。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"unknown export format: {fmt!r} (use {', '.join(EXPORT_FORMATS)})")
+    if fmt == "parquet":
+        # 先確認有 pyarrow：開始串流之後就沒辦法回 400 了
+        pa, pq = _require_pyarrow()
+        return _parquet_chunks(pa, pq, iter_row_batches(since, until))
+    batches = iter_row_batches(since, until)
+    chunks = _text_chunks(fmt, batches)
+    return _gzip(chunks) if gzip else chunks
+
+
+def export_filename(fmt: str, gzip: bool) -> str:
+    suffix = ".gz" if gzip and fmt != "parquet" else ""
+    return f"attack_logs.{fmt}{suffix}"
+
+
+def export_media_type(fmt: str, gzip: bool) -> str:
+    if gzip and fmt != "parquet":
+        return "application/gzip"
+    return _MEDIA_TYPES[fmt]
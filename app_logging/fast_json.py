@@ -0,0 +1,27 @@
+import json
+from datetime import datetime
+from typing import Iterable, List, Sequence
+
+# 選用套件：有裝 orjson 就用它（C 實作，datetime 直接支援），沒有就用標準 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    """輸出跟 FastAPI 的 JSONResponse 一樣：緊湊、不跳脫中文、datetime 用 isoformat。"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps_rows(columns: List[str], rows: Iterable[Sequence]) -> bytes:
+    """tuple 列 → JSON 陣列（每列一個物件，key 順序跟 columns 一樣）。"""
+    return dumps([dict(zip(columns, row)) for row in rows])
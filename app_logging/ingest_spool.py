@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from common.spool import Spool
+
+from .db import get_async_sessionmaker
+from .service import from_epoch_ns, save_attack_logs_bulk_async
+
+# ===== DB 掛掉時的本機暫存（spool） =====
+LOGGING_SPOOL_DIR = os.environ.get("LOGGING_SPOOL_DIR", os.path.join("spool", "ingest"))
+DRAIN_BATCH_ROWS = 500        # 重送時一次 INSERT 幾筆
+DRAIN_INTERVAL = 1.0          # 每幾秒檢查一次有沒有要重送的分段
+DB_RETRY_SECONDS = 5.0        # DB 寫入失敗後，這段時間內新的事件直接進 spool，不再等 DB timeout
+# ingest API 等 DB 寫入最多幾秒，超過就改寫 spool（不然每個 request 要等到連線池 / driver 的 timeout）
+INGEST_DB_TIMEOUT = float(os.environ.get("LOGGING_INGEST_DB_TIMEOUT", "0.5"))
+INGEST_BULK_DB_TIMEOUT = float(os.environ.get("LOGGING_INGEST_BULK_DB_TIMEOUT", "5"))   # /api/report-attacks 一整批
+
+# 視為「DB 無法使用」的錯誤（連線失敗、逾時、連線池等不到連線…）
+DB_ERRORS = (SQLAlchemyError, OSError, asyncio.TimeoutError)
+
+
+class IngestSpool:
+    """
+    /api/report-attack 寫不進 DB 時的退路：
+
+    - 寫入失敗 → 事件寫進本機 spool，API 回 202，並在 DB_RETRY_SECONDS 內跳過 DB
+      （DB 掛掉時 ingest 的延遲維持平穩，不會每筆都卡到連線逾時）
+    - 背景 drainer 每 DRAIN_INTERVAL 秒把已封存的分段批次 INSERT 回 DB，成功才刪掉分段
+    """
+
+    def __init__(self, directory: str = LOGGING_SPOOL_DIR):
+        self.spool = Spool(directory)
+        self._db_down_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.drained = 0
+        self.late_writes = 0    # 超過 ingest timeout 之後才寫完的次數
+
+    # ---------- ingest 路徑 ----------
+
+    def db_available(self) -> bool:
+        return time.monotonic() >= self._db_down_until
+
+    def mark_db_down(self) -> None:
+        self._db_down_until = time.monotonic() + DB_RETRY_SECONDS
+
+    def spool_row(self, row: Dict) -> bool:
+        """
+        row 的 key 跟 AttackLog 欄位一樣，時間用 detected_at_ns（epoch 奈秒）；
+        沒有偵測時間就用現在，重送時才不會變成「重送當下」的時間。
+        """
+        record = dict(row)
+        record["detected_at_ns"] = record.get("detected_at_ns") or time.time_ns()
+        return self.spool.append(record)
+
+    async def write(self, write: Callable[[Any], Awaitable], rows: List[Dict], timeout: float):
+        """
+        用自己的 session 執行 write(db)，最多等 timeout 秒：
+        - 時間內寫完 → 回傳 write 的結果；寫入失敗 → 丟出原本的例外（呼叫端改寫 spool）
+        - 逾時 → 回傳 None，寫入用 asyncio.shield 保護、繼續在背景跑完（不會在 commit 中途被取消）；
+          最後成功就什麼都不用做，失敗才把 rows 寫進 spool，不會重複也不會遺失
+        request 被取消（client 斷線）時也一樣讓寫入跑完。
+        """
+        task = asyncio.ensure_future(_in_session(write))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.mark_db_down()
+            task.add_done_callback(lambda t: self._spool_if_failed(t, rows))
+            return None
+        except asyncio.CancelledError:
+            task.add_done_callback(lambda t: self._spool_if_failed(t, rows))
+            raise
+
+    def _spool_if_failed(self, task: "asyncio.Future", rows: List[Dict]) -> None:
+        if not task.cancelled() and task.exception() is None:
+            self.late_writes += 1
+            return
+        self.mark_db_down()
+        for row in rows:
+            self.spool_row(row)
+
+    # ---------- 背景重送 ----------
+
+    async def start(self) -> None:
+        self.spool.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.spool.stop()
+
+    async def _drain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(DRAIN_INTERVAL)
+            if self.db_available():
+                await self.drain_once()
+
+    async def drain_once(self) -> int:
+        """把目前已封存的分段依序寫回 DB；DB 還是不行就停下來，下次再試。"""
+        total = 0
+        for path in self.spool.segments():
+            # 一段最多 4 MB 的 JSON，讀檔 + 解析丟到執行緒，不卡 event loop
+            # （asyncio.to_thread 要 Python 3.9，這裡用 run_in_executor）
+            rows = await asyncio.get_running_loop().run_in_executor(None, _read_rows, path)
+            try:
+                # 一個分段一個交易：失敗就整段 rollback，下次整段重送，不會重複寫入
+                total += await _insert_rows(rows)
+            except DB_ERRORS:
+                self.mark_db_down()
+                break
+            Spool.ack(path)
+        self.drained += total
+        return total
+
+    def stats(self) -> Dict:
+        stats = self.spool.stats()
+        stats["drained"] = self.drained
+        stats["late_writes"] = self.late_writes
+        stats["db_available"] = self.db_available()
+        return stats
+
+
+def to_db_row(record: Dict) -> Dict:
+    """AttackLogCreate 格式（detected_at_ns）→ save_attack_logs_bulk_async 要的格式（timestamp）。"""
+    row = dict(record)
+    detected_at_ns = row.pop("detected_at_ns", None)
+    row["timestamp"] = from_epoch_ns(detected_at_ns) if detected_at_ns else None
+    return row
+
+
+def _read_rows(path: str) -> List[Dict]:
+    return [to_db_row(record) for record in Spool.read_segment(path)]
+
+
+async def _in_session(write: Callable[[Any], Awaitable]):
+    async with get_async_sessionmaker()() as db:
+        return await write(db)
+
+
+async def _insert_rows(rows: List[Dict]) -> int:
+    async with get_async_sessionmaker()() as db:
+        return await save_attack_logs_bulk_async(db, rows, chunk_size=DRAIN_BATCH_ROWS)
+
+
+INGEST_SPOOL = IngestSpool()
@@ -0,0 +1,189 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import AttackLog, AttackPayload, UserAgent
+
+INTERN_CACHE_SIZE = 10000     # 每張查找表在記憶體裡最多記住幾個 hash → id
+# LRU 裡的 id 最多用幾秒就要回 DB 確認一次：別的行程清掉沒人參照的查找表資料（prune）之後，
+# 這個行程不會一直拿著已經不存在的 id（要比 partitions.MAINTENANCE_INTERVAL 短）
+INTERN_CACHE_TTL = 600
+# prune() 只刪 last_used 比 cache_ttl + INTERN_PRUNE_GRACE 秒更早的資料。
+# 行程從 DB 拿到 id 時一定會先把 last_used 更新成現在，LRU 裡的 id 最多再用 cache_ttl 秒，
+# GRACE 是「拿到 id」到「INSERT attack_logs」之間最多可能隔多久（含逾時後在背景寫完的情況）
+INTERN_PRUNE_GRACE = 600
+_CHUNK = 500                  # 一次 IN (...) / INSERT / DELETE 幾個值
+
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _chunks(items: Dict[str, str]) -> Iterator[Dict[str, str]]:
+    keys = list(items)
+    for start in range(0, len(keys), _CHUNK):
+        yield {k: items[k] for k in keys[start:start + _CHUNK]}
+
+
+class Interner:
+    """
+    把 payload / User-Agent 文字換成查找表的 id（同樣內容只存一份）。
+
+    - 先查行程內的 LRU（hash → id），命中就不用碰 DB
+    - 沒命中的先 UPDATE last_used = 現在，再一次 SELECT ... WHERE hash IN (...) 查出來
+    - 還是沒有的 INSERT IGNORE（別的 worker 同時插入也不會出錯），先 commit 再查 id
+      （先 commit：LRU 裡的 id 一定是已經存在的資料，外面的交易失敗也不會留下不存在的 id）
+    - prune()：刪掉 attack_logs 已經沒有參照、而且很久沒人用的資料
+      （保留期限刪掉舊紀錄之後，payload 文字才會真的釋放）
+
+    為什麼要 last_used：prune 在別的行程（或維護執行緒）跑，它看到「沒有參照」的那一刻，
+    可能正好有 request 剛拿到這個 id、還沒寫進 attack_logs。拿到 id 之前一定先更新 last_used，
+    prune 只刪 last_used 早於 cache_ttl + INTERN_PRUNE_GRACE 的，就不會刪掉正要被用的 id；
+    LRU 命中不會碰 DB，所以 LRU 的期限只從上一次更新 last_used 開始算，命中不會延長。
+    """
+
+    def __init__(self, model, reference, cache_size: int = INTERN_CACHE_SIZE, cache_ttl: float = INTERN_CACHE_TTL):
+        self.model = model
+        self.reference = reference      # attack_logs 裡參照這張表的欄位
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()   # hash → (id, 過期時間)
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+    def _cached(self, hashes: Dict[str, str]) -> Dict[str, int]:
+        found = {}
+        now = time.monotonic()
+        for h in hashes:
+            entry = self._cache.get(h)
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                self._cache.pop(h, None)
+                continue
+            self._cache.move_to_end(h)
+            found[h] = entry[0]
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def _remember(self, h: str, id_: int) -> None:
+        self._cache[h] = (id_, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(h)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def forget(self, hashes: Iterable[str]) -> None:
+        for h in hashes:
+            self._cache.pop(h, None)
+
+    def _select(self, hashes: List[str]):
+        return select(self.model.hash, self.model.id).where(self.model.hash.in_(hashes))
+
+    def _touch(self, hashes: List[str], now: int):
+        return update(self.model).where(self.model.hash.in_(hashes)).values(last_used=now)
+
+    def _insert(self, dialect: str, missing: Dict[str, str], now: int):
+        stmt = insert(self.model).values([{"hash": h, "text": t, "last_used": now} for h, t in missing.items()])
+        return stmt.prefix_with("OR IGNORE" if dialect == "sqlite" else "IGNORE")
+
+    @staticmethod
+    def _hashes(values: Iterable[Optional[str]]) -> Dict[str, str]:
+        return {content_hash(v): v for v in set(values) if v is not None}
+
+    def _finish(self, hashes: Dict[str, str], found: Dict[str, int], resolved: Dict[str, int]) -> Dict[str, int]:
+        # 只記住這次從 DB 拿到（last_used 剛更新過）的；LRU 命中的不重新計時
+        for h, id_ in resolved.items():
+            self._remember(h, id_)
+        return {text: found[h] for h, text in hashes.items() if h in found}
+
+    def ids(self, db: Session, values: Iterable[Optional[str]]) -> Dict[str, int]:
+        """{文字: id}；None 不會出現在結果裡。"""
+        hashes = self._hashes(values)
+        found = self._cached(hashes)
+        resolved: Dict[str, int] = {}
+        for chunk in _chunks({h: t for h, t in hashes.items() if h not in found}):
+            now = int(time.time())
+            db.execute(self._touch(list(chunk), now))
+            resolved.update(db.execute(self._select(list(chunk))).all())
+            missing = {h: t for h, t in chunk.items() if h not in resolved}
+            if missing:
+                db.execute(self._insert(db.get_bind().dialect.name, missing, now))
+            db.commit()
+            if missing:
+                resolved.update(db.execute(self._select(list(missing))).all())
+        found.update(resolved)
+        return self._finish(hashes, found, resolved)
+
+    async def ids_async(self, db: AsyncSession, values: Iterable[Optional[str]]) -> Dict[str, int]:
+        """ids() 的 AsyncSession 版本。"""
+        hashes = self._hashes(values)
+        found = self._cached(hashes)
+        resolved: Dict[str, int] = {}
+        for chunk in _chunks({h: t for h, t in hashes.items() if h not in found}):
+            now = int(time.time())
+            await db.execute(self._touch(list(chunk), now))
+            resolved.update((await db.execute(self._select(list(chunk)))).all())
+            missing = {h: t for h, t in chunk.items() if h not in resolved}
+            if missing:
+                await db.execute(self._insert(db.get_bind().dialect.name, missing, now))
+            await db.commit()
+            if missing:
+                resolved.update((await db.execute(self._select(list(missing)))).all())
+        found.update(resolved)
+        return self._finish(hashes, found, resolved)
+
+    # ---------- 清掉沒人參照的資料 ----------
+
+    def _unreferenced(self):
+        return ~exists().where(self.reference == self.model.id)
+
+    def prune(self, conn, now: Optional[float] = None) -> int:
+        """
+        刪掉 attack_logs 已經沒有參照、last_used 早於 cache_ttl + INTERN_PRUNE_GRACE 秒前的資料，
+        每 _CHUNK 筆一個交易，回傳刪掉幾筆。
+        先從自己的 LRU 拿掉再刪；DELETE 時再檢查一次（SELECT 之後剛好有行程拿走這個 id、
+        更新了 last_used，或有新紀錄用到它，就不刪）。
+        """
+        model = self.model
+        cutoff = int(now if now is not None else time.time()) - int(self.cache_ttl + INTERN_PRUNE_GRACE)
+        prunable = (model.last_used < cutoff, self._unreferenced())
+        deleted = 0
+        after = 0
+        while True:
+            rows = conn.execute(
+                select(model.id, model.hash)
+                .where(model.id > after, *prunable)
+                .order_by(model.id)
+                .limit(_CHUNK)
+            ).all()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            self.forget(row[1] for row in rows)
+            result = conn.execute(delete(model).where(model.id.in_(ids), *prunable))
+            conn.commit()
+            deleted += result.rowcount
+            after = ids[-1]
+        self.pruned += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "pruned": self.pruned,
+        }
+
+
+PAYLOADS = Interner(AttackPayload, AttackLog.payload_id)
+USER_AGENTS = Interner(UserAgent, AttackLog.user_agent_id)
@@ -1,28 +1,89 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.orm import relationship
 from .db import Base
 
 
+class AttackPayload(Base):
+    """
+    攻擊 payload 的查找表：同樣內容只存一份，attack_logs 只存 payload_id。
+    掃描器常常同一個 payload 送上千次，不用每筆都存一份 TEXT。
+
+    id         INT (PK, AUTO_INCREMENT)
+    hash       CHAR(64)  內容的 SHA-256（UNIQUE，用來查 id）
+    text       TEXT
+    last_used  INT       最後一次有行程拿這個 id 去寫紀錄的時間（epoch 秒，見 interning.py 的 prune）
+    """
+    __tablename__ = "attack_payloads"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String(64), nullable=False, unique=True)
+    text = Column(Text, nullable=False)
+    last_used = Column(Integer, nullable=False, default=0, index=True)
+
+
+class UserAgent(Base):
+    """User-Agent 的查找表，跟 AttackPayload 一樣。"""
+    __tablename__ = "user_agents"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String(64), nullable=False, unique=True)
+    text = Column(Text, nullable=False)
+    last_used = Column(Integer, nullable=False, default=0, index=True)
+
+
 class AttackLog(Base):
     """
     對應 MySQL 中的 attack_logs 資料表：
 
-    id          INT (PK, AUTO_INCREMENT)
-    timestamp   DATETIME
-    ip_address  VARCHAR
-    url         VARCHAR
-    payload     TEXT
-    attack_type VARCHAR
-    user_agent  TEXT
+    id            INT (PK, AUTO_INCREMENT)
+    timestamp     DATETIME
+    ip_address    VARCHAR
+    url           VARCHAR
+    payload_id    INT → attack_payloads.id
+    attack_type   VARCHAR
+    user_agent_id INT → user_agents.id
+
+    payload / user_agent 仍然可以直接讀（查詢時一起 JOIN 出來），API 輸出的 JSON 不變。
+    payload_id / user_agent_id 沒有加 FOREIGN KEY：MySQL 的分區表不支援外鍵（見 partitions.py）。
     """
     __tablename__ = "attack_logs"
+    __table_args__ = (
+        # payload 搜尋：先從查找表找到 payload_id，再依 id 由新到舊分頁（見 search.py）
+        Index("ix_attack_logs_payload_id_id", "payload_id", "id"),
+        # 清查找表時要查「還有沒有紀錄用到這個 User-Agent」（見 interning.py 的 prune）
+        Index("ix_attack_logs_user_agent_id", "user_agent_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # 查詢都是依時間範圍 / 時間排序；MySQL 上也是分區欄位（見 partitions.py）
+    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
     ip_address = Column(String(45), nullable=False)
     url = Column(String(2048), nullable=False)
-    payload = Column(Text)
+    payload_id = Column(Integer)
     attack_type = Column(String(50), nullable=False)
     severity = Column(String(20), default="MEDIUM")
-    user_agent = Column(Text)
+    user_agent_id = Column(Integer)
+
+    # lazy="joined"：AsyncSession 不能延遲載入，查 AttackLog 時直接 JOIN 進來
+    payload_ref = relationship(
+        AttackPayload,
+        primaryjoin="foreign(AttackLog.payload_id) == AttackPayload.id",
+        lazy="joined",
+        viewonly=True,
+    )
+    user_agent_ref = relationship(
+        UserAgent,
+        primaryjoin="foreign(AttackLog.user_agent_id) == UserAgent.id",
+        lazy="joined",
+        viewonly=True,
+    )
+
+    @property
+    def payload(self):
+        return self.payload_ref.text if self.payload_ref is not None else None
+
+    @property
+    def user_agent(self):
+        return self.user_agent_ref.text if self.user_agent_ref is not None else None
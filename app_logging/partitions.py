@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .db import engine as default_engine
+from .interning import PAYLOADS, USER_AGENTS
+
+# ===== attack_logs 依時間分區 + 保留期限 =====
+# LOGGING_PARTITION：month（預設）/ day / off（不做分區，也不清過期資料）
+PARTITION_GRANULARITY = os.environ.get("LOGGING_PARTITION", "month")
+PARTITIONS_AHEAD = 3               # 先建好未來幾個分區（寫入永遠不會掉進 pmax）
+RETENTION_DAYS = int(os.environ.get("LOGGING_RETENTION_DAYS", "90"))   # 0 = 永久保留
+MAINTENANCE_INTERVAL = 3600        # 每幾秒檢查一次（補未來分區、刪過期分區）
+SQLITE_DELETE_CHUNK = 5000         # SQLite 沒有分區，過期資料分批 DELETE
+LOOKUP_TABLES = (PAYLOADS, USER_AGENTS)   # 過期資料刪掉之後，順便清掉沒人參照的 payload / User-Agent
+_REFERENCE_INDEX = "ix_attack_logs_user_agent_id"   # 清 user_agents 時用（payload_id 已經有索引）
+
+logger = logging.getLogger(__name__)
+
+TABLE = "attack_logs"
+_MAX_PARTITION = "pmax"
+_NAME_FORMATS = {"month": ("p%Y%m", re.compile(r"^p\d{6}$")), "day": ("p%Y%m%d", re.compile(r"^p\d{8}$"))}
+
+
+# ---------- 分區的時間區間（純函式） ----------
+
+def period_start(value: date, granularity: str) -> date:
+    if granularity == "day":
+        return value
+    return value.replace(day=1)
+
+
+def next_period(start: date, granularity: str) -> date:
+    if granularity == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: date, granularity: str) -> str:
+    return start.strftime(_NAME_FORMATS[granularity][0])
+
+
+def parse_partition_name(name: str, granularity: str) -> Optional[date]:
+    """p202401 → 2024-01-01；pmax 或其他名字回傳 None。"""
+    fmt, pattern = _NAME_FORMATS[granularity]
+    if not pattern.match(name):
+        return None
+    return datetime.strptime(name, fmt).date()
+
+
+def plan_partitions(first: date, last: date, granularity: str) -> List[Tuple[str, date]]:
+    """
+    從 first 所在的區間一路到 last 所在的區間，每個區間一個 (分區名稱, 上界日期)。
+    RANGE 分區是 VALUES LESS THAN 上界，上界 = 下一個區間的第一天。
+    """
+    plan = []
+    start = period_start(first, granularity)
+    end = period_start(last, granularity)
+    while start <= end:
+        upper = next_period(start, granularity)
+        plan.append((partition_name(start, granularity), upper))
+        start = upper
+    return plan
+
+
+def _partition_sql(plan: List[Tuple[str, date]]) -> str:
+    parts = [
+        f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+        for name, upper in plan
+    ]
+    parts.append(f"PARTITION {_MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+
+class PartitionManager:
+    """
+    MySQL：attack_logs 用 RANGE (TO_DAYS(timestamp)) 分區（每月或每天一個）
+      - 保留期限到了就 DROP PARTITION，瞬間完成，不會像大量 DELETE 一樣鎖表、留下碎片
+      - 查詢帶 timestamp 範圍時，MySQL 只會讀到相關的分區（partition pruning）
+      - MySQL 規定分區欄位要在每個 unique key 裡，所以主鍵改成 (id, timestamp)
+    SQLite（本機模式）沒有分區：只做保留期限，分批 DELETE 過期資料（靠 timestamp 索引）。
+    兩種都會接著清查找表（attack_payloads / user_agents）裡已經沒有紀錄參照、也很久沒人用的資料
+    （見 Interner.prune）。
+    """
+
+    def __init__(
+        self,
+        engine: Engine = default_engine,
+        granularity: str = PARTITION_GRANULARITY,
+        ahead: int = PARTITIONS_AHEAD,
+        retention_days: int = RETENTION_DAYS,
+    ):
+        if granularity not in _NAME_FORMATS:
+            raise ValueError(f"unknown partition granularity: {granularity!r}")
+        self.engine = engine
+        self.granularity = granularity
+        self.ahead = ahead
+        self.retention_days = retention_days
+
+    @property
+    def is_mysql(self) -> bool:
+        return self.engine.dialect.name == "mysql"
+
+    def _cutoff(self, today: date) -> Optional[date]:
+        if self.retention_days <= 0:
+            return None
+        return today - timedelta(days=self.retention_days)
+
+    def _horizon(self, today: date) -> date:
+        horizon = period_start(today, self.granularity)
+        for _ in range(self.ahead):
+            horizon = next_period(horizon, self.granularity)
+        return horizon
+
+    # ---------- MySQL ----------
+
+    def partitions(self, conn) -> List[str]:
+        rows = conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": TABLE})
+        return [row[0] for row in rows]
+
+    def _enable(self, conn, today: date) -> None:
+        """把還沒分區的 attack_logs 轉成分區表（只會做一次；資料很多時會花一些時間）。"""
+        oldest = conn.execute(text(f"SELECT MIN(timestamp) FROM {TABLE}")).scalar()
+        first = oldest.date() if oldest else today
+        cutoff = self._cutoff(today)
+        if cutoff is not None and first < cutoff:
+            first = cutoff   # 更舊的資料全部落在第一個分區，下一次清理就會整個刪掉
+        plan = plan_partitions(first, self._horizon(today), self.granularity)
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"))
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(timestamp)) ({_partition_sql(plan)})"
+        ))
+
+    def _add_future(self, conn, existing: List[str], today: date) -> List[str]:
+        starts = [d for d in (parse_partition_name(n, self.granularity) for n in existing) if d]
+        if not starts:
+            return []
+        after = next_period(max(starts), self.granularity)
+        horizon = self._horizon(today)
+        if after > horizon:
+            return []
+        plan = plan_partitions(after, horizon, self.granularity)
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} REORGANIZE PARTITION {_MAX_PARTITION} INTO ({_partition_sql(plan)})"
+        ))
+        return [name for name, _ in plan]
+
+    def _drop_expired(self, conn, existing: List[str], today: date) -> List[str]:
+        cutoff = self._cutoff(today)
+        if cutoff is None:
+            return []
+        expired = []
+        for name in existing:
+            start = parse_partition_name(name, self.granularity)
+            # 整個分區都比 cutoff 舊才刪（上界 <= cutoff）
+            if start is not None and next_period(start, self.granularity) <= cutoff:
+                expired.append(name)
+        if expired:
+            conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}"))
+        return expired
+
+    # ---------- SQLite ----------
+
+    def _delete_expired(self, conn, today: date) -> int:
+        cutoff = self._cutoff(today)
+        if cutoff is None:
+            return 0
+        deleted = 0
+        while True:
+            result = conn.execute(text(
+                f"DELETE FROM {TABLE} WHERE id IN "
+                f"(SELECT id FROM {TABLE} WHERE timestamp < :cutoff LIMIT {SQLITE_DELETE_CHUNK})"
+            ), {"cutoff": datetime.combine(cutoff, datetime.min.time())})
+            conn.commit()
+            deleted += result.rowcount
+            if result.rowcount < SQLITE_DELETE_CHUNK:
+                return deleted
+
+    # ---------- 查找表 ----------
+
+    def _ensure_reference_index(self, conn) -> None:
+        # 舊的資料表沒有 user_agent_id 的索引（create_all 不會替已經存在的表補索引）
+        if self.is_mysql:
+            exists = conn.execute(text(
+                "SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = :name"
+            ), {"table": TABLE, "name": _REFERENCE_INDEX}).first()
+            if not exists:
+                conn.execute(text(f"ALTER TABLE {TABLE} ADD INDEX {_REFERENCE_INDEX} (user_agent_id)"))
+        else:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {_REFERENCE_INDEX} ON {TABLE} (user_agent_id)"))
+        conn.commit()
+
+    def _prune_lookups(self, conn) -> Dict[str, int]:
+        if self.retention_days <= 0:
+            return {}
+        self._ensure_reference_index(conn)
+        return {interner.model.__tablename__: interner.prune(conn) for interner in LOOKUP_TABLES}
+
+    # ---------- 對外 ----------
+
+    def maintain(self, today: Optional[date] = None) -> dict:
+        """
+        補好未來的分區、刪掉過期的分區（SQLite：刪過期資料），再清掉沒人參照的查找表資料。
+        可以重複呼叫。
+        """
+        today = today or datetime.utcnow().date()
+        if not self.is_mysql:
+            with self.engine.connect() as conn:
+                deleted = self._delete_expired(conn, today)
+                return {"deleted_rows": deleted, "pruned": self._prune_lookups(conn)}
+
+        # DDL 在 MySQL 會自動 commit，用 connect() 就好
+        with self.engine.connect() as conn:
+            existing = self.partitions(conn)
+            enabled = False
+            if not existing:
+                self._enable(conn, today)
+                existing = self.partitions(conn)
+                enabled = True
+            added = self._add_future(conn, existing, today)
+            dropped = self._drop_expired(conn, existing, today)
+            conn.commit()
+            pruned = self._prune_lookups(conn)
+        return {"enabled": enabled, "added": added, "dropped": dropped, "pruned": pruned}
+
+
+async def run_partition_maintenance(manager: PartitionManager, interval: float = MAINTENANCE_INTERVAL) -> None:
+    """背景 task：每 interval 秒 maintain() 一次（DDL 是同步的，丟到執行緒跑，不卡 event loop）。"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, manager.maintain)
+        except Exception:  # DB 暫時連不上之類的，下一輪再試
+            logger.exception("partition maintenance failed")
+        await asyncio.sleep(interval)
@@ -1,18 +1,34 @@
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import random # 記得加入這個，為了產生測試資料
+import time
 
-from .db import SessionLocal
-from .service import get_attack_logs, save_attack_log
+from .db import SessionLocal, get_async_sessionmaker
+from .conditional import cache_headers, logs_version, make_etag, not_modified
+from .export import ExportError, export_chunks, export_filename, export_media_type
+from .ingest_spool import DB_ERRORS, INGEST_BULK_DB_TIMEOUT, INGEST_DB_TIMEOUT, INGEST_SPOOL, to_db_row
+from .interning import PAYLOADS, USER_AGENTS
+from .search import SEARCH_DEFAULT_LIMIT, SearchError, search_attack_logs
+from .sketches import DIMENSIONS, SKETCHES
+from .fast_json import dumps, dumps_rows
+from .service import (
+    LOG_COLUMNS,
+    from_epoch_ns,
+    get_attack_log_rows_async,
+    save_attack_log_async,
+    save_attack_logs_bulk_async,
+)
 
 
 # ========== DB 依賴注入 ==========
 
 def get_db():
+    """同步 Session（給仍在用同步 service 的程式）。"""
     db = SessionLocal()
     try:
         yield db
@@ -20,6 +36,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """非同步 Session：commit / 查詢時不會卡住 event loop。"""
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
 # ========== Pydantic 輸出模型 ==========
 
 class AttackLogOut(BaseModel):
@@ -44,6 +66,8 @@ class AttackLogCreate(BaseModel):
     attack_type: str
     severity: str = "MEDIUM"
     user_agent: Optional[str] = None
+    # 偵測當下的時間（epoch 奈秒）；有給就用它當 timestamp，而不是寫入 DB 的時間
+    detected_at_ns: Optional[int] = None
 
 
 # ========== Router 本體 ==========
@@ -55,16 +79,79 @@ router = APIRouter(
 
 
 @router.get("/logs", response_model=List[AttackLogOut])
-def list_attack_logs(limit: int = 100, db: Session = Depends(get_db)):
+async def list_attack_logs(
+    request: Request,
+    limit: int = 100,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     對應前端 fetch("/api/logs")
+    since / until（UTC，ISO 格式）可限定時間範圍：since <= timestamp < until
+
+    快速路徑：只選需要的欄位（tuple）直接編成 JSON，不建立 ORM 物件、也不逐筆經過 Pydantic；
+    輸出格式跟 AttackLogOut 完全一樣（response_model 留著給 API 文件用）。
+
+    ETag 由資料版本（MAX id、筆數、MIN id）+ 查詢參數組成；前端帶 If-None-Match 且沒有新資料時直接回 304。
+    """
+    etag = make_etag("logs", await logs_version(db), limit, since, until)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = await get_attack_log_rows_async(db, limit=limit, since=since, until=until)
+    return Response(
+        content=dumps_rows(LOG_COLUMNS, rows),
+        media_type="application/json",
+        headers=cache_headers(etag),
+    )
+
+
+@router.get("/search")
+async def search_logs(
+    q: str,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    搜尋 payload（例如 q=union select），走全文索引而不是 LIKE '%...%' 掃整張表。
+    回傳 {"items": [...], "next_cursor": ...}；下一頁帶 cursor=next_cursor，沒有下一頁時是 null。
     """
-    logs = get_attack_logs(db, limit=limit)
-    return logs
+    try:
+        rows, next_cursor = await search_attack_logs(db, q, limit=limit, cursor=cursor)
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(
+        content=dumps({"items": [dict(zip(LOG_COLUMNS, row)) for row in rows], "next_cursor": next_cursor}),
+        media_type="application/json",
+    )
+
+
+@router.get("/logs/export")
+async def export_attack_logs(
+    format: str = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = True,
+):
+    """
+    匯出攻擊紀錄給離線分析用：format = ndjson / csv / parquet（需要 pyarrow）。
+    一邊從 DB 讀（server-side cursor）一邊壓縮一邊送出，記憶體用量固定，不會一次載入全部。
+    """
+    try:
+        chunks = export_chunks(format, since=since, until=until, gzip=gzip)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, gzip)}"'},
+    )
 
 
 @router.post("/test-attack", response_model=AttackLogOut)
-async def test_attack(request: Request, db: Session = Depends(get_db)):
+async def test_attack(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     產生測試資料用
     """
@@ -72,7 +159,7 @@ async def test_attack(request: Request, db: Session = Depends(get_db)):
     types = ["SQLI", "XSS", "BRUTE_FORCE", "PATH_TRAVERSAL"]
     severities = ["HIGH", "MEDIUM", "LOW"]
     
-    log = save_attack_log(
+    log = await save_attack_log_async(
         db=db,
         ip_address=request.client.host,
         url=str(request.url),
@@ -81,21 +168,130 @@ async def test_attack(request: Request, db: Session = Depends(get_db)):
         severity=random.choice(severities),
         user_agent=request.headers.get("user-agent"),
     )
+    SKETCHES.observe(log.ip_address, log.url, log.payload)
     return log
 
 
+def event_key(attack: AttackLogCreate) -> Optional[str]:
+    """同一個事件重送時 key 一樣（偵測時間是 B 模組偵測當下取的奈秒）；沒有偵測時間就無法分辨，回傳 None。"""
+    if not attack.detected_at_ns:
+        return None
+    return f"{attack.detected_at_ns}|{attack.ip_address}|{attack.url}|{attack.attack_type}"
+
+
+def _observe(attack: AttackLogCreate) -> None:
+    # 排行 / 不重複 IP 數在事件確定收下（寫進 DB、進 spool，或正在背景寫入）之後才更新；
+    # 用 event_key 去重，shipper 逾時重送同一批時不會算兩次
+    now = attack.detected_at_ns / 1_000_000_000 if attack.detected_at_ns else None
+    SKETCHES.observe(attack.ip_address, attack.url, attack.payload, now, key=event_key(attack))
+
+
+def _spooled_response(count: int, status: str = "spooled") -> JSONResponse:
+    """
+    DB 暫時寫不進去：事件已經進本機 spool（spooled），之後由背景 drainer 補寫；
+    或 DB 太慢、寫入還在背景進行（pending），失敗的話也會進 spool。
+    """
+    return JSONResponse(status_code=202, content={"status": status, "count": count})
+
+
 @router.post("/report-attack", response_model=AttackLogOut)
-async def report_attack(attack: AttackLogCreate, db: Session = Depends(get_db)):
+async def report_attack(attack: AttackLogCreate):
     """
      B 模組偵測到攻擊後，會呼叫這個 API 來寫 log。
+     DB 掛掉 / 太慢時改寫進本機 spool，回 202（沒有 id）。
     """
-    log = save_attack_log(
-        db=db,
-        ip_address=attack.ip_address,
-        url=attack.url,
-        payload=attack.payload,
-        attack_type=attack.attack_type,
-        severity=attack.severity,
-        user_agent=attack.user_agent,
+    row = attack.dict()
+    if INGEST_SPOOL.db_available():
+        try:
+            # DB 太慢時最多等 INGEST_DB_TIMEOUT 秒就回 202（ingest 延遲維持平穩）；
+            # 寫入本身不會被取消，在背景寫完，失敗才進 spool
+            log = await INGEST_SPOOL.write(
+                lambda db: save_attack_log_async(
+                    db=db,
+                    ip_address=attack.ip_address,
+                    url=attack.url,
+                    payload=attack.payload,
+                    attack_type=attack.attack_type,
+                    severity=attack.severity,
+                    user_agent=attack.user_agent,
+                    timestamp=from_epoch_ns(attack.detected_at_ns) if attack.detected_at_ns else None,
+                ),
+                [row],
+                INGEST_DB_TIMEOUT,
+            )
+            # pending：寫入一定會跑完，失敗也會進 spool，所以一樣算收下了
+            _observe(attack)
+            if log is not None:
+                return log
+            return _spooled_response(1, "pending")
+        except DB_ERRORS:
+            INGEST_SPOOL.mark_db_down()
+
+    if INGEST_SPOOL.spool_row(row):
+        _observe(attack)
+    return _spooled_response(1)
+
+
+@router.post("/report-attacks")
+async def report_attacks(attacks: List[AttackLogCreate]):
+    """
+    一次回報多筆（vuln-site 的 shipper 重送 spool 時用），整批一個交易寫入。
+    """
+    rows = [a.dict() for a in attacks]
+    if INGEST_SPOOL.db_available():
+        try:
+            inserted = await INGEST_SPOOL.write(
+                lambda db: save_attack_logs_bulk_async(db, [to_db_row(r) for r in rows]),
+                rows,
+                INGEST_BULK_DB_TIMEOUT,
+            )
+            for attack in attacks:
+                _observe(attack)
+            if inserted is not None:
+                return {"status": "inserted", "count": inserted}
+            return _spooled_response(len(rows), "pending")
+        except DB_ERRORS:
+            INGEST_SPOOL.mark_db_down()
+
+    for attack, row in zip(attacks, rows):
+        if INGEST_SPOOL.spool_row(row):
+            _observe(attack)
+    return _spooled_response(len(rows))
+
+
+@router.get("/ingest-spool-stats")
+async def ingest_spool_stats():
+    """spool 還有幾段沒寫回 DB、已經補寫了幾筆。"""
+    return INGEST_SPOOL.stats()
+
+
+@router.get("/intern-stats")
+async def intern_stats():
+    """payload / User-Agent 查找表的 hash → id 快取命中率。"""
+    return {"payloads": PAYLOADS.stats(), "user_agents": USER_AGENTS.stats()}
+
+
+@router.get("/top")
+async def top_attackers(request: Request, dim: str = "ip", n: int = 10):
+    """
+    近似排行（dim = ip / url / payload）+ 最近 1 分鐘 / 1 小時 / 24 小時的不重複 IP 數。
+    直接從記憶體裡的 sketch 回答（Space-Saving top-K、HyperLogLog），不查 DB；
+    count 是上限，count - error 是下限。
+    """
+    if dim not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dim must be one of {', '.join(DIMENSIONS)}")
+    n = max(1, min(n, 100))
+    # 沒有新的攻擊紀錄 → 排行不會變；不重複 IP 數會隨時間窗滑動，所以再加上目前的分鐘
+    etag = make_etag("top", SKETCHES.total, dim, n, int(time.time() // 60))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    return JSONResponse(
+        content={
+            "dim": dim,
+            "total": SKETCHES.total,
+            "items": SKETCHES.top(dim, n),
+            "distinct_ips": SKETCHES.distinct_ip_counts(),
+        },
+        headers=cache_headers(etag),
     )
-    return log
@@ -0,0 +1,188 @@
+import base64
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import AttackLog, AttackPayload
+from .service import select_log_columns
+
+# ===== payload 全文搜尋 =====
+# 索引建在查找表 attack_payloads 上（同樣的 payload 只有一份），再用 payload_id 子查詢找出攻擊紀錄。
+# MySQL：FULLTEXT 索引（MATCH ... AGAINST）
+# SQLite：FTS5 虛擬表（有 trigram tokenizer 就用，可以搜任意子字串）
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+FTS_TABLE = "attack_payloads_fts"
+FTS_TRIGGERS = (f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad")
+FULLTEXT_INDEX = "ft_attack_payloads_text"
+MYSQL_FT_MIN_TOKEN = 3         # InnoDB 的 innodb_ft_min_token_size 預設值；更短的字 FULLTEXT 查不到
+
+
+class SearchError(ValueError):
+    """搜尋字串或 cursor 不合法。"""
+
+
+# ---------- 建索引（啟動時呼叫一次，可以重複呼叫） ----------
+
+def _sqlite_has_trigram(conn) -> bool:
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text("DROP TABLE temp._fts_probe"))
+        return True
+    except OperationalError:
+        return False
+
+
+def _ensure_sqlite_fts(conn) -> None:
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {"name": FTS_TABLE}).first()
+    if not exists:
+        tokenize = ", tokenize='trigram'" if _sqlite_has_trigram(conn) else ""
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"text, content='attack_payloads', content_rowid='id'{tokenize})"
+        ))
+
+    # trigger 掛在 attack_payloads 上：reset_db.py 之類重建 attack_payloads 時 trigger 會跟著消失，
+    # FTS 表卻還在（舊的 rowid 會對到新的、不相干的 payload），所以 trigger 不齊就重建索引
+    triggers = {row[0] for row in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'attack_payloads'"
+    ))}
+    if exists and all(name in triggers for name in FTS_TRIGGERS):
+        return
+    # 外部內容表：新 payload 寫入、沒人參照的 payload 被清掉（Interner.prune）時由 trigger 同步
+    # （text 不會修改，只會新增 / 刪除；UPDATE 只改 last_used，不必同步）
+    if FTS_TRIGGERS[0] not in triggers:
+        conn.execute(text(
+            f"CREATE TRIGGER {FTS_TRIGGERS[0]} AFTER INSERT ON attack_payloads BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END"
+        ))
+    if FTS_TRIGGERS[1] not in triggers:
+        conn.execute(text(
+            f"CREATE TRIGGER {FTS_TRIGGERS[1]} AFTER DELETE ON attack_payloads BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text); END"
+        ))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_search_index(engine: Engine) -> None:
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == "mysql":
+            exists = conn.execute(text(
+                "SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'attack_payloads' AND INDEX_NAME = :name"
+            ), {"name": FULLTEXT_INDEX}).first()
+            if not exists:
+                conn.execute(text(f"ALTER TABLE attack_payloads ADD FULLTEXT INDEX {FULLTEXT_INDEX} (text)"))
+        elif dialect == "sqlite":
+            _ensure_sqlite_fts(conn)
+        conn.commit()
+
+
+# ---------- keyset cursor ----------
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii"))
+    except (ValueError, UnicodeError):
+        raise SearchError("invalid cursor")
+
+
+# ---------- 查詢 ----------
+
+def _phrase(q: str) -> str:
+    # 整串當成一個片語：使用者輸入的 " * + - 之類不會被當成搜尋語法
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _like_payloads(q: str):
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return select(AttackPayload.id).where(AttackPayload.text.like(f"%{escaped}%", escape="\\"))
+
+
+def _mysql_fulltext_payloads(q: str):
+    return select(AttackPayload.id).where(
+        text("MATCH(attack_payloads.text) AGAINST(:q IN BOOLEAN MODE)").bindparams(q='"' + q.replace('"', " ") + '"')
+    )
+
+
+def _sqlite_fts_payloads(q: str):
+    return select(literal_column("rowid")).select_from(table(FTS_TABLE)).where(
+        text(f"{FTS_TABLE} MATCH :q").bindparams(q=_phrase(q))
+    )
+
+
+async def payload_matches(db: AsyncSession, q: str) -> List[Select]:
+    """
+    符合 q 的 payload id 子查詢，依序試：
+    MySQL FULLTEXT → SQLite FTS5 → 查找表 LIKE。
+    回傳的是 SELECT（不是 id 的 list），由外面的查詢 JOIN 進 attack_logs，比對到多少種 payload 都不會被截掉。
+    """
+    dialect = db.get_bind().dialect.name
+    candidates = []
+    if dialect == "mysql":
+        # 太短的字（例如 "or 1=1" 的 or、1）不在 FULLTEXT 索引裡，停用字也一樣：
+        # 有短字就直接 LIKE，FULLTEXT 查不到東西也再用 LIKE 查一次
+        words = re.findall(r"\w+", q)
+        if words and all(len(w) >= MYSQL_FT_MIN_TOKEN for w in words):
+            fulltext = _mysql_fulltext_payloads(q)
+            if (await db.execute(fulltext.limit(1))).first() is not None:
+                candidates.append(fulltext)
+    elif dialect == "sqlite" and len(q) >= 3:
+        # trigram 至少要 3 個字；更短的（或沒有 FTS5 時）退回查找表的 LIKE
+        candidates.append(_sqlite_fts_payloads(q))
+    candidates.append(_like_payloads(q))
+    return candidates
+
+
+async def search_attack_logs(
+    db: AsyncSession,
+    q: str,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+) -> Tuple[List[tuple], Optional[str]]:
+    """
+    payload 含有 q 的攻擊紀錄，新的在前；回傳 (LOG_COLUMNS 順序的 tuple, 下一頁的 cursor)。
+    keyset 分頁：下一頁用 id < 上一頁最後一筆的 id，不用 OFFSET（越後面的頁不會越慢）。
+    全文索引的比對結果用子查詢（payload_id IN (SELECT ...)）交給 DB 跟 attack_logs 合併，
+    不會先把 payload id 撈回來再限制個數，符合的紀錄都查得到。
+    """
+    q = q.strip()
+    if not q:
+        raise SearchError("empty query")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    before = decode_cursor(cursor) if cursor else None
+
+    candidates = await payload_matches(db, q)
+    for i, payloads in enumerate(candidates):
+        # correlate(None)：外面的查詢也 JOIN 了 attack_payloads，不要讓子查詢跟它綁在一起
+        query = select_log_columns().where(AttackLog.payload_id.in_(payloads.correlate(None).scalar_subquery()))
+        if before is not None:
+            query = query.where(AttackLog.id < before)
+        try:
+            result = await db.execute(query.order_by(AttackLog.id.desc()).limit(limit + 1))
+        except OperationalError:
+            if i == len(candidates) - 1:
+                raise
+            continue   # 沒有 FTS5 表（例如還沒呼叫 ensure_search_index），退回 LIKE
+        rows = [tuple(row) for row in result.all()]
+        break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0])
+    return rows, next_cursor
@@ -0,0 +1,307 @@
+# seed.py（在專案根目錄執行：python -m app_logging.seed --rows 10000000）
+
+"""
+大量產生攻擊紀錄，給查詢 / 索引 / 分區做規模測試用。
+
+跟 /api/test-attack（一次一筆）、dashboard/fake_api.py（每次 40 筆、全部均勻亂數）不同，
+這裡的分佈比較像真的：
+
+- 攻擊者 IP 是 Zipf 分佈：少數 IP 佔了大部分攻擊（--zipf 越大越集中）
+- 時間是「背景 + 爆量」：--burst-share 的資料集中在 --bursts 次短時間掃描，
+  每次爆量固定一個 IP、一種攻擊類型（像掃描器一次打一輪）
+- payload 用 dashboard/fake_api.py 的 FAKE_PAYLOADS，依攻擊類型分類；
+  一部分加上變化（--variants），查找表與全文索引才有東西可以測
+- severity 用偵測模組的 ATTACK_SEVERITY
+
+寫入方式（--method）：
+- insert   ：DBAPI executemany，每批 --chunk 筆（pymysql 會合併成多列 INSERT；SQLite 會暫時關掉 fsync）
+- load-data：MySQL 的 LOAD DATA LOCAL INFILE（每批寫成暫存 TSV 檔再載入，最快；伺服器要開 local_infile）
+
+payload / User-Agent 先一次全部換成查找表的 id，產生資料列時只放整數。
+不會更新 /api/top 的 sketch（直接寫 DB，不經過 ingest API）。
+"""
+
+import argparse
+import bisect
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import create_engine
+
+from detection import ATTACK_SEVERITY
+
+from .db import SQLALCHEMY_DATABASE_URL, Base, SessionLocal, engine
+from .interning import PAYLOADS, USER_AGENTS
+
+_EPOCH = datetime(1970, 1, 1)
+
+# dashboard/fake_api.py 的 FAKE_PAYLOADS，依攻擊類型分類（BRUTE_FORCE 那邊沒有，補一個登入表單）
+PAYLOAD_CLASSES: Dict[str, List[str]] = {
+    "SQLI": ["' OR 1=1 --", "' UNION SELECT * FROM users --", "' OR '1'='1"],
+    "XSS": ["<script>alert(1)</script>", "<img src=x onerror=alert('XSS')>"],
+    "PATH_TRAVERSAL": ["../../etc/passwd", "../" * 5],
+    "CMD_INJECTION": ["cat /etc/shadow"],
+    "BRUTE_FORCE": ["username=admin&password=123456"],
+}
+# 各類型的比例（背景流量）
+TYPE_WEIGHTS = {"SQLI": 40, "XSS": 25, "PATH_TRAVERSAL": 15, "CMD_INJECTION": 5, "BRUTE_FORCE": 15}
+
+URLS_BY_TYPE = {
+    "SQLI": ["/api/login", "/api/search", "/product?id=1"],
+    "XSS": ["/api/search", "/comment", "/user/profile"],
+    "PATH_TRAVERSAL": ["/api/file", "/admin"],
+    "CMD_INJECTION": ["/api/ping", "/admin"],
+    "BRUTE_FORCE": ["/api/login"],
+}
+
+USER_AGENTS_WEIGHTED = [
+    ("sqlmap/1.7.2#stable (https://sqlmap.org)", 25),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36", 30),
+    ("python-requests/2.31.0", 15),
+    ("curl/8.4.0", 10),
+    ("Nikto/2.5.0", 8),
+    ("Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0", 10),
+    ("Go-http-client/1.1", 2),
+]
+
+COLUMNS = ("timestamp", "ip_address", "url", "payload_id", "attack_type", "severity", "user_agent_id")
+
+Row = Tuple[str, str, str, int, str, str, int]
+
+
+class AttackLogGenerator:
+    """依設定產生一批一批的資料列（tuple，順序同 COLUMNS）。"""
+
+    def __init__(
+        self,
+        start: datetime,
+        end: datetime,
+        ips: int,
+        zipf: float,
+        burst_share: float,
+        bursts: int,
+        variants: int,
+        variant_share: float,
+        seed: int,
+    ):
+        self.rng = random.Random(seed)
+        self.start_ts = (start - _EPOCH).total_seconds()   # start / end 是 UTC（沒有 tzinfo）
+        self.span = (end - start).total_seconds()
+        self.burst_share = burst_share
+        self.variant_share = variant_share
+
+        # Zipf：第 i 名的 IP 權重 1 / i^s（累積權重給 random.choices 用，一次抽一整批）
+        self.ip_pool = [self._random_ip() for _ in range(ips)]
+        self.ip_cum = list(itertools.accumulate(1.0 / (i + 1) ** zipf for i in range(ips)))
+
+        self.types = list(TYPE_WEIGHTS)
+        self.type_cum = list(itertools.accumulate(TYPE_WEIGHTS[t] for t in self.types))
+
+        # payload 文字：原始的 + 帶編號的變化版
+        self.payload_texts = {
+            t: (base, [f"{p} {n}" for p in base for n in range(1, variants + 1)])
+            for t, base in PAYLOAD_CLASSES.items()
+        }
+        self.ua_texts = [ua for ua, _ in USER_AGENTS_WEIGHTED]
+        self.ua_cum = list(itertools.accumulate(w for _, w in USER_AGENTS_WEIGHTED))
+
+        # 每次爆量：(開始時間, 持續秒數, IP, 攻擊類型)
+        self.bursts = [
+            (
+                self.start_ts + self.rng.random() * self.span,
+                self.rng.expovariate(1 / 300),           # 平均 5 分鐘
+                self.ip_pool[bisect.bisect(self.ip_cum, self.rng.random() * self.ip_cum[-1])],
+                self.types[bisect.bisect(self.type_cum, self.rng.random() * self.type_cum[-1])],
+            )
+            for _ in range(bursts)
+        ]
+        self.payload_ids: Dict[str, int] = {}
+        self.ua_ids: Dict[str, int] = {}
+
+    def _random_ip(self) -> str:
+        r = self.rng.getrandbits(32)
+        return f"{(r >> 24) % 223 + 1}.{(r >> 16) & 255}.{(r >> 8) & 255}.{r & 255}"
+
+    def all_texts(self) -> Tuple[List[str], List[str]]:
+        payloads = [p for base, variants in self.payload_texts.values() for p in base + variants]
+        return payloads, self.ua_texts
+
+    def resolve_ids(self, payload_ids: Dict[str, int], ua_ids: Dict[str, int]) -> None:
+        self.payload_ids = payload_ids
+        self.ua_ids = ua_ids
+
+    @staticmethod
+    def _ts(epoch: float) -> str:
+        # 跟 SQLAlchemy 存 DateTime 的格式一樣（UTC、含微秒），字串排序 = 時間排序
+        return (_EPOCH + timedelta(seconds=epoch)).isoformat(" ", "microseconds")
+
+    def _payload_id(self, attack_type: str) -> int:
+        base, variants = self.payload_texts[attack_type]
+        if variants and self.rng.random() < self.variant_share:
+            return self.payload_ids[self.rng.choice(variants)]
+        return self.payload_ids[self.rng.choice(base)]
+
+    def chunk(self, n: int) -> List[Row]:
+        rng = self.rng
+        n_burst = int(n * self.burst_share) if self.bursts else 0
+        n_bg = n - n_burst
+        rows: List[Row] = []
+
+        ips = rng.choices(self.ip_pool, cum_weights=self.ip_cum, k=n_bg)
+        types = rng.choices(self.types, cum_weights=self.type_cum, k=n_bg)
+        uas = rng.choices(self.ua_texts, cum_weights=self.ua_cum, k=n)
+        for i in range(n_bg):
+            t = types[i]
+            rows.append((
+                self._ts(self.start_ts + rng.random() * self.span),
+                ips[i],
+                rng.choice(URLS_BY_TYPE[t]),
+                self._payload_id(t),
+                t,
+                ATTACK_SEVERITY.get(t, "MEDIUM"),
+                self.ua_ids[uas[i]],
+            ))
+
+        for i, (begin, duration, ip, t) in enumerate(rng.choices(self.bursts, k=n_burst), start=n_bg):
+            rows.append((
+                self._ts(begin + rng.random() * duration),
+                ip,
+                rng.choice(URLS_BY_TYPE[t]),
+                self._payload_id(t),
+                t,
+                ATTACK_SEVERITY.get(t, "MEDIUM"),
+                self.ua_ids[uas[i]],
+            ))
+        return rows
+
+
+# ---------- 寫入 ----------
+
+def _insert_sql(paramstyle: str) -> str:
+    marks = ", ".join(["?" if paramstyle == "qmark" else "%s"] * len(COLUMNS))
+    return f"INSERT INTO attack_logs ({', '.join(COLUMNS)}) VALUES ({marks})"
+
+
+def write_insert(chunks, total: int) -> None:
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if engine.dialect.name == "sqlite":
+            # 只在這條連線上：不等 fsync、journal 放記憶體（種資料用，當掉重跑就好）
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+        sql = _insert_sql(engine.dialect.paramstyle)
+        _report(chunks, total, lambda rows: (cursor.executemany(sql, rows), raw.commit()))
+    finally:
+        raw.close()
+
+
+def _tsv_field(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def write_load_data(chunks, total: int) -> None:
+    if engine.dialect.name != "mysql":
+        raise SystemExit("--method load-data only works with MySQL")
+    loader = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"local_infile": True})
+    raw = loader.raw_connection()
+    tmp_dir = tempfile.mkdtemp(prefix="seed-")
+    path = os.path.join(tmp_dir, "chunk.tsv")
+    sql = (
+        "LOAD DATA LOCAL INFILE %s INTO TABLE attack_logs "
+        "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+        f"({', '.join(COLUMNS)})"
+    )
+
+    def load(rows: Sequence[Row]) -> None:
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines("\t".join(_tsv_field(v) for v in row) + "\n" for row in rows)
+        cursor.execute(sql, (path,))
+        raw.commit()
+
+    try:
+        cursor = raw.cursor()
+        _report(chunks, total, load)
+    finally:
+        raw.close()
+        loader.dispose()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(tmp_dir)
+
+
+def _report(chunks, total: int, write) -> None:
+    start = time.perf_counter()
+    done = 0
+    gen_seconds = 0.0
+    for make in chunks:
+        t = time.perf_counter()
+        rows = make()
+        gen_seconds += time.perf_counter() - t
+        write(rows)
+        done += len(rows)
+        elapsed = time.perf_counter() - start
+        print(f"\r{done:>12,} / {total:,} rows   {done / elapsed:10,.0f} rows/s", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print(
+        f"\ndone: {done:,} rows in {elapsed:.1f}s ({done / elapsed:,.0f} rows/s; "
+        f"generating {gen_seconds:.1f}s, writing {elapsed - gen_seconds:.1f}s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bulk-generate realistic attack_logs rows")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=float, default=30, help="time span ending now")
+    parser.add_argument("--ips", type=int, default=50_000, help="distinct attacker IPs")
+    parser.add_argument("--zipf", type=float, default=1.1, help="IP skew (Zipf exponent)")
+    parser.add_argument("--burst-share", type=float, default=0.3, help="fraction of rows inside scan bursts")
+    parser.add_argument("--bursts", type=int, default=500)
+    parser.add_argument("--variants", type=int, default=1000, help="numbered variants per payload")
+    parser.add_argument("--variant-share", type=float, default=0.2)
+    parser.add_argument("--chunk", type=int, default=10_000)
+    parser.add_argument("--method", choices=["insert", "load-data"], default="insert")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    end = datetime.utcnow()
+    gen = AttackLogGenerator(
+        start=end - timedelta(days=args.days),
+        end=end,
+        ips=args.ips,
+        zipf=args.zipf,
+        burst_share=args.burst_share,
+        bursts=args.bursts,
+        variants=args.variants,
+        variant_share=args.variant_share,
+        seed=args.seed,
+    )
+
+    # 查找表先一次建好，產生資料列時只查 dict
+    payload_texts, ua_texts = gen.all_texts()
+    db = SessionLocal()
+    try:
+        gen.resolve_ids(PAYLOADS.ids(db, payload_texts), USER_AGENTS.ids(db, ua_texts))
+    finally:
+        db.close()
+    print(f"{len(payload_texts):,} payloads / {len(ua_texts)} user agents interned")
+
+    sizes = [args.chunk] * (args.rows // args.chunk)
+    if args.rows % args.chunk:
+        sizes.append(args.rows % args.chunk)
+    chunks = (lambda n=n: gen.chunk(n) for n in sizes)
+
+    if args.method == "load-data":
+        write_load_data(chunks, args.rows)
+    else:
+        write_insert(chunks, args.rows)
+
+
+if __name__ == "__main__":
+    main()
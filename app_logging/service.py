@@ -1,9 +1,55 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional
 
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .models import AttackLog
+from .interning import PAYLOADS, USER_AGENTS
+from .models import AttackLog, AttackPayload, UserAgent
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def from_epoch_ns(epoch_ns: int) -> datetime:
+    """epoch 奈秒 → UTC datetime（沒有 tzinfo，和 attack_logs.timestamp 一樣存 UTC）。"""
+    return _EPOCH + timedelta(microseconds=epoch_ns // 1000)
+
+
+def _new_attack_log(
+    ip_address: str,
+    url: str,
+    payload_id: Optional[int],
+    attack_type: str,
+    severity: str,
+    user_agent_id: Optional[int],
+    timestamp: Optional[datetime],
+) -> AttackLog:
+    return AttackLog(
+        timestamp=timestamp or datetime.utcnow(),
+        ip_address=ip_address,
+        url=url,
+        payload_id=payload_id,
+        attack_type=attack_type,
+        severity=severity,
+        user_agent_id=user_agent_id,
+    )
+
+
+def _bulk_values(rows: List[dict], payload_ids: dict, user_agent_ids: dict) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "timestamp": row.get("timestamp") or now,
+            "ip_address": row["ip_address"],
+            "url": row["url"],
+            "payload_id": payload_ids.get(row.get("payload")),
+            "attack_type": row["attack_type"],
+            "severity": row.get("severity") or "MEDIUM",
+            "user_agent_id": user_agent_ids.get(row.get("user_agent")),
+        }
+        for row in rows
+    ]
 
 
 def save_attack_log(
@@ -14,32 +60,126 @@ def save_attack_log(
     attack_type: str,
     severity: str = "MEDIUM",  # <--- 檢查這裡！一定要有這一行參數
     user_agent: Optional[str] = None,
+    timestamp: Optional[datetime] = None,
 ) -> AttackLog:
     """
     給「攻擊偵測模組」呼叫，把一筆攻擊紀錄寫進 attack_logs。
+    timestamp 是偵測當下的時間（UTC）；沒給才用寫入當下的時間。
+    payload / user_agent 存進查找表，attack_logs 只存 id。
     """
-    log = AttackLog(
-        timestamp=datetime.utcnow(),
-        ip_address=ip_address,
-        url=url,
-        payload=payload,
-        attack_type=attack_type,
-        severity=severity,
-        user_agent=user_agent,
-    )
+    payload_id = PAYLOADS.ids(db, [payload]).get(payload)
+    user_agent_id = USER_AGENTS.ids(db, [user_agent]).get(user_agent)
+    log = _new_attack_log(ip_address, url, payload_id, attack_type, severity, user_agent_id, timestamp)
     db.add(log)
     db.commit()
     db.refresh(log)
     return log
 
 
-def get_attack_logs(db: Session, limit: int = 100) -> List[AttackLog]:
-    """
-    給 Dashboard / 其他地方用，讀出最近 N 筆攻擊紀錄。
-    """
+def _time_range(query, since: Optional[datetime], until: Optional[datetime]):
+    # 有時間範圍時，MySQL 只會掃到對應的分區
+    if since is not None:
+        query = query.where(AttackLog.timestamp >= since)
+    if until is not None:
+        query = query.where(AttackLog.timestamp < until)
+    return query
+
+
+# AttackLogOut 的欄位順序；直接選這些欄位（tuple）時用
+LOG_COLUMNS = ["id", "timestamp", "ip_address", "url", "payload", "attack_type", "severity", "user_agent"]
+
+
+def select_log_columns():
+    """只選 LOG_COLUMNS 這幾個欄位（payload / user_agent 從查找表 JOIN），不建立 ORM 物件。"""
     return (
-        db.query(AttackLog)
-        .order_by(AttackLog.timestamp.desc())
-        .limit(limit)
-        .all()
+        select(
+            AttackLog.id,
+            AttackLog.timestamp,
+            AttackLog.ip_address,
+            AttackLog.url,
+            AttackPayload.text,
+            AttackLog.attack_type,
+            AttackLog.severity,
+            UserAgent.text,
+        )
+        .outerjoin(AttackPayload, AttackPayload.id == AttackLog.payload_id)
+        .outerjoin(UserAgent, UserAgent.id == AttackLog.user_agent_id)
     )
+
+
+def get_attack_logs(
+    db: Session,
+    limit: int = 100,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[AttackLog]:
+    """
+    給 Dashboard / 其他地方用，讀出最近 N 筆攻擊紀錄（可限定 since <= timestamp < until）。
+    """
+    query = _time_range(select(AttackLog), since, until)
+    return list(db.scalars(query.order_by(AttackLog.timestamp.desc()).limit(limit)).all())
+
+
+# ========== 非同步版本（AsyncSession，router 使用） ==========
+
+async def save_attack_log_async(
+    db: AsyncSession,
+    ip_address: str,
+    url: str,
+    payload: Optional[str],
+    attack_type: str,
+    severity: str = "MEDIUM",
+    user_agent: Optional[str] = None,
+    timestamp: Optional[datetime] = None,
+) -> AttackLog:
+    """save_attack_log 的 AsyncSession 版本：等 DB 的時候 event loop 可以處理別的 request。"""
+    payload_id = (await PAYLOADS.ids_async(db, [payload])).get(payload)
+    user_agent_id = (await USER_AGENTS.ids_async(db, [user_agent])).get(user_agent)
+    log = _new_attack_log(ip_address, url, payload_id, attack_type, severity, user_agent_id, timestamp)
+    db.add(log)
+    await db.commit()
+    await db.refresh(log)
+    return log
+
+
+async def save_attack_logs_bulk_async(db: AsyncSession, rows: List[dict], chunk_size: int = 500) -> int:
+    """
+    一次寫入多筆（spool 重送 / 批次回報用）：每 chunk_size 筆一個多列 INSERT，全部在同一個交易裡 commit。
+    rows 的 key 跟 AttackLogCreate 一樣（payload / user_agent 是文字），timestamp 沒給就用寫入當下的時間。
+    """
+    if not rows:
+        return 0
+    # 整批先換成 id：重複的 payload / UA 只查一次
+    payload_ids = await PAYLOADS.ids_async(db, (row.get("payload") for row in rows))
+    user_agent_ids = await USER_AGENTS.ids_async(db, (row.get("user_agent") for row in rows))
+    values = _bulk_values(rows, payload_ids, user_agent_ids)
+    for start in range(0, len(values), chunk_size):
+        await db.execute(insert(AttackLog), values[start:start + chunk_size])
+    await db.commit()
+    return len(values)
+
+
+async def get_attack_logs_async(
+    db: AsyncSession,
+    limit: int = 100,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[AttackLog]:
+    """get_attack_logs 的 AsyncSession 版本。"""
+    query = _time_range(select(AttackLog), since, until)
+    result = await db.execute(query.order_by(AttackLog.timestamp.desc()).limit(limit))
+    return list(result.scalars().all())
+
+
+async def get_attack_log_rows_async(
+    db: AsyncSession,
+    limit: int = 100,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[tuple]:
+    """
+    跟 get_attack_logs_async 一樣的資料，但回傳 LOG_COLUMNS 順序的 tuple（/api/logs 的快速路徑用）。
+    """
+    query = _time_range(select_log_columns(), since, until)
+    result = await db.execute(query.order_by(AttackLog.timestamp.desc()).limit(limit))
+    return [tuple(row) for row in result.all()]
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===== 攻擊者 / URL / payload 排行 + 不重複 IP 數（記憶體固定、近似值） =====
+TOP_K = 200                   # 每個維度追蹤幾個候選（Space-Saving 的 counter 數）
+HLL_PRECISION = 11            # HyperLogLog 2^11 = 2048 個 register，誤差約 2.3%
+SKETCH_PATH = os.environ.get("LOGGING_SKETCH_PATH", os.path.join("spool", "sketches.json"))
+CHECKPOINT_INTERVAL = 60      # 每幾秒存一次檔
+MAX_VALUE_CHARS = 512         # URL / payload 太長只記前面這段，排行佔的記憶體才有上限
+DEDUP_SIZE = 50000            # 記住最近幾筆事件的 key（shipper 重送同一批時不重複計算）
+
+DIMENSIONS = ("ip", "url", "payload")
+# 不重複 IP 數的時間窗：(名稱, 每格幾秒, 幾格)
+WINDOWS = (("1m", 60, 1), ("1h", 60, 60), ("24h", 3600, 24))
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K：最多記 k 個值的 [次數, 誤差上限]。
+    新值進來且已經滿了 → 取代次數最少的那個，次數從它的次數 + 1 開始（誤差 = 它原本的次數）。
+    真正出現次數 > N / k 的值一定會在裡面；count - error <= 真正次數 <= count。
+
+    用 stream-summary 的做法：同樣次數的值放在同一個 bucket（次數 → 值），再記住最小的次數，
+    找「次數最少的那個」不用掃過 k 個 counter；每次 +1（observe 的情況）是 O(1)。
+    """
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.counters: Dict[str, List[int]] = {}
+        self._buckets: Dict[int, Dict[str, None]] = {}   # 次數 → 這個次數的值（dict 當有序 set 用）
+        self._min = 0
+
+    def _place(self, value: str, count: int) -> None:
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = {}
+        bucket[value] = None
+        if len(self.counters) == 1 or count < self._min:
+            self._min = count
+
+    def _unplace(self, value: str, count: int, new_count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[value]
+        if bucket:
+            return
+        del self._buckets[count]
+        if count == self._min:
+            # 每次 +1 時新的最小值就是 count + 1（值剛搬過去）；一次加很多才需要重找
+            self._min = new_count if new_count == count + 1 or not self._buckets else min(min(self._buckets), new_count)
+
+    def add(self, value: str, count: int = 1) -> None:
+        entry = self.counters.get(value)
+        if entry is not None:
+            self._unplace(value, entry[0], entry[0] + count)
+            entry[0] += count
+            self._place(value, entry[0])
+            return
+        if len(self.counters) < self.k:
+            self.counters[value] = [count, 0]
+            self._place(value, count)
+            return
+        floor = self._min
+        victim = next(iter(self._buckets[floor]))
+        self._unplace(victim, floor, floor + count)
+        del self.counters[victim]
+        self.counters[value] = [floor + count, floor]
+        self._place(value, floor + count)
+
+    def top(self, n: int) -> List[dict]:
+        items = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [{"value": v, "count": c, "error": e} for v, (c, e) in items]
+
+    def to_dict(self) -> dict:
+        # 複製一份：存檔時 json.dump 在鎖外面跑，observe() 還會繼續改 counters
+        return {"k": self.k, "counters": {v: list(entry) for v, entry in self.counters.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        sketch = cls(int(data.get("k", TOP_K)))
+        for v, (c, e) in data.get("counters", {}).items():
+            sketch.counters[v] = [int(c), int(e)]
+            sketch._place(v, int(c))
+        return sketch
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog 基數估計：2^p 個 register（每個 1 byte），可以合併（取每個 register 的最大值）。"""
+
+    def __init__(self, p: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        self.add_hash(_hash64(value))
+
+    def add_hash(self, h: int) -> None:
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & ((1 << 64) - 1)
+        rank = (64 - self.p + 1) if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)   # 小範圍修正（linear counting）
+        return int(round(estimate))
+
+
+class _WindowedHLL:
+    """
+    每 bucket_seconds 一個 HLL，保留最近 buckets 格；查詢時把窗內的格子合併。
+    已經結束的格子（目前這格以外）合併一次之後記下來，同一格時間內的查詢只要再併上目前這格；
+    有比較舊的時間（spool 補寫）寫進舊格子時才丟掉重算。
+    """
+
+    def __init__(self, bucket_seconds: int, buckets: int, p: int = HLL_PRECISION):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.p = p
+        self.cells: Dict[int, HyperLogLog] = {}
+        self._closed: Optional[Tuple[int, HyperLogLog]] = None   # (目前的格子, 它之前窗內格子的合併)
+
+    def add_hash(self, h: int, now: float) -> None:
+        slot = int(now // self.bucket_seconds)
+        cell = self.cells.get(slot)
+        if cell is None:
+            cell = self.cells[slot] = HyperLogLog(self.p)
+            for old in [s for s in self.cells if s <= slot - self.buckets]:
+                del self.cells[old]
+        if self._closed is not None and slot < self._closed[0]:
+            self._closed = None
+        cell.add_hash(h)
+
+    def _closed_merge(self, slot: int) -> HyperLogLog:
+        if self._closed is None or self._closed[0] != slot:
+            merged = HyperLogLog(self.p)
+            for s, cell in self.cells.items():
+                if slot - self.buckets < s < slot:
+                    merged.merge(cell)
+            self._closed = (slot, merged)
+        return self._closed[1]
+
+    def count(self, now: float) -> int:
+        slot = int(now // self.bucket_seconds)
+        merged = HyperLogLog(self.p, bytearray(self._closed_merge(slot).registers))
+        current = self.cells.get(slot)
+        if current is not None:
+            merged.merge(current)
+        return merged.count()
+
+    def to_dict(self) -> dict:
+        return {str(s): cell.registers.hex() for s, cell in self.cells.items()}
+
+    def load(self, data: dict) -> None:
+        self._closed = None
+        self.cells = {
+            int(s): HyperLogLog(self.p, bytearray.fromhex(hexed))
+            for s, hexed in data.items()
+            if len(hexed) == 2 * (1 << self.p)
+        }
+
+
+class AttackSketches:
+    """
+    每筆攻擊紀錄進來時更新（O(1)），/api/top 直接從記憶體回答，不用對整個 attack_logs GROUP BY。
+    每個 uvicorn worker 各有一份，定期存檔、啟動時讀回來。
+    多個 worker 時共用同一個 SKETCH_PATH：最後存的那份蓋掉前面的，重啟後每個 worker 都從那一份開始。
+
+    observe() 可以帶 key（事件的識別，見 router.event_key）：最近 DEDUP_SIZE 筆內看過的 key 不再計算，
+    shipper 逾時重送同一批事件時排行不會算兩次。
+    """
+
+    def __init__(self, k: int = TOP_K, dedup_size: int = DEDUP_SIZE):
+        self.top_k = {dim: SpaceSaving(k) for dim in DIMENSIONS}
+        self.distinct_ips = {name: _WindowedHLL(seconds, buckets) for name, seconds, buckets in WINDOWS}
+        self.total = 0
+        self.duplicates = 0
+        self.dedup_size = dedup_size
+        self._seen: "OrderedDict[int, None]" = OrderedDict()   # key 的 64-bit hash（比存整個字串省記憶體）
+        self._lock = threading.Lock()
+
+    def _is_duplicate(self, key: str) -> bool:
+        h = _hash64(key)
+        if h in self._seen:
+            self._seen.move_to_end(h)
+            return True
+        self._seen[h] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def observe(self, ip: str, url: str, payload: Optional[str], now: Optional[float] = None, key: Optional[str] = None) -> bool:
+        """計入一筆事件；key 最近看過（重送）就跳過，回傳 False。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if key is not None and self._is_duplicate(key):
+                self.duplicates += 1
+                return False
+            self.total += 1
+            self.top_k["ip"].add(ip)
+            self.top_k["url"].add(url[:MAX_VALUE_CHARS])
+            if payload:
+                self.top_k["payload"].add(payload[:MAX_VALUE_CHARS])
+            h = _hash64(ip)   # 三個時間窗共用同一個 hash
+            for window in self.distinct_ips.values():
+                window.add_hash(h, now)
+        return True
+
+    def top(self, dim: str, n: int = 10) -> List[dict]:
+        with self._lock:
+            return self.top_k[dim].top(n)
+
+    def distinct_ip_counts(self, now: Optional[float] = None) -> Dict[str, int]:
+        now = time.time() if now is None else now
+        with self._lock:
+            return {name: window.count(now) for name, window in self.distinct_ips.items()}
+
+    # ---------- 存檔 / 讀檔 ----------
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "top_k": {dim: sketch.to_dict() for dim, sketch in self.top_k.items()},
+                "distinct_ips": {name: window.to_dict() for name, window in self.distinct_ips.items()},
+            }
+
+    def load_dict(self, data: dict) -> None:
+        with self._lock:
+            self.total = int(data.get("total", 0))
+            for dim, sketch in data.get("top_k", {}).items():
+                if dim in self.top_k:
+                    self.top_k[dim] = SpaceSaving.from_dict(sketch)
+            for name, cells in data.get("distinct_ips", {}).items():
+                if name in self.distinct_ips:
+                    self.distinct_ips[name].load(cells)
+
+    def save(self, path: str = SKETCH_PATH) -> None:
+        # 先寫暫存檔再 os.replace，存到一半當掉也不會留下壞掉的檔案
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"   # 多個 worker 同時存檔時不會寫到同一個暫存檔
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path: str = SKETCH_PATH) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.load_dict(data)
+        return True
+
+
+SKETCHES = AttackSketches()
+
+
+async def run_sketch_checkpoints(sketches: AttackSketches, path: str = SKETCH_PATH, interval: float = CHECKPOINT_INTERVAL) -> None:
+    """背景 task：每 interval 秒存一次檔（寫檔丟到執行緒，不卡 event loop）。"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, sketches.save, path)
+        except Exception:  # 存檔失敗不能讓這個 task 結束，下一輪再試
+            logger.exception("sketch checkpoint failed")
@@ -0,0 +1,129 @@
+# test_interning.py（在專案根目錄執行：python -m pytest app_logging/test_interning.py 或 python -m app_logging.test_interning）
+
+"""
+Interner（payload / User-Agent 查找表）與 prune 交錯執行的情況。
+用暫存的 SQLite 檔案，兩個 Interner 物件代表兩個行程：一個在寫紀錄，一個在做維護（prune）。
+"""
+
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session
+
+from app_logging.db import Base
+from app_logging.interning import INTERN_PRUNE_GRACE, Interner
+from app_logging.models import AttackLog, AttackPayload
+
+LONG_AGO = int(time.time()) - 10 * (600 + INTERN_PRUNE_GRACE)
+
+
+def _engine():
+    path = os.path.join(tempfile.mkdtemp(), "interning.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def _interner(**kwargs) -> Interner:
+    return Interner(AttackPayload, AttackLog.payload_id, **kwargs)
+
+
+def _age(engine, payload_id: int) -> None:
+    """假裝這筆 payload 很久以前用過、參照它的紀錄也已經被保留期限刪掉。"""
+    with Session(engine) as db:
+        db.execute(update(AttackPayload).where(AttackPayload.id == payload_id).values(last_used=LONG_AGO))
+        db.commit()
+
+
+def _payload_exists(engine, payload_id: int) -> bool:
+    with Session(engine) as db:
+        return db.execute(select(AttackPayload.id).where(AttackPayload.id == payload_id)).first() is not None
+
+
+def _write_log(engine, payload_id: int) -> None:
+    with Session(engine) as db:
+        db.add(AttackLog(ip_address="1.2.3.4", url="/", payload_id=payload_id, attack_type="SQLI"))
+        db.commit()
+
+
+def test_prune_between_lookup_and_insert_keeps_the_id():
+    # writer 拿到 id → maintenance 的 prune 剛好在 writer 寫進 attack_logs 之前執行 → writer 寫入
+    engine = _engine()
+    writer, maintenance = _interner(), _interner()
+    with Session(engine) as db:
+        old_id = writer.ids(db, ["' or 1=1"])["' or 1=1"]
+    _age(engine, old_id)
+    writer.forget(writer._cache)   # writer 的 LRU 也早就過期了
+
+    with Session(engine) as db:
+        payload_id = writer.ids(db, ["' or 1=1"])["' or 1=1"]
+    assert payload_id == old_id
+
+    with engine.connect() as conn:
+        assert maintenance.prune(conn) == 0
+
+    _write_log(engine, payload_id)
+    assert _payload_exists(engine, payload_id)
+
+
+def test_prune_removes_stale_unreferenced_rows():
+    engine = _engine()
+    writer, maintenance = _interner(), _interner()
+    with Session(engine) as db:
+        ids = writer.ids(db, ["a", "b", "c"])
+    _age(engine, ids["a"])
+    _age(engine, ids["b"])
+    _write_log(engine, ids["b"])   # b 還有紀錄參照
+
+    with engine.connect() as conn:
+        assert maintenance.prune(conn) == 1
+    assert not _payload_exists(engine, ids["a"])
+    assert _payload_exists(engine, ids["b"])
+    assert _payload_exists(engine, ids["c"])   # 剛用過，還在 GRACE 內
+
+
+def test_cached_id_is_never_older_than_its_last_used():
+    # LRU 裡的 id 到期之前，prune 一定不會刪它；到期之後 writer 會回 DB 重新拿（被刪了就重新 INSERT）
+    engine = _engine()
+    writer, maintenance = _interner(cache_ttl=0.2), _interner(cache_ttl=0.2)
+    with Session(engine) as db:
+        first = writer.ids(db, ["<script>"])["<script>"]
+        assert writer.ids(db, ["<script>"])["<script>"] == first   # LRU 命中
+        assert writer.hits == 1
+
+    # prune 在 cache_ttl + GRACE 之後執行，payload 沒有參照 → 刪掉
+    with engine.connect() as conn:
+        assert maintenance.prune(conn, now=time.time() + 0.2 + INTERN_PRUNE_GRACE + 1) == 1
+    assert not _payload_exists(engine, first)
+
+    time.sleep(0.25)   # writer 的 LRU 到期：回 DB 發現沒有，重新 INSERT
+    with Session(engine) as db:
+        second = writer.ids(db, ["<script>"])["<script>"]
+    assert writer.misses == 2
+    assert _payload_exists(engine, second)
+
+
+def test_prune_forgets_its_own_cache_first():
+    engine = _engine()
+    interner = _interner()
+    with Session(engine) as db:
+        payload_id = interner.ids(db, ["x"])["x"]
+    _age(engine, payload_id)
+
+    with engine.connect() as conn:
+        assert interner.prune(conn) == 1
+    assert interner.stats()["size"] == 0
+
+    with Session(engine) as db:
+        payload_id = interner.ids(db, ["x"])["x"]
+    assert interner.misses == 2
+    assert _payload_exists(engine, payload_id)
+
+
+if __name__ == "__main__":
+    for name, func in sorted(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"{name}: ok")
@@ -0,0 +1,150 @@
+# test_partitions.py（在專案根目錄執行：python -m pytest app_logging/test_partitions.py 或 python -m app_logging.test_partitions）
+
+"""
+檢查 PartitionManager 產生的 MySQL DDL。
+不需要 MySQL：用假的連線把執行的 SQL 記下來，再跟預期的字串比對。
+"""
+
+from datetime import date, datetime
+
+from app_logging.partitions import PartitionManager, partition_name, plan_partitions
+
+
+class _Result:
+    def __init__(self, value=None):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def first(self):
+        return None
+
+    def __iter__(self):
+        return iter(())
+
+
+class FakeConnection:
+    """把 execute() 的 SQL（空白壓成一個）記在 self.sql。"""
+
+    def __init__(self, oldest=None):
+        self.sql = []
+        self.oldest = oldest
+
+    def execute(self, clause, params=None):
+        sql = " ".join(str(clause).split())
+        self.sql.append(sql)
+        if sql.startswith("SELECT MIN(timestamp)"):
+            return _Result(self.oldest)
+        return _Result()
+
+    def commit(self):
+        pass
+
+
+class FakeMySQLEngine:
+    class dialect:
+        name = "mysql"
+
+
+def _manager(**kwargs) -> PartitionManager:
+    return PartitionManager(engine=FakeMySQLEngine(), **kwargs)
+
+
+def _less_than(name: str, upper: str) -> str:
+    return f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{upper}'))"
+
+
+def test_plan_partitions_month():
+    assert plan_partitions(date(2024, 11, 15), date(2025, 2, 3), "month") == [
+        ("p202411", date(2024, 12, 1)),
+        ("p202412", date(2025, 1, 1)),
+        ("p202501", date(2025, 2, 1)),
+        ("p202502", date(2025, 3, 1)),
+    ]
+
+
+def test_plan_partitions_day():
+    assert plan_partitions(date(2024, 2, 28), date(2024, 3, 1), "day") == [
+        ("p20240228", date(2024, 2, 29)),
+        ("p20240229", date(2024, 3, 1)),
+        ("p20240301", date(2024, 3, 2)),
+    ]
+    assert partition_name(date(2024, 3, 1), "day") == "p20240301"
+
+
+def test_enable_ddl():
+    # 最舊的資料比保留期限還舊：第一個分區從 cutoff 所在的月份開始，往後多建 3 個月
+    conn = FakeConnection(oldest=datetime(2024, 1, 10, 8, 30))
+    _manager(granularity="month", ahead=3, retention_days=30)._enable(conn, date(2024, 3, 15))
+
+    assert conn.sql[1] == "ALTER TABLE attack_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"
+    assert conn.sql[2] == (
+        "ALTER TABLE attack_logs PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+        + ", ".join([
+            _less_than("p202402", "2024-03-01"),
+            _less_than("p202403", "2024-04-01"),
+            _less_than("p202404", "2024-05-01"),
+            _less_than("p202405", "2024-06-01"),
+            _less_than("p202406", "2024-07-01"),
+            "PARTITION pmax VALUES LESS THAN MAXVALUE",
+        ])
+        + ")"
+    )
+
+
+def test_enable_ddl_empty_table():
+    conn = FakeConnection(oldest=None)
+    _manager(granularity="day", ahead=1, retention_days=0)._enable(conn, date(2024, 3, 15))
+
+    assert conn.sql[2] == (
+        "ALTER TABLE attack_logs PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+        + _less_than("p20240315", "2024-03-16") + ", "
+        + _less_than("p20240316", "2024-03-17") + ", "
+        + "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+def test_add_future_ddl():
+    conn = FakeConnection()
+    added = _manager(granularity="month", ahead=3)._add_future(conn, ["p202402", "p202403", "pmax"], date(2024, 3, 15))
+
+    assert added == ["p202404", "p202405", "p202406"]
+    assert conn.sql == [
+        "ALTER TABLE attack_logs REORGANIZE PARTITION pmax INTO ("
+        + _less_than("p202404", "2024-05-01") + ", "
+        + _less_than("p202405", "2024-06-01") + ", "
+        + _less_than("p202406", "2024-07-01") + ", "
+        + "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    ]
+
+
+def test_add_future_nothing_to_do():
+    conn = FakeConnection()
+    existing = ["p202403", "p202404", "p202405", "p202406", "pmax"]
+    assert _manager(granularity="month", ahead=3)._add_future(conn, existing, date(2024, 3, 15)) == []
+    assert conn.sql == []
+
+
+def test_drop_expired_ddl():
+    # cutoff = 2024-02-14：只有整個分區都比 cutoff 舊的 p202401 會被刪
+    conn = FakeConnection()
+    existing = ["p202401", "p202402", "p202403", "pmax"]
+    dropped = _manager(granularity="month", retention_days=30)._drop_expired(conn, existing, date(2024, 3, 15))
+
+    assert dropped == ["p202401"]
+    assert conn.sql == ["ALTER TABLE attack_logs DROP PARTITION p202401"]
+
+
+def test_drop_expired_keeps_everything_without_retention():
+    conn = FakeConnection()
+    existing = ["p202001", "p202002", "pmax"]
+    assert _manager(granularity="month", retention_days=0)._drop_expired(conn, existing, date(2024, 3, 15)) == []
+    assert conn.sql == []
+
+
+if __name__ == "__main__":
+    for name, func in sorted(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"{name}: ok")
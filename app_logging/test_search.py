@@ -0,0 +1,83 @@
+# test_search.py（在專案根目錄執行：python -m pytest app_logging/test_search.py 或 python -m app_logging.test_search）
+
+"""
+/api/search 的查詢：暫存的 SQLite 檔案（有 FTS5 就走 FTS5，沒有就是 LIKE），一頁一頁用 cursor 翻完。
+"""
+
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app_logging.db import Base
+from app_logging.interning import content_hash
+from app_logging.models import AttackLog, AttackPayload
+from app_logging.search import SEARCH_MAX_LIMIT, ensure_search_index, search_attack_logs
+
+MATCHING = 1500     # 比對到的 payload 種類比以前的上限（1000）多
+
+
+def _database(fts: bool = True) -> str:
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    if fts:
+        ensure_search_index(engine)
+    payloads = [f"1 union select {i}, password from users" for i in range(MATCHING)]
+    payloads += [f"<script>alert({i})</script>" for i in range(300)]
+    with engine.begin() as conn:
+        conn.execute(insert(AttackPayload), [{"hash": content_hash(p), "text": p} for p in payloads])
+        # 每種 payload 一筆紀錄，符合與不符合的交錯寫入
+        conn.execute(insert(AttackLog), [
+            {"ip_address": "10.0.0.1", "url": "/login", "payload_id": i + 1, "attack_type": "SQLI"}
+            for i in range(len(payloads))
+        ])
+    engine.dispose()
+    return path
+
+
+async def _all_pages(path: str, q: str, limit: int = SEARCH_MAX_LIMIT):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    ids, pages, cursor = [], 0, None
+    try:
+        async with AsyncSession(engine) as db:
+            while True:
+                rows, cursor = await search_attack_logs(db, q, limit=limit, cursor=cursor)
+                ids.extend(row[0] for row in rows)
+                pages += 1
+                if cursor is None:
+                    return ids, pages
+    finally:
+        await engine.dispose()
+
+
+def test_search_returns_every_match_past_1000_payloads():
+    path = _database()
+    ids, pages = asyncio.run(_all_pages(path, "union select"))
+    assert len(ids) == MATCHING
+    assert ids == sorted(ids, reverse=True)
+    assert pages == -(-MATCHING // SEARCH_MAX_LIMIT)
+
+
+def test_search_without_fts_table_falls_back_to_like():
+    path = _database(fts=False)
+    ids, _ = asyncio.run(_all_pages(path, "union select"))
+    assert len(ids) == MATCHING
+    assert len(set(ids)) == MATCHING
+
+
+def test_short_query_and_no_match():
+    path = _database()
+    ids, _ = asyncio.run(_all_pages(path, "<s"))      # 少於 3 個字：LIKE
+    assert len(ids) == 300
+    ids, pages = asyncio.run(_all_pages(path, "drop table"))
+    assert ids == [] and pages == 1
+
+
+if __name__ == "__main__":
+    for name, func in sorted(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"{name}: ok")
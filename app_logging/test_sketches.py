@@ -0,0 +1,96 @@
+# test_sketches.py（在專案根目錄執行：python -m pytest app_logging/test_sketches.py 或 python -m app_logging.test_sketches）
+
+"""
+sketches 的記憶體資料結構：SpaceSaving（stream-summary）、分時間窗的 HLL、重送去重。
+"""
+
+import random
+
+from app_logging.sketches import AttackSketches, SpaceSaving, _WindowedHLL
+
+
+class _NaiveSpaceSaving:
+    """原本 O(k) 掃最小值的版本，拿來對照。同樣次數時取最早放進那個次數的值（跟 bucket 的順序一樣）。"""
+
+    def __init__(self, k):
+        self.k = k
+        self.counters = {}
+        self.order = {}
+        self.tick = 0
+
+    def add(self, value):
+        self.tick += 1
+        if value in self.counters:
+            self.counters[value][0] += 1
+        elif len(self.counters) < self.k:
+            self.counters[value] = [1, 0]
+        else:
+            victim = min(self.counters, key=lambda v: (self.counters[v][0], self.order[v]))
+            floor = self.counters.pop(victim)[0]
+            self.counters[value] = [floor + 1, floor]
+        self.order[value] = self.tick
+
+
+def test_space_saving_matches_naive():
+    rng = random.Random(7)
+    fast, naive = SpaceSaving(20), _NaiveSpaceSaving(20)
+    for _ in range(20000):
+        value = f"v{int(rng.paretovariate(1.2))}"
+        fast.add(value)
+        naive.add(value)
+        assert fast._min == min(c for c, _ in fast.counters.values())
+    assert fast.counters == naive.counters
+
+
+def test_space_saving_round_trip_and_bulk_add():
+    sketch = SpaceSaving(3)
+    sketch.add("a", 5)
+    sketch.add("b", 2)
+    sketch.add("c")
+    sketch.add("c", 10)
+    sketch.add("d")       # 取代 b（次數 2）
+    assert sketch.counters == {"a": [5, 0], "c": [11, 0], "d": [3, 2]}
+
+    loaded = SpaceSaving.from_dict(sketch.to_dict())
+    loaded.add("e")       # 取代 d（次數 3）
+    assert loaded.top(1) == [{"value": "c", "count": 11, "error": 0}]
+    assert loaded.counters["e"] == [4, 3]
+    assert loaded._min == 4
+
+
+def test_windowed_hll_cache_sees_new_and_late_events():
+    window = _WindowedHLL(60, 60)
+    for i in range(100):
+        window.add_hash(hash(f"ip{i}") & ((1 << 64) - 1), 60 * 10 + i % 60)
+    before = window.count(60 * 11)
+    # 同一格時間內的新 IP（目前這格）
+    for i in range(100, 200):
+        window.add_hash(hash(f"ip{i}") & ((1 << 64) - 1), 60 * 11)
+    middle = window.count(60 * 11)
+    # spool 補寫到舊格子：快取要重算
+    for i in range(200, 300):
+        window.add_hash(hash(f"ip{i}") & ((1 << 64) - 1), 60 * 5)
+    after = window.count(60 * 11)
+    assert 90 <= before <= 110
+    assert 190 <= middle <= 210
+    assert 290 <= after <= 310
+
+
+def test_observe_skips_replayed_keys():
+    sketches = AttackSketches(k=10, dedup_size=2)
+    assert sketches.observe("1.1.1.1", "/a", "x", now=0, key="e1")
+    assert not sketches.observe("1.1.1.1", "/a", "x", now=0, key="e1")
+    assert sketches.observe("1.1.1.1", "/a", "x", now=0)          # 沒有 key 不去重
+    assert sketches.observe("2.2.2.2", "/a", None, now=0, key="e2")
+    assert sketches.observe("3.3.3.3", "/a", None, now=0, key="e3")
+    assert sketches.observe("1.1.1.1", "/a", "x", now=0, key="e1")  # 已經被擠出去，只記最近 dedup_size 筆
+    assert sketches.total == 5
+    assert sketches.duplicates == 1
+    assert sketches.top("ip", 1) == [{"value": "1.1.1.1", "count": 3, "error": 0}]
+
+
+if __name__ == "__main__":
+    for name, func in sorted(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"{name}: ok")
@@ -0,0 +1,9 @@
+# common/__init__.py
+
+"""
+各模組共用、和攻擊偵測無關的工具（vuln-site 與 Logging Service 都會用到）。
+
+    from common.spool import Spool
+
+跟 detection 一起由 `pip install -e .` 安裝。
+"""
@@ -0,0 +1,223 @@
+# spool.py
+
+"""
+本機的可靠暫存區（append-only spool），下游（Logging Service / 資料庫）掛掉時先把事件寫在這裡。
+
+vuln-site 的 AttackShipper 送不出去、Logging Service 的 /api/report-attack 寫不進 DB 時都用它，
+之後由背景的 drainer 把資料批次重送 / 批次寫回去。兩邊都會用到，所以放在共用的 common 套件。
+
+- 呼叫端只做 queue.put_nowait()，不做任何 I/O，下游掛掉時 request 延遲不會跟著變高
+- 背景執行緒批次寫入，一批只 fsync 一次（不是每筆都 fsync）
+- 檔案分段：寫入中的是 <序號>.open，超過 segment_bytes 或放了 seal_seconds 秒就改名成 <序號>.seg
+- drainer 只讀 .seg（已封存、不會再被寫入），處理成功才 ack() 刪掉
+- 程式當掉留下的 .open，下次 start() 時直接封存；最後一行寫到一半的 JSON 讀取時跳過
+
+用法：
+    spool = Spool("spool/attacks")
+    spool.start()
+    spool.append({...})
+    for path in spool.segments():
+        records = spool.read_segment(path)
+        ...成功後 spool.ack(path)
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+SPOOL_SEGMENT_BYTES = 4 * 1024 * 1024   # 單一分段最大 4 MB
+SPOOL_SEAL_SECONDS = 1.0                # 分段最多開著幾秒就封存（drainer 才看得到）
+SPOOL_QUEUE_SIZE = 100000               # 還沒寫進檔案的筆數上限，滿了就丟
+
+_BATCH_SIZE = 512
+_OPEN_SUFFIX = ".open"
+_SEALED_SUFFIX = ".seg"
+_STOP = object()
+
+
+class Spool:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = SPOOL_SEGMENT_BYTES,
+        seal_seconds: float = SPOOL_SEAL_SECONDS,
+        queue_size: int = SPOOL_QUEUE_SIZE,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.seal_seconds = seal_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._seq = itertools.count()
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.last_error: Optional[str] = None
+
+    # ---------- 呼叫端（不可阻塞） ----------
+
+    def append(self, record: Dict) -> bool:
+        """排入一筆要暫存的事件；queue 滿了就丟掉並計數，回傳是否有排進去。"""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # ---------- drainer 使用 ----------
+
+    def segments(self) -> List[str]:
+        """已封存、等著被處理的分段（舊的在前）。"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in sorted(names)
+            if name.endswith(_SEALED_SUFFIX)
+        ]
+
+    @staticmethod
+    def read_segment(path: str) -> List[Dict]:
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # 當機時寫到一半的最後一行
+        return records
+
+    @staticmethod
+    def ack(path: str) -> None:
+        """這個分段已經處理完，刪掉。"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict:
+        pending = self.segments()
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "last_error": self.last_error,
+            "segments": len(pending),
+            "pending_bytes": sum(os.path.getsize(p) for p in pending if os.path.exists(p)),
+        }
+
+    # ---------- 背景寫入 ----------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # 上次沒正常關閉留下的 .open：內容都已經 fsync 過了，直接封存
+        for name in os.listdir(self.directory):
+            if name.endswith(_OPEN_SUFFIX):
+                path = os.path.join(self.directory, name)
+                os.replace(path, path[: -len(_OPEN_SUFFIX)] + _SEALED_SUFFIX)
+        self._thread = threading.Thread(target=self._run, name="spool-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """把 queue 裡剩下的寫完、封存目前的分段再結束。"""
+        if self._thread is None:
+            return
+        try:
+            # queue 滿的時候不能一直等（寫入執行緒卡住的話 shutdown 會跟著卡住）
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _new_segment_path(self) -> str:
+        # 檔名依時間排序 = 依寫入順序，drainer 照順序處理
+        return os.path.join(self.directory, f"{time.time_ns():020d}-{next(self._seq):06d}{_OPEN_SUFFIX}")
+
+    @staticmethod
+    def _seal(f, path: str) -> None:
+        f.close()
+        os.replace(path, path[: -len(_OPEN_SUFFIX)] + _SEALED_SUFFIX)
+
+    def _write_failed(self, e: OSError) -> None:
+        self.write_errors += 1
+        self.last_error = str(e)
+
+    def _try_seal(self, f, path: str) -> None:
+        # 封存失敗的話 .open 留在原地，下次 start() 會再封存
+        try:
+            self._seal(f, path)
+        except OSError as e:
+            self._write_failed(e)
+
+    def _run(self) -> None:
+        f = None
+        path = ""
+        size = 0
+        opened_at = 0.0
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.seal_seconds)
+                except queue.Empty:
+                    # 閒置：把開著的分段封存，drainer 才拿得到
+                    if f is not None:
+                        self._try_seal(f, path)
+                        f = None
+                    continue
+
+                batch: List = [first]
+                while len(batch) < _BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = False
+                lines = []
+                for record in batch:
+                    if record is _STOP:
+                        stop = True
+                        continue
+                    lines.append(json.dumps(record, ensure_ascii=False, default=str))
+
+                if lines:
+                    # 寫入失敗（磁碟滿之類）只丟掉這一批並計數，執行緒繼續跑；
+                    # 寫到一半的分段直接封存，壞掉的最後一行 read_segment 會跳過
+                    try:
+                        if f is None:
+                            path = self._new_segment_path()
+                            f = open(path, "a", encoding="utf-8")
+                            size = 0
+                            opened_at = time.monotonic()
+                        data = "\n".join(lines) + "\n"
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())   # 一批只 fsync 一次
+                        size += len(data.encode("utf-8"))
+                        self.written += len(lines)
+                    except OSError as e:
+                        self._write_failed(e)
+                        self.dropped += len(lines)
+                        if f is not None:
+                            self._try_seal(f, path)
+                            f = None
+                    if f is not None and (size >= self.segment_bytes or time.monotonic() - opened_at >= self.seal_seconds):
+                        self._try_seal(f, path)
+                        f = None
+
+                if stop:
+                    return
+        finally:
+            if f is not None:
+                self._try_seal(f, path)
@@ -0,0 +1,14 @@
+# detection/__init__.py
+
+"""
+B 模組：攻擊偵測。
+
+    from detection import detect_attack
+
+規則預設讀取套件內附的 rules.json（第一次偵測時才載入與編譯），
+也可以用 load_rules(path) 或環境變數 DETECTION_RULES 指定其他規則檔。
+"""
+
+from .detector import ATTACK_SEVERITY, SEVERITY_RANK, decision_cache_stats, detect, detect_attack
+from .models import DetectionInput, DetectionResult
+from .rules import DEFAULT_RULES, RuleSet, get_rules, load_rules
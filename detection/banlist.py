@@ -0,0 +1,326 @@
+# banlist.py
+
+"""
+暫時封鎖 IP（BANNED_IP）。
+
+BLOCK 模式下某個 IP 被判成 BRUTE_FORCE / CMD_INJECTION 等類型後，
+之後的請求不用再跑完整的欄位掃描：detect_attack 一開始就查這張表（dict，O(1)），
+還在封鎖期內就直接回傳 BANNED_IP。
+
+rules.json 設定：
+"BAN_LIST": {
+  "ENABLED": true,
+  "DURATIONS": {"BRUTE_FORCE": 600, "CMD_INJECTION": 3600},   # 各攻擊類型封鎖幾秒，沒列的不封鎖
+                                # RATE_LIMIT 只看 PER_IP / PER_ROUTE，GLOBAL 超過不封鎖（見 ratelimit.py）
+  "ESCALATION": 2,              # 再犯時封鎖時間乘上這個倍數（第 n 次 = 基本時間 × ESCALATION^(n-1)）
+  "MAX_DURATION": 86400,        # 封鎖時間上限
+  "OFFENSE_WINDOW": 86400,      # 上次違規超過這麼久，再犯次數重新計算
+  "MAX_ENTRIES": 100000,        # 最多記幾個 IP
+  "PERSIST_PATH": "bans.jsonl"  # （選擇性）封鎖表存檔位置，重啟後會讀回來；相對路徑以 rules.json 所在目錄為準
+}
+封鎖期限用的是實際時間（time.time()），存檔後重啟也能接著算。
+
+存檔是 append-only 的 JSON lines（每次封鎖一行），多個 worker / 子行程共用同一個檔案：
+- ban() 只把紀錄放進記憶體的待寫清單，背景執行緒每 FLUSH_INTERVAL 秒一次 append 出去，
+  request 路徑上不做任何檔案 I/O
+- 每次 append 是一次 O_APPEND 的 write，不同行程寫的行不會互相覆蓋
+- 讀檔時把所有行合併（同一個 IP 以最後違規時間最新的為準），也讀得懂舊版的單一 JSON 物件格式
+- 檔案超過 COMPACT_BYTES 時，由剛好在 flush 的那個行程加上檔案鎖重寫成每個 IP 一行
+  （沒有 fcntl 的平台不壓縮）
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_ESCALATION = 2
+DEFAULT_MAX_DURATION = 24 * 60 * 60
+DEFAULT_OFFENSE_WINDOW = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100000
+
+FLUSH_INTERVAL = 1.0                 # 背景執行緒多久把新的封鎖紀錄寫出去一次（秒）
+COMPACT_BYTES = 4 * 1024 * 1024      # 存檔超過這個大小就壓縮
+
+
+class BanConfig:
+    """BAN_LIST 設定。"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        durations: Optional[Dict[str, int]] = None,
+        escalation: float = DEFAULT_ESCALATION,
+        max_duration: int = DEFAULT_MAX_DURATION,
+        offense_window: int = DEFAULT_OFFENSE_WINDOW,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        persist_path: Optional[str] = None,
+    ):
+        self.enabled = enabled
+        self.durations = durations or {}
+        self.escalation = escalation
+        self.max_duration = max_duration
+        self.offense_window = offense_window
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+
+    @classmethod
+    def from_dict(cls, data, base_dir: str = "") -> "BanConfig":
+        if not isinstance(data, dict):
+            return cls()
+
+        def _num(key: str, default):
+            value = data.get(key)
+            return value if isinstance(value, (int, float)) and value > 0 else default
+
+        durations = {
+            attack_type: seconds
+            for attack_type, seconds in (data.get("DURATIONS") or {}).items()
+            if isinstance(seconds, (int, float)) and seconds > 0
+        }
+
+        persist_path = data.get("PERSIST_PATH")
+        if isinstance(persist_path, str) and persist_path:
+            if not os.path.isabs(persist_path) and base_dir:
+                persist_path = os.path.join(base_dir, persist_path)
+        else:
+            persist_path = None
+
+        return cls(
+            enabled=bool(data.get("ENABLED", False)) and bool(durations),
+            durations=durations,
+            escalation=_num("ESCALATION", DEFAULT_ESCALATION),
+            max_duration=_num("MAX_DURATION", DEFAULT_MAX_DURATION),
+            offense_window=_num("OFFENSE_WINDOW", DEFAULT_OFFENSE_WINDOW),
+            max_entries=int(_num("MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            persist_path=persist_path,
+        )
+
+
+class BanList:
+    """
+    封鎖表：{ip: [封鎖到期時間, 違規次數, 攻擊類型, 最後違規時間]}
+    解除封鎖後紀錄先留著（用來計算再犯），超過 OFFENSE_WINDOW 才真的刪掉。
+    """
+
+    def __init__(self):
+        self._bans: Dict[str, List] = {}
+        self._loaded_path: Optional[str] = None
+        # 還沒寫出去的紀錄：[(ip, entry)]，由背景執行緒 flush()
+        self._pending: List[Tuple[str, List]] = []
+        self._persist: Optional[Tuple[str, float]] = None   # (存檔路徑, OFFENSE_WINDOW)
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._bans)
+
+    def clear(self) -> None:
+        self._bans.clear()
+
+    def check(self, ip: str, now: Optional[float] = None) -> Optional[Tuple[str, float, int]]:
+        """
+        IP 還在封鎖期內就回傳 (攻擊類型, 剩餘秒數, 違規次數)，否則回傳 None。
+        """
+        entry = self._bans.get(ip)
+        if entry is None:
+            return None
+        if now is None:
+            now = time.time()
+        remaining = entry[0] - now
+        if remaining <= 0:
+            return None
+        return entry[2], remaining, entry[1]
+
+    def ban(self, ip: str, attack_type: str, config: BanConfig, now: Optional[float] = None) -> float:
+        """
+        記錄一次違規並封鎖；回傳這次封鎖的秒數（攻擊類型沒設定封鎖時間就回傳 0）。
+        """
+        base = config.durations.get(attack_type)
+        if not ip or not base:
+            return 0
+        if now is None:
+            now = time.time()
+
+        entry = self._bans.get(ip)
+        offenses = 1
+        if entry is not None and now - entry[3] <= config.offense_window:
+            offenses = entry[1] + 1
+
+        duration = min(base * config.escalation ** (offenses - 1), config.max_duration)
+        entry = [now + duration, offenses, attack_type, now]
+        self._bans[ip] = entry
+
+        if len(self._bans) > config.max_entries:
+            self._purge(config, now)
+        if config.persist_path:
+            self._queue(config, ip, entry)
+        return duration
+
+    def _purge(self, config: BanConfig, now: float) -> None:
+        """表滿了才呼叫：先清掉過期又超過 OFFENSE_WINDOW 的，還是太多就從最快到期的開始丟。"""
+        cutoff = now - config.offense_window
+        for ip in [ip for ip, e in self._bans.items() if e[0] <= now and e[3] < cutoff]:
+            del self._bans[ip]
+
+        overflow = len(self._bans) - config.max_entries
+        if overflow > 0:
+            for ip, _ in sorted(self._bans.items(), key=lambda item: item[1][0])[:overflow]:
+                del self._bans[ip]
+
+    # ---------- 存檔 / 讀檔 ----------
+
+    def _queue(self, config: BanConfig, ip: str, entry: List) -> None:
+        """把一筆封鎖紀錄交給背景執行緒寫出去（第一次呼叫時才啟動執行緒）。"""
+        with self._lock:
+            self._pending.append((ip, list(entry)))
+            self._persist = (config.persist_path, config.offense_window)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="banlist-flush", daemon=True)
+                self._flusher.start()
+                # 行程結束前把最後一批也寫出去
+                atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        """把待寫清單 append 到存檔；檔案太大就順便壓縮。"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            persist = self._persist
+        if not pending or persist is None:
+            return
+
+        filename, offense_window = persist
+        data = "".join(
+            json.dumps(dict(_entry_to_dict(entry), ip=ip)) + "\n" for ip, entry in pending
+        ).encode("utf-8")
+        try:
+            with _file_lock(filename, exclusive=False):
+                fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            if fcntl is not None and os.path.getsize(filename) > COMPACT_BYTES:
+                self.compact(filename, offense_window)
+        except OSError:
+            # 例如目錄唯讀：封鎖表仍然在記憶體裡有效，只是重啟後不會保留
+            pass
+
+    def ensure_loaded(self, config: BanConfig) -> None:
+        """第一次用到（或 PERSIST_PATH 換了）才讀檔。"""
+        if config.persist_path and config.persist_path != self._loaded_path:
+            self.load(config.persist_path, config.offense_window)
+
+    def load(self, filename: str, offense_window: float = DEFAULT_OFFENSE_WINDOW) -> None:
+        self._loaded_path = filename
+        try:
+            entries = _read_entries(filename)
+        except OSError:
+            return
+
+        now = time.time()
+        for ip, entry in entries.items():
+            # 檔案裡比較新的紀錄優先
+            current = self._bans.get(ip)
+            if current is None or current[3] < entry[3]:
+                self._bans[ip] = entry
+        # 已經解除、也不會再算進再犯次數的紀錄就不必讀進來
+        for ip in [ip for ip, e in self._bans.items() if e[0] <= now and e[3] < now - offense_window]:
+            del self._bans[ip]
+
+    def compact(self, filename: str, offense_window: float = DEFAULT_OFFENSE_WINDOW) -> None:
+        """
+        把存檔重寫成每個 IP 一行（只留還會用到的紀錄）。
+        拿檔案鎖（exclusive）期間其他行程的 flush() 會等，重寫完才繼續 append 到新檔案。
+        """
+        with _file_lock(filename, exclusive=True):
+            entries = _read_entries(filename)
+            now = time.time()
+            lines = [
+                json.dumps(dict(_entry_to_dict(e), ip=ip)) + "\n"
+                for ip, e in entries.items()
+                if e[0] > now or e[3] >= now - offense_window
+            ]
+            tmp = f"{filename}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+                os.replace(tmp, filename)
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+
+
+def _entry_to_dict(entry: List) -> dict:
+    return {"expires_at": entry[0], "offenses": entry[1], "attack_type": entry[2], "last_offense": entry[3]}
+
+
+def _parse_entry(e) -> Optional[List]:
+    try:
+        return [float(e["expires_at"]), int(e["offenses"]), str(e["attack_type"]), float(e["last_offense"])]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _read_entries(filename: str) -> Dict[str, List]:
+    """
+    讀存檔並合併：每行一筆 {"ip": ..., ...}，同一個 IP 取最後違規時間最新的一筆。
+    舊版存檔是一整個 {ip: {...}} 物件，也一起支援；寫到一半的最後一行直接略過。
+    """
+    merged: Dict[str, List] = {}
+
+    def _merge(ip, e) -> None:
+        entry = _parse_entry(e)
+        if entry is None or not isinstance(ip, str):
+            return
+        current = merged.get(ip)
+        if current is None or current[3] <= entry[3]:
+            merged[ip] = entry
+
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            if "ip" in obj:
+                _merge(obj["ip"], obj)
+            else:
+                for ip, e in obj.items():
+                    _merge(ip, e)
+    return merged
+
+
+@contextmanager
+def _file_lock(filename: str, exclusive: bool) -> Iterator[None]:
+    """
+    用旁邊的 .lock 檔做跨行程的讀寫鎖（append 用 shared、壓縮用 exclusive）。
+    沒有 fcntl 的平台不上鎖（也不會壓縮，所以只有 append）。
+    """
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(filename + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
@@ -0,0 +1,92 @@
+# bench_detect.py（在專案根目錄執行：python -m detection.bench_detect）
+
+"""
+比較舊的 dict API（detect_attack：dict 進、dict 出、每次格式化時間）
+和 __slots__ 型別 API（detect：DetectionInput 進、DetectionResult 出、時間延後格式化）
+每次呼叫的時間與暫時配置的記憶體。
+
+只用沒有狀態的檢查（關掉限流 / 封鎖 / 判斷快取），避免結果被快取或被限流影響。
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from detection import rules as rules_module
+from detection.detector import detect, detect_attack
+from detection.models import DetectionInput
+from detection.rules import load_rules
+
+SAMPLES = {
+    "benign": {
+        "ip_address": "10.0.0.2",
+        "url": "/api/search",
+        "http_method": "POST",
+        "params": {"page": "1"},
+        "body": {"keyword": "我想搜尋安全程式設計"},
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+    },
+    "sqli": {
+        "ip_address": "1.2.3.4",
+        "url": "/api/login",
+        "http_method": "GET",
+        "params": {},
+        "body": {"username": "' OR 1=1 --", "password": "abc"},
+        "user_agent": "Mozilla/5.0",
+    },
+}
+
+
+def _disable_stateful_checks() -> None:
+    rules = load_rules()
+    rules.rate_limits.enabled = False
+    rules.bans.enabled = False
+    rules.decision_cache.enabled = False
+    rules_module._ACTIVE = rules
+
+
+def _per_call_us(func, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def _per_call_bytes(func, n: int) -> float:
+    """每次呼叫暫時配置的記憶體高峰（bytes）。"""
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(n):
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - base
+    finally:
+        tracemalloc.stop()
+    return total / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dict API vs slotted DetectionInput / DetectionResult")
+    parser.add_argument("--calls", type=int, default=50000)
+    args = parser.parse_args()
+
+    _disable_stateful_checks()
+
+    for name, sample in SAMPLES.items():
+        typed = DetectionInput.from_dict(sample)
+        cases = {
+            "detect_attack(dict) -> dict": lambda: detect_attack(sample),
+            "detect(DetectionInput)     ": lambda: detect(typed),
+        }
+        for label, func in cases.items():
+            func()  # 暖機（第一次會載入規則）
+            us = _per_call_us(func, args.calls)
+            mem = _per_call_bytes(func, min(args.calls, 2000))
+            print(f"{name:<7} {label}  {us:7.2f} µs/call  {mem:8.0f} B peak/call")
+
+
+if __name__ == "__main__":
+    main()
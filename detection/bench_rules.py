@@ -0,0 +1,77 @@
+# bench_rules.py（在專案根目錄執行：python -m detection.bench_rules）
+
+"""
+比較 worker 冷啟動（解析 JSON + 編譯自動機）與熱啟動（載入編譯結果快取）的時間。
+
+會在暫存資料夾產生一份放大的規則檔（每個類別加上 --extra 個隨機關鍵字），
+模擬規則變多之後的情況。
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import tempfile
+import time
+
+from detection.rules import CACHE_DIR_ENV, DEFAULT_RULES, RuleSet, cache_path_for
+
+
+def _random_pattern(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase + " =(<'/") for _ in range(rng.randint(4, 16)))
+
+
+def build_rules_file(directory: str, extra: int) -> str:
+    rng = random.Random(42)
+    data = {"MODE": "BLOCK"}
+    for key, patterns in DEFAULT_RULES.items():
+        data[key] = list(patterns) + [_random_pattern(rng) for _ in range(extra)]
+    path = os.path.join(directory, "rules.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return path
+
+
+def _timeit(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm rule loading")
+    parser.add_argument("--extra", type=int, nargs="+", default=[0, 1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 快取也放在暫存資料夾（mkdtemp 建立的資料夾權限就是 0700），跑完一起刪掉
+        os.environ[CACHE_DIR_ENV] = directory
+        for extra in args.extra:
+            path = build_rules_file(directory, extra)
+            cache = cache_path_for(path)
+
+            def cold():
+                if os.path.exists(cache):
+                    os.remove(cache)
+                RuleSet.from_file(path)      # 解析 + 編譯 + 寫快取
+
+            def warm():
+                RuleSet.from_file(path)      # 只讀快取
+
+            cold_s = _timeit(cold, args.repeat)
+            warm_s = _timeit(warm, args.repeat)
+            rules = RuleSet.from_file(path)
+            print(
+                f"patterns/category=+{extra:<6} states={rules.matcher.state_count:<8} "
+                f"cold={cold_s * 1000:9.1f} ms  warm={warm_s * 1000:9.1f} ms  "
+                f"cache={os.path.getsize(cache) / 1024:8.0f} KB"
+            )
+
+
+if __name__ == "__main__":
+    main()
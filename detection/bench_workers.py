@@ -0,0 +1,83 @@
+# bench_workers.py（在專案根目錄執行：python -m detection.bench_workers）
+
+"""
+比較單一行程直接呼叫 detect() 與 DetectionWorkerPool（不同子行程數）的吞吐量。
+
+用很多不同 IP、不同內容的請求（關掉判斷快取的效果：每筆內容都不一樣），
+以 asyncio 同時送出 --concurrency 筆，量測每秒可以偵測幾筆。
+子行程數增加時，req/s 應該接近線性上升，直到碰到 CPU 核心數。
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from detection.detector import detect
+from detection.models import DetectionInput
+from detection.worker_pool import DetectionWorkerPool
+
+_WORDS = ["product", "price", "安全", "login", "' or 1=1", "<script>", "../etc/passwd", "report", "2024"]
+
+
+def build_inputs(n: int):
+    rng = random.Random(1)
+    inputs = []
+    for i in range(n):
+        keyword = " ".join(rng.choice(_WORDS) for _ in range(8)) + f" {i}"
+        inputs.append(DetectionInput(
+            f"10.{i % 200}.{(i // 200) % 200}.{i % 7}",
+            f"/api/search?page={i}",
+            "POST",
+            {"page": str(i), "sort": "desc"},
+            {"keyword": keyword, "note": keyword[::-1] * 4},
+            "Mozilla/5.0 (X11; Linux x86_64)",
+        ))
+    return inputs
+
+
+def run_inline(inputs) -> float:
+    start = time.perf_counter()
+    for item in inputs:
+        detect(item)
+    return len(inputs) / (time.perf_counter() - start)
+
+
+async def _run_pool(pool: DetectionWorkerPool, inputs, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with sem:
+            await pool.detect(item)
+
+    # 暖機：確保每個子行程都載入好規則
+    await asyncio.gather(*(one(item) for item in inputs[: pool.processes * 8]))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in inputs))
+    return len(inputs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="detect() throughput: inline vs worker processes")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--concurrency", type=int, default=512)
+    args = parser.parse_args()
+
+    inputs = build_inputs(args.requests)
+    detect(inputs[0])  # 載入規則
+    print(f"inline (1 process, no pool): {run_inline(inputs):10.0f} req/s   (cpu_count={os.cpu_count()})")
+
+    for n in sorted(set(args.processes)):
+        pool = DetectionWorkerPool(processes=n)
+        pool.start()
+        try:
+            rate = asyncio.run(_run_pool(pool, inputs, args.concurrency))
+        finally:
+            pool.shutdown()
+        print(f"worker pool, processes={n:<3}       {rate:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
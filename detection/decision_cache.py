@@ -0,0 +1,120 @@
+# decision_cache.py
+
+"""
+重複請求的判斷快取。
+
+掃描器與重試常常送出一模一樣的請求（URL、參數、body、UA 都相同），
+每次都重新收集欄位、跑自動機很浪費。這裡把「只跟請求內容有關」的結果
+（關鍵字命中 + SSRF）存起來，下次同樣內容直接拿來用。
+
+暴力登入、限流、封鎖名單這些跟時間 / 次數有關的檢查不會被快取，每次都照常執行。
+
+rules.json 設定：
+"DECISION_CACHE": {
+  "ENABLED": true,
+  "MAX_ENTRIES": 10000,     # 最多快取幾筆（LRU）
+  "TTL_SECONDS": 300,       # 每筆最多保留幾秒
+  "MAX_KEY_BYTES": 4096     # 請求內容太大就不快取（避免大 body 佔記憶體）
+}
+規則一換（RuleSet.version 不同）整個快取自動清空。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_KEY_BYTES = 4096
+
+
+class DecisionCacheConfig:
+    """DECISION_CACHE 設定。"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_key_bytes: int = DEFAULT_MAX_KEY_BYTES,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_key_bytes = max_key_bytes
+
+    @classmethod
+    def from_dict(cls, data) -> "DecisionCacheConfig":
+        if not isinstance(data, dict):
+            return cls()
+
+        def _num(key: str, default):
+            value = data.get(key)
+            return value if isinstance(value, (int, float)) and value > 0 else default
+
+        return cls(
+            enabled=bool(data.get("ENABLED", False)),
+            max_entries=int(_num("MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=_num("TTL_SECONDS", DEFAULT_TTL_SECONDS),
+            max_key_bytes=int(_num("MAX_KEY_BYTES", DEFAULT_MAX_KEY_BYTES)),
+        )
+
+
+class DecisionCache:
+    """
+    LRU + TTL 快取：{key: (到期時間, 值)}，最近用過的在最後面。
+    version 是產生這些值的規則版本，和目前規則不同時整個清空。
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version: Any = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, version: Any) -> None:
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version: Any, now: Optional[float] = None) -> Optional[Any]:
+        """找不到或過期回傳 None。"""
+        self._check_version(version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now is None:
+                now = time.monotonic()
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any, version: Any, config: DecisionCacheConfig, now: Optional[float] = None) -> None:
+        self._check_version(version)
+        if now is None:
+            now = time.monotonic()
+        self._entries[key] = (now + config.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > config.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -14,184 +14,80 @@ DetectionInput 格式：
 DetectionResult 格式：
 {
   "is_attack": bool,
-  "attack_type": "SQLI" | "XSS" | "BRUTE_FORCE" | "PATH_TRAVERSAL"
+  "attack_type": "BANNED_IP" | "SQLI" | "XSS" | "BRUTE_FORCE" | "RATE_LIMIT" | "PATH_TRAVERSAL"
                  | "CMD_INJECTION" | "SSRF" | "SUSPICIOUS_UA" | "NONE",
-  "severity": "LOW" | "MEDIUM" | "HIGH",
+  "severity": "LOW" | "MEDIUM" | "HIGH" | "CRITICAL",   # CRITICAL 只有 CMD_INJECTION
   "payload": "string",
-  "should_block": bool   # 是否建議阻擋這個請求
+  "should_block": bool,  # 是否建議阻擋這個請求
+  "ip_address": "string",
+  "timestamp": "2025-11-26 22:45:12 +0800",   # 台灣時間，輸出時才格式化
+  "detected_at_ns": int  # 偵測當下的 epoch 奈秒（time.time_ns()，只取一次）
 }
-"""
-
-import time
-import json
-import os
-from typing import Dict, List, Tuple
-from urllib.parse import unquote, urlparse  # 用來解碼 URL / 參數 & 解析 URL
-from datetime import datetime, timezone, timedelta
-
-# =====================================================
-# 1. 預設攻擊關鍵字規則（如果沒有 rules.json 就用這些）
-# =====================================================
 
-DEFAULT_RULES = {
-    "SQLI_PATTERNS": [
-        # 基本 or 1=1 類型
-        " or 1=1",
-        "' or '1'='1",
-        "\" or \"1\"=\"1",
-        " or '1'='1",
-        " or 1=1 --",
-        " or 1=1--",
-        " or 1=1#",
-        " or 1=1/*",
-        " union select",
-        "--",       # SQL 註解
-        ";--",
-        "/*",
-        "*/",
-        # time-based / function 類型 SQLi
-        "sleep(",
-        "benchmark(",
-        "pg_sleep(",
-        "waitfor delay",
-    ],
-    "XSS_PATTERNS": [
-        "<script",      # <script>...</script>
-        "onerror=",     # <img src=x onerror=...>
-        "onload=",      # onload 事件
-        "javascript:",  # href="javascript:alert(1)"
-        "alert(",       # alert(1)
-        # 更多常見事件 handler
-        "onclick=",
-        "onmouseover=",
-        "onmouseenter=",
-        "onfocus=",
-        "onblur=",
-        "onchange=",
-        "onsubmit=",
-    ],
-    "PATH_TRAVERSAL_PATTERNS": [
-        "../",
-        "..\\",
-        "..%2f",        # URL 編碼的 ../（保留，雖然我們也會先解碼）
-        "%2e%2e%2f",    # ../ 的另一種編碼
-        "/etc/passwd",
-        "/etc/shadow",
-        "c:\\windows",
-        "c:/windows",
-        "windows\\system32",
-    ],
-    # 可疑 User-Agent 關鍵字
-    "SUSPICIOUS_UA_PATTERNS": [
-        "sqlmap",
-        "python-requests",
-        "curl",
-        "scanner",
-        "nmap",
-        "acunetix",
-        "burp",
-        "fuzzer",
-    ],
-    # NEW：Command Injection 關鍵字（簡化版）
-    "COMMAND_INJECTION_PATTERNS": [
-        # 管線與指令連接符號（示範用，實務會更嚴謹）
-        ";",
-        "&&",
-        "||",
-        "|",
-        "`",
-        "$(",
-        # 常見惡意指令片段
-        "bash -c",
-        "sh -c",
-        "cmd /c",
-        "powershell",
-        "nc ",
-        "netcat",
-        "wget ",
-        "curl ",
-        " cat /etc/passwd",
-        " rm -rf /",
-    ],
+detect_attack(input_data, collect_all=True) 會多回傳：
+{
+  "matches": [           # 所有命中的類別 + 欄位，依嚴重度高 → 低排序
+    {"attack_type": "...", "severity": "...", "payload": "...", "score": int},
+    ...
+  ],
+  "score": int           # 所有命中的分數加總
 }
+此時 attack_type / severity / payload 是排名第一的那一筆。
 
-# 暴力登入偵測設定：同一 IP 在 60 秒內超過 5 次 login 嘗試
-BRUTE_FORCE_WINDOW_SECONDS = 60
-BRUTE_FORCE_THRESHOLD = 5
-
-# 紀錄每個 IP 的登入嘗試時間戳
-_LOGIN_ATTEMPTS: Dict[str, List[float]] = {}
-
-# 這裡會放真正使用的規則（可能來自 DEFAULT，也可能被 rules.json 覆蓋）
-RULES = DEFAULT_RULES.copy()
-
-# 預設模式：只記錄不阻擋
-MODE = "LOG_ONLY"   # 可由 rules.json 改成 "BLOCK"
-
-
-# =====================================================
-# 2. 載入外部規則檔（rules.json，如果有的話）
-# =====================================================
+rules.json 開啟 ANOMALY_SCORING 時（異常分數模式，內附的 rules.json 預設關閉），
+每個結果都會帶 matches / score，attack_type 是嚴重度最高的那一筆（不是舊版規則順序的第一個），另外加上：
+{
+  "category_scores": {"SQLI": 7, ...}   # 各類別的分數
+}
+is_attack / should_block 改由分數和門檻決定，單一個低分規則（例如 "--"）不會再被當成攻擊。
 
-def _load_rules_from_file(filename: str = "rules.json") -> None:
-    """
-    嘗試從 rules.json 載入規則與模式。
-    如果檔案不存在或格式錯誤，就使用 DEFAULT_RULES + 預設 MODE。
-    """
-    global RULES, MODE, BRUTE_FORCE_WINDOW_SECONDS, BRUTE_FORCE_THRESHOLD
+內部用 models.py 的 DetectionInput / DetectionResult（__slots__）：
+detect() 接受 DetectionInput（或 dict）並回傳 DetectionResult；
+detect_attack() 是舊版 dict API，等於 detect(...).to_dict()。
+"""
 
-    if not os.path.exists(filename):
-        # 找不到檔案就維持預設規則與模式
-        return
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse  # 用來解碼 URL / 參數 & 解析 URL
 
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
+# 規則（關鍵字、MODE、暴力登入參數）統一由 rules.py 載入與編譯，
+# 第一次偵測時才會讀 rules.json，不依賴目前的工作目錄
+# 嚴重度表也放在 rules.py，這裡 import 進來（外部仍可從 detector 取用）
+from .rules import ATTACK_SEVERITY, SEVERITY_RANK, RuleSet, get_rules
+from .banlist import BanList
+from .decision_cache import DecisionCache
+from .models import DetectionInput, DetectionResult
+from .ratelimit import RateLimiter
 
-        # 只更新我們認得的 key，避免亂掉
-        for key in DEFAULT_RULES.keys():
-            if key in data and isinstance(data[key], list):
-                RULES[key] = data[key]
+# 紀錄每個 IP 的登入嘗試時間戳
+_LOGIN_ATTEMPTS: Dict[str, List[float]] = {}
 
-        # 從 JSON 調整 MODE（允許 LOG_ONLY 或 BLOCK）
-        mode = data.get("MODE")
-        if isinstance(mode, str) and mode.upper() in ("LOG_ONLY", "BLOCK"):
-            MODE = mode.upper()
+# 限流用的 token bucket（per IP / per (IP, 路徑) / 全域）
+_RATE_LIMITER = RateLimiter()
+# 算在單一 IP 頭上的限流 bucket；GLOBAL 超過是負載卸除，不算攻擊、不封鎖
+_CLIENT_RATE_SCOPES = ("PER_IP", "PER_ROUTE")
 
-        # （選擇性）也可以讓 JSON 調整暴力登入參數
-        if isinstance(data.get("BRUTE_FORCE_WINDOW_SECONDS"), int):
-            BRUTE_FORCE_WINDOW_SECONDS = int(data["BRUTE_FORCE_WINDOW_SECONDS"])
-        if isinstance(data.get("BRUTE_FORCE_THRESHOLD"), int):
-            BRUTE_FORCE_THRESHOLD = int(data["BRUTE_FORCE_THRESHOLD"])
+# 暫時封鎖的 IP
+_BAN_LIST = BanList()
 
-    except Exception:
-        # 有問題就直接忽略，維持預設
-        RULES = DEFAULT_RULES.copy()
-        MODE = "LOG_ONLY"
+# 只跟請求內容有關的判斷結果（關鍵字命中 + SSRF）
+_DECISION_CACHE = DecisionCache()
 
+_ATTACK_PRIORITY = {attack_type: i for i, attack_type in enumerate(ATTACK_SEVERITY)}
 
-# 啟動時就先試著載入一次
-_load_rules_from_file()
+# 命中紀錄：{attack_type: [(命中的欄位名稱, 該欄位原始內容, 分數), ...]}
+Hits = Dict[str, List[Tuple[str, str, int]]]
 
 
 # =====================================================
-# 3. 小工具函式
+# 1. 小工具函式
 # =====================================================
 
 def _to_str(value) -> str:
     """保險一點，把各種型別轉成字串。"""
     return str(value) if value is not None else ""
 
-def _now_tw() -> str:
-    """
-    回傳台灣時間（UTC+8）的字串，24 小時制。
-    例如：2025-11-26 22:45:12 +0800
-    """
-    tz = timezone(timedelta(hours=8))  # 台灣時區 = UTC+8
-    return datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S %z")
-
 
-def _collect_fields(input_data: dict) -> Dict[str, str]:
+def _collect_fields(input_data: DetectionInput) -> Dict[str, str]:
     """
     把 url / params / body / user_agent 全部攤平成一個 dict：
     {
@@ -209,55 +105,94 @@ def _collect_fields(input_data: dict) -> Dict[str, str]:
     pieces: Dict[str, str] = {}
 
     # URL、方法、User-Agent
-    raw_url = _to_str(input_data.get("url", ""))
-    decoded_url = unquote(raw_url)  # URL 解碼
-    pieces["url"] = decoded_url
-
-    pieces["http_method"] = _to_str(input_data.get("http_method", ""))
-    pieces["user_agent"] = _to_str(input_data.get("user_agent", ""))
-
-    # params 可能是 GET query string 的參數
-    params = input_data.get("params", {}) or {}
-    for k, v in params.items():
-        raw = _to_str(v)
-        decoded = unquote(raw)      # 參數也先解碼一次
-        pieces[f"param.{k}"] = decoded
-
-    # body 是 POST/PUT 的內容
-    body = input_data.get("body", {}) or {}
-    for k, v in body.items():
-        raw = _to_str(v)
-        decoded = unquote(raw)      # body 內容也先解碼
-        pieces[f"body.{k}"] = decoded
+    pieces["url"] = unquote(_to_str(input_data.url))  # URL 解碼
+    pieces["http_method"] = _to_str(input_data.http_method)
+    pieces["user_agent"] = _to_str(input_data.user_agent)
+
+    # params 可能是 GET query string 的參數（參數也先解碼一次）
+    for k, v in input_data.params.items():
+        pieces[f"param.{k}"] = unquote(_to_str(v))
+
+    # body 是 POST/PUT 的內容（body 內容也先解碼）
+    for k, v in input_data.body.items():
+        pieces[f"body.{k}"] = unquote(_to_str(v))
 
     return pieces
 
 
-def _find_pattern(pieces: Dict[str, str], patterns: List[str]) -> Tuple[bool, str, str]:
+def _scan_fields(pieces: Dict[str, str], rules: RuleSet) -> Hits:
     """
-    在所有欄位裡面找有沒有出現任一 pattern。
+    用編譯好的自動機把每個欄位掃描一次，找出所有命中的類別與欄位。
     回傳：
-      (是否命中, 該欄位名稱, 該欄位原始內容)
-    沒找到則回傳 (False, "", "")。
+      {attack_type: [(命中的欄位名稱, 該欄位原始內容, 類別分數), ...]}
+    欄位依 pieces 的順序檢查，所以每個類別的第一筆就是「第一個」命中的欄位，
+    和過去逐一比對每個 pattern 的結果相同。
+    SUSPICIOUS_UA 類別只看 user_agent 欄位。
     """
-    for field_name, raw_value in pieces.items():
-        value_lower = raw_value.lower()
-        for p in patterns:
-            if p and p.lower() in value_lower:
-                return True, field_name, raw_value
-    return False, "", ""
+    matcher = rules.matcher
+    categories = rules.categories
+    weights = rules.scoring.category_weights
+    ua_bit = 1 << categories.index("SUSPICIOUS_UA")
+    hits: Hits = {}
 
+    for field_name, raw_value in pieces.items():
+        mask = matcher.category_mask(raw_value.lower())
+        if field_name != "user_agent":
+            mask &= ~ua_bit
+        while mask:
+            low = mask & -mask
+            attack_type = categories[low.bit_length() - 1]
+            hit = (field_name, raw_value, weights[attack_type])
+            if attack_type in hits:
+                hits[attack_type].append(hit)
+            else:
+                hits[attack_type] = [hit]
+            mask ^= low
+    return hits
+
+
+def _score_fields(pieces: Dict[str, str], rules: RuleSet) -> Hits:
+    """
+    異常分數模式用的掃描：和 _scan_fields 一樣每個欄位只掃一次，
+    但記下命中了哪些關鍵字，同一欄位同一類別的分數 = 命中關鍵字的分數加總
+    （每個關鍵字只算一次，分數在編譯規則時就算好放在 rules.pattern_weights）。
+    """
+    matcher = rules.matcher
+    categories = rules.categories
+    patterns = matcher.patterns
+    weights = rules.pattern_weights
+    hits: Hits = {}
 
-def _check_bruteforce(input_data: dict) -> Tuple[bool, str]:
+    for field_name, raw_value in pieces.items():
+        ids = matcher.matched_ids(raw_value.lower())
+        if not ids:
+            continue
+        points: Dict[str, int] = {}
+        for pid in ids:
+            attack_type = categories[patterns[pid][1]]
+            if attack_type == "SUSPICIOUS_UA" and field_name != "user_agent":
+                continue
+            points[attack_type] = points.get(attack_type, 0) + weights[pid]
+        # 依類別順序加入，和 _scan_fields 的順序一致
+        for attack_type in categories:
+            if attack_type in points:
+                hits.setdefault(attack_type, []).append(
+                    (field_name, raw_value, points[attack_type])
+                )
+    return hits
+
+
+def _check_bruteforce(input_data: DetectionInput, rules: RuleSet, now: float) -> Tuple[bool, str]:
     """
     暴力登入偵測：
     - 只看 URL 中有 "login" 的請求（當作登入嘗試）
     - 以 ip_address 當 key，記錄最近一段時間的嘗試
-    - 同一 IP 在 BRUTE_FORCE_WINDOW_SECONDS 內超過 BRUTE_FORCE_THRESHOLD 次，就算 BRUTE_FORCE
+    - 同一 IP 在 BRUTE_FORCE_WINDOW_SECONDS 秒內達到 BRUTE_FORCE_THRESHOLD 次，就算 BRUTE_FORCE
+      （兩個數字都來自 rules.json）
     """
-    ip = _to_str(input_data.get("ip_address", ""))
-    url = _to_str(input_data.get("url", "")).lower()
-    method = _to_str(input_data.get("http_method", "")).upper()
+    ip = _to_str(input_data.ip_address)
+    url = _to_str(input_data.url).lower()
+    method = _to_str(input_data.http_method).upper()
 
     # 不是 login 相關的就不算登入嘗試
     if "login" not in url:
@@ -267,36 +202,32 @@ def _check_bruteforce(input_data: dict) -> Tuple[bool, str]:
     if method != "POST":
         return False, ""
 
-    now = time.time()
     attempts = _LOGIN_ATTEMPTS.get(ip, [])
     attempts.append(now)
 
     # 移除超過時間窗的舊紀錄
-    cutoff = now - BRUTE_FORCE_WINDOW_SECONDS
+    cutoff = now - rules.brute_force_window
     attempts = [t for t in attempts if t >= cutoff]
     _LOGIN_ATTEMPTS[ip] = attempts
 
-    if len(attempts) >= BRUTE_FORCE_THRESHOLD:
-        info = f"{ip} tried login {len(attempts)} times in {BRUTE_FORCE_WINDOW_SECONDS} seconds"
+    if len(attempts) >= rules.brute_force_threshold:
+        info = f"{ip} tried login {len(attempts)} times in {rules.brute_force_window} seconds"
         return True, info
 
     return False, ""
 
 
-def _check_suspicious_ua(input_data: dict) -> Tuple[bool, str]:
+def _check_rate_limit(input_data: DetectionInput, rules: RuleSet) -> Tuple[str, str]:
     """
-    檢查 User-Agent 是否包含常見掃描器 / 攻擊工具字樣。
-    命中時視為 SUSPICIOUS_UA，屬於低～中風險（輕量級告警）。
+    限流偵測：每個請求都會扣 token（rules.json 的 RATE_LIMITS），
+    所以要在任何提早 return 之前呼叫。路徑不含 query string。
+    回傳 (超過的 bucket：PER_IP / PER_ROUTE / GLOBAL，沒超過是 "", 說明)。
     """
-    ua = _to_str(input_data.get("user_agent", "")).lower()
-    if not ua:
-        return False, ""
-
-    for pattern in RULES.get("SUSPICIOUS_UA_PATTERNS", []):
-        p = pattern.lower()
-        if p and p in ua:
-            return True, ua
-    return False, ""
+    if not rules.rate_limits.enabled:
+        return "", ""
+    ip = _to_str(input_data.ip_address)
+    route = urlparse(_to_str(input_data.url)).path or "/"
+    return _RATE_LIMITER.hit(ip, route, rules.rate_limits)
 
 
 def _is_private_or_metadata_ip(host: str) -> bool:
@@ -332,28 +263,16 @@ def _is_private_or_metadata_ip(host: str) -> bool:
     return False
 
 
-def _check_ssrf(input_data: dict) -> Tuple[bool, str]:
+def _check_ssrf(pieces: Dict[str, str]) -> Tuple[bool, str]:
     """
     NEW：簡化版 SSRF 偵測。
     想像有一個 API 會讓 user 填 URL（例如 /api/fetch?url=...），
     這裡會找出所有看起來像 URL 的欄位，判斷是否打到內網 / metadata。
+    直接用 _collect_fields 已經解碼好的欄位（url、params、body），不再另外建一份清單。
     """
-    candidates: List[str] = []
-
-    # 先把原始 URL 也算進可能的 payload
-    raw_url = unquote(_to_str(input_data.get("url", "")))
-    candidates.append(raw_url)
-
-    # params / body 裡的內容
-    params = input_data.get("params", {}) or {}
-    body = input_data.get("body", {}) or {}
-
-    for d in (params, body):
-        for _, v in d.items():
-            s = unquote(_to_str(v))
-            candidates.append(s)
-
-    for value in candidates:
+    for field_name, value in pieces.items():
+        if field_name == "http_method" or field_name == "user_agent":
+            continue
         v = value.strip()
         if not v:
             continue
@@ -389,113 +308,308 @@ def _check_ssrf(input_data: dict) -> Tuple[bool, str]:
     return False, ""
 
 
-def _apply_block_flag(result: dict) -> dict:
+def _mark(result: DetectionResult, attack_type: str, payload: str) -> None:
+    """把結果設成命中 attack_type。"""
+    result.is_attack = True
+    result.attack_type = attack_type
+    result.severity = ATTACK_SEVERITY[attack_type]
+    result.payload = payload
+
+
+def _apply_block_flag(result: DetectionResult, rules: RuleSet) -> DetectionResult:
     """
-    根據全域 MODE，決定這次偵測結果是否應該被阻擋。
+    根據規則的 MODE，決定這次偵測結果是否應該被阻擋。
     - LOG_ONLY：永遠不阻擋（should_block = False）
     - BLOCK：只要 is_attack = True 就 should_block = True
     """
-    if result.get("is_attack") and MODE == "BLOCK":
-        result["should_block"] = True
-    else:
-        result["should_block"] = False
+    result.should_block = result.is_attack and rules.mode == "BLOCK"
+    return result
+
+
+def _apply_scoring(result: DetectionResult, rules: RuleSet) -> DetectionResult:
+    """
+    異常分數模式：用分數和門檻決定 is_attack / should_block。
+    - 總分 >= LOG_THRESHOLD，或任一類別分數 >= 該類別的 LOG 門檻 → is_attack
+    - MODE = BLOCK 時，總分 >= BLOCK_THRESHOLD，或任一類別 >= 該類別的 BLOCK 門檻 → should_block
+    沒到門檻的結果 attack_type 維持 NONE，但 matches / score 仍然保留，方便調整門檻。
+    """
+    scoring = rules.scoring
+    total = result.score
+    category_scores = result.category_scores
+
+    is_attack = total >= scoring.log_threshold
+    should_block = total >= scoring.block_threshold
+    for attack_type, score in category_scores.items():
+        log_at, block_at = scoring.thresholds(attack_type)
+        is_attack = is_attack or score >= log_at
+        should_block = should_block or score >= block_at
+
+    if not is_attack:
+        result.is_attack = False
+        result.attack_type = "NONE"
+        result.severity = "LOW"
+        result.payload = ""
+
+    result.should_block = is_attack and should_block and rules.mode == "BLOCK"
     return result
 
 
 # =====================================================
-# 4. 主偵測函式
+# 2. 主偵測函式
 # =====================================================
 
-def detect_attack(input_data: dict) -> dict:
+def _collect_all_matches(
+    input_data: DetectionInput,
+    rules: RuleSet,
+    hits: Hits,
+    rate_limited: Tuple[bool, str],
+    ssrf: Tuple[bool, str],
+    now: float,
+) -> List[dict]:
     """
-    核心偵測函式。
-
-    會檢查：
-    - SQL Injection：RULES["SQLI_PATTERNS"]
-    - XSS：RULES["XSS_PATTERNS"]
-    - Path Traversal：RULES["PATH_TRAVERSAL_PATTERNS"]
-    - Command Injection：RULES["COMMAND_INJECTION_PATTERNS"]
-    - Brute Force Login
-    - SSRF（打內網 / metadata IP）
-    - Suspicious User-Agent：RULES["SUSPICIOUS_UA_PATTERNS"]
+    collect_all / 異常分數模式：不在第一個命中的類別就停下來，
+    把同一次掃描找到的所有類別 / 欄位，加上暴力登入、限流與 SSRF，全部列出並排序。
     """
-    # 預設結果（沒有攻擊）
-    result = {
-        "is_attack": False,
-        "attack_type": "NONE",
-        "severity": "LOW",
-        "payload": "",
-        "should_block": False,   # 先預設 False，最後再由 _apply_block_flag 決定
-    
-        "ip_address": _to_str(input_data.get("ip_address", "")),
-        "timestamp": _now_tw(),
-    }
-
-    # 把所有欄位收集起來（url / params / body / user_agent）
-    pieces = _collect_fields(input_data)
-
-    # 檢查 SQL Injection
-    hit, field, value = _find_pattern(pieces, RULES["SQLI_PATTERNS"])
-    if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "SQLI"
-        result["severity"] = "HIGH"
-        result["payload"] = f"{field}: {value}"
-        return _apply_block_flag(result)
-
-    # 檢查 XSS
-    hit, field, value = _find_pattern(pieces, RULES["XSS_PATTERNS"])
+    matches: List[dict] = []
+    weights = rules.scoring.category_weights
+
+    def add(attack_type: str, payload: str, score: int) -> None:
+        matches.append({
+            "attack_type": attack_type,
+            "severity": ATTACK_SEVERITY[attack_type],
+            "payload": payload,
+            "score": score,
+        })
+
+    for attack_type in ("SQLI", "XSS", "PATH_TRAVERSAL", "CMD_INJECTION"):
+        for field, value, score in hits.get(attack_type, ()):
+            add(attack_type, f"{field}: {value}", score)
+
+    hit, info = _check_bruteforce(input_data, rules, now)
     if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "XSS"
-        result["severity"] = "MEDIUM"
-        result["payload"] = f"{field}: {value}"
-        return _apply_block_flag(result)
-
-    # 檢查 Path Traversal（目錄遍歷 / 檔案讀取）
-    hit, field, value = _find_pattern(pieces, RULES["PATH_TRAVERSAL_PATTERNS"])
+        add("BRUTE_FORCE", info, weights["BRUTE_FORCE"])
+
+    hit, info = rate_limited
     if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "PATH_TRAVERSAL"
-        result["severity"] = "HIGH"
-        result["payload"] = f"{field}: {value}"
-        return _apply_block_flag(result)
-
-    # 檢查 Command Injection
-    hit, field, value = _find_pattern(pieces, RULES["COMMAND_INJECTION_PATTERNS"])
+        add("RATE_LIMIT", info, weights["RATE_LIMIT"])
+
+    hit, url_str = ssrf
     if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "CMD_INJECTION"
-        result["severity"] = "CRITICAL"  # 你也可以在報告特別強調
-        result["payload"] = f"{field}: {value}"
-        return _apply_block_flag(result)
+        add("SSRF", f"target_url: {url_str}", weights["SSRF"])
+
+    if "SUSPICIOUS_UA" in hits:
+        _, value, score = hits["SUSPICIOUS_UA"][0]
+        add("SUSPICIOUS_UA", f"user_agent: {value.lower()}", score)
+
+    # 嚴重度高的在前；同嚴重度依原本的檢查優先順序（sort 是穩定的，同類別保持欄位順序）
+    matches.sort(key=lambda m: (-SEVERITY_RANK[m["severity"]], _ATTACK_PRIORITY[m["attack_type"]]))
+    return matches
+
+
+def _cache_key(input_data: DetectionInput, max_bytes: int) -> Optional[tuple]:
+    """
+    把請求內容轉成可以當 dict key 的 tuple（欄位順序保留，會影響「第一個命中」的欄位）。
+    內容超過 max_bytes 就回傳 None（不快取）。
+    """
+    key = (
+        _to_str(input_data.url),
+        _to_str(input_data.http_method),
+        _to_str(input_data.user_agent),
+        tuple((k, _to_str(v)) for k, v in input_data.params.items()),
+        tuple((k, _to_str(v)) for k, v in input_data.body.items()),
+    )
+    size = len(key[0]) + len(key[1]) + len(key[2])
+    for k, v in key[3] + key[4]:
+        size += len(k) + len(v)
+    if size > max_bytes:
+        return None
+    return key
+
+
+def _content_verdict(input_data: DetectionInput, rules: RuleSet) -> Tuple[Hits, Tuple[bool, str]]:
+    """
+    收集欄位並掃描（每個欄位只掃一次），再檢查 SSRF。
+    開啟 DECISION_CACHE 時，相同內容的請求直接回傳上次的結果。
+    """
+    config = rules.decision_cache
+    key = None
+    if config.enabled:
+        key = _cache_key(input_data, config.max_key_bytes)
+        if key is not None:
+            cached = _DECISION_CACHE.get(key, rules.version or id(rules))
+            if cached is not None:
+                return cached
+
+    # 把所有欄位收集起來（url / params / body / user_agent），每個欄位只掃描一次
+    pieces = _collect_fields(input_data)
+    if rules.scoring.enabled:
+        hits = _score_fields(pieces, rules)
+    else:
+        hits = _scan_fields(pieces, rules)
+    verdict = (hits, _check_ssrf(pieces))
+
+    if key is not None:
+        _DECISION_CACHE.put(key, verdict, rules.version or id(rules), config)
+    return verdict
+
+
+def decision_cache_stats() -> dict:
+    """判斷快取的命中率等統計（給 /api/detection-cache-stats 之類的監控用）。"""
+    return _DECISION_CACHE.stats()
+
+
+def _banned_result(
+    result: DetectionResult,
+    rules: RuleSet,
+    banned: Tuple[str, float, int],
+    collect_all: bool,
+) -> DetectionResult:
+    """封鎖中的 IP 的偵測結果（BANNED_IP）。"""
+    attack_type, remaining, offenses = banned
+    _mark(
+        result,
+        "BANNED_IP",
+        f"{result.ip_address} banned for {attack_type} "
+        f"({remaining:.0f} seconds left, offense #{offenses})",
+    )
+    if collect_all or rules.scoring.enabled:
+        score = rules.scoring.category_weights["BANNED_IP"]
+        result.matches = [{
+            "attack_type": "BANNED_IP",
+            "severity": result.severity,
+            "payload": result.payload,
+            "score": score,
+        }]
+        result.score = score
+        if rules.scoring.enabled:
+            result.category_scores = {"BANNED_IP": score}
+    return _apply_block_flag(result, rules)
+
+
+def _detect(
+    input_data: DetectionInput,
+    rules: RuleSet,
+    result: DetectionResult,
+    collect_all: bool,
+) -> DetectionResult:
+    """detect() 的本體（封鎖表以外的所有檢查）。"""
+    # 這次偵測的時間只取一次（result 建立時），暴力登入的時間窗也用同一個值
+    now = result.detected_at_ns / 1_000_000_000
+
+    # 限流每個請求都要扣 token，先算好，依優先順序再決定要不要回報
+    scope, info = _check_rate_limit(input_data, rules)
+    if scope == "GLOBAL":
+        # 全域額度用完：負載卸除，不是這個 IP 的攻擊（不算 RATE_LIMIT、不封鎖）
+        result.overloaded = True
+        rate_limited = (False, "")
+    else:
+        # 只有 PER_IP / PER_ROUTE 超過才是這個 IP 的 RATE_LIMIT（也才可能進封鎖表）
+        rate_limited = (scope in _CLIENT_RATE_SCOPES, info)
+
+    # 關鍵字命中與 SSRF 只跟請求內容有關，相同內容可以直接用快取
+    hits, ssrf = _content_verdict(input_data, rules)
+
+    scoring = rules.scoring.enabled
+    if collect_all or scoring:
+        matches = _collect_all_matches(input_data, rules, hits, rate_limited, ssrf, now)
+        result.matches = matches
+        result.score = sum(m["score"] for m in matches)
+        if matches:
+            top = matches[0]
+            _mark(result, top["attack_type"], top["payload"])
+        if scoring:
+            category_scores: Dict[str, int] = {}
+            for m in matches:
+                category_scores[m["attack_type"]] = category_scores.get(m["attack_type"], 0) + m["score"]
+            result.category_scores = category_scores
+            return _apply_scoring(result, rules)
+        return _apply_block_flag(result, rules)
+
+    # 檢查 SQL Injection / XSS / Path Traversal / Command Injection（依優先順序）
+    for attack_type in ("SQLI", "XSS", "PATH_TRAVERSAL", "CMD_INJECTION"):
+        if attack_type in hits:
+            field, value, _ = hits[attack_type][0]
+            _mark(result, attack_type, f"{field}: {value}")
+            return _apply_block_flag(result, rules)
 
     # 檢查暴力登入（Brute Force）
-    hit, info = _check_bruteforce(input_data)
+    hit, info = _check_bruteforce(input_data, rules, now)
     if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "BRUTE_FORCE"
-        result["severity"] = "MEDIUM"
-        result["payload"] = info
-        return _apply_block_flag(result)
+        _mark(result, "BRUTE_FORCE", info)
+        return _apply_block_flag(result, rules)
+
+    # 檢查限流（Rate Limit）
+    hit, info = rate_limited
+    if hit:
+        _mark(result, "RATE_LIMIT", info)
+        return _apply_block_flag(result, rules)
 
     # 檢查 SSRF
-    hit, url_str = _check_ssrf(input_data)
+    hit, url_str = ssrf
     if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "SSRF"
-        result["severity"] = "HIGH"
-        result["payload"] = f"target_url: {url_str}"
-        return _apply_block_flag(result)
+        _mark(result, "SSRF", f"target_url: {url_str}")
+        return _apply_block_flag(result, rules)
 
     # 檢查可疑 User-Agent
-    hit, ua = _check_suspicious_ua(input_data)
-    if hit:
-        result["is_attack"] = True
-        result["attack_type"] = "SUSPICIOUS_UA"
-        result["severity"] = "LOW"
-        result["payload"] = f"user_agent: {ua}"
-        return _apply_block_flag(result)
+    if "SUSPICIOUS_UA" in hits:
+        _mark(result, "SUSPICIOUS_UA", f"user_agent: {hits['SUSPICIOUS_UA'][0][1].lower()}")
+        return _apply_block_flag(result, rules)
 
     # 沒有任何攻擊
-    return _apply_block_flag(result)
+    return _apply_block_flag(result, rules)
+
+
+def detect(input_data: Union[DetectionInput, dict], collect_all: bool = False) -> DetectionResult:
+    """
+    核心偵測函式（回傳 DetectionResult）。
+
+    會檢查：
+    - SQL Injection：SQLI_PATTERNS
+    - XSS：XSS_PATTERNS
+    - Path Traversal：PATH_TRAVERSAL_PATTERNS
+    - Command Injection：COMMAND_INJECTION_PATTERNS
+    - Banned IP：BAN_LIST（封鎖期內的 IP 最先檢查，不再掃描欄位）
+    - Brute Force Login
+    - Rate Limit：RATE_LIMITS（token bucket）
+    - SSRF（打內網 / metadata IP）
+    - Suspicious User-Agent：SUSPICIOUS_UA_PATTERNS
+    （規則來自 rules.py 的 get_rules()）
+
+    collect_all=False（預設）：回傳第一個命中的類別（舊版行為，ANOMALY_SCORING 關閉時才有效）。
+    collect_all=True：回傳所有命中的類別與欄位（matches）、總分（score）與最高嚴重度。
+    rules.json 開啟 ANOMALY_SCORING 時，一律走 collect_all 的流程，再依分數門檻判斷。
+    """
+    if not isinstance(input_data, DetectionInput):
+        input_data = DetectionInput.from_dict(input_data)
+
+    # 預設結果（沒有攻擊）；時間只記錄一次 time_ns()，要輸出時才格式化
+    result = DetectionResult(_to_str(input_data.ip_address))
+
+    rules = get_rules()
+    bans = rules.bans
+
+    # 封鎖中的 IP：查一次 dict 就回傳，不做任何掃描
+    if bans.enabled:
+        _BAN_LIST.ensure_loaded(bans)
+        banned = _BAN_LIST.check(result.ip_address, result.detected_at_ns / 1_000_000_000)
+        if banned is not None:
+            return _banned_result(result, rules, banned, collect_all)
+
+    result = _detect(input_data, rules, result, collect_all)
+
+    # BLOCK 模式下命中需要封鎖的類型，就把這個 IP 加進封鎖表
+    # （RATE_LIMIT 只會來自這個 IP 自己的 PER_IP / PER_ROUTE bucket；全域額度用完不會封鎖任何人）
+    if bans.enabled and result.should_block:
+        types = [result.attack_type] + [m["attack_type"] for m in result.matches or ()]
+        for attack_type in types:
+            if attack_type in bans.durations:
+                _BAN_LIST.ban(result.ip_address, attack_type, bans, result.detected_at_ns / 1_000_000_000)
+                break
+    return result
+
+
+def detect_attack(input_data: dict, collect_all: bool = False) -> dict:
+    """
+    舊版 dict API：和 detect() 相同，但回傳 dict（格式見檔案開頭的 DetectionResult 說明）。
+    """
+    return detect(input_data, collect_all).to_dict()
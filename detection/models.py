@@ -0,0 +1,137 @@
+# models.py
+
+"""
+偵測用的輸入 / 輸出型別。
+
+detect_attack() 以前每次都要建好幾個 dict，還會先把時間格式化成字串
+（大部分正常請求的結果根本沒人看）。這裡改成 __slots__ 類別：
+
+- DetectionInput：一個請求的內容（欄位和原本的 DetectionInput dict 相同）
+- DetectionResult：偵測結果；偵測時只記錄一次 time.time_ns()（detected_at_ns），
+  timestamp 字串第一次被讀取時才格式化
+
+舊的 dict API（detect_attack 回傳 dict）用 DetectionResult.to_dict() 轉換；
+兩個類別也都有 .get(key, default)，原本用 dict.get 讀欄位的程式不用改。
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+
+# 台灣時區 = UTC+8（建一次就好，不用每次偵測都重建）
+TW_TZ = timezone(timedelta(hours=8))
+
+
+def format_tw(epoch_ns: int) -> str:
+    """
+    把 epoch 奈秒轉成台灣時間（UTC+8）的字串，24 小時制。
+    例如：2025-11-26 22:45:12 +0800
+    """
+    return datetime.fromtimestamp(epoch_ns // 1_000_000_000, TW_TZ).strftime("%Y-%m-%d %H:%M:%S %z")
+
+
+class DetectionInput:
+    """一個請求的偵測輸入。"""
+
+    __slots__ = ("ip_address", "url", "http_method", "params", "body", "user_agent")
+
+    def __init__(
+        self,
+        ip_address: str = "",
+        url: str = "",
+        http_method: str = "",
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+        user_agent: str = "",
+    ):
+        self.ip_address = ip_address
+        self.url = url
+        self.http_method = http_method
+        self.params = params or {}
+        self.body = body or {}
+        self.user_agent = user_agent
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DetectionInput":
+        return cls(
+            data.get("ip_address", ""),
+            data.get("url", ""),
+            data.get("http_method", ""),
+            data.get("params"),
+            data.get("body"),
+            data.get("user_agent", ""),
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class DetectionResult:
+    """
+    偵測結果。to_dict() 的格式和以前 detect_attack 回傳的 dict 相同：
+    matches / score / category_scores 只有在 collect_all 或異常分數模式才會出現；
+    overloaded（全域限流額度用完，應該回 503 負載卸除，不是攻擊）只有在 True 時才會出現。
+    detected_at_ns 是偵測當下的 epoch 奈秒，會一路帶到 Logging Service 的 AttackLog.timestamp。
+    """
+
+    __slots__ = (
+        "is_attack", "attack_type", "severity", "payload", "should_block",
+        "ip_address", "detected_at_ns", "matches", "score", "category_scores",
+        "overloaded", "_timestamp",
+    )
+
+    def __init__(self, ip_address: str = "", detected_at_ns: Optional[int] = None):
+        self.is_attack = False
+        self.attack_type = "NONE"
+        self.severity = "LOW"
+        self.payload = ""
+        self.should_block = False
+        self.ip_address = ip_address
+        self.detected_at_ns = time.time_ns() if detected_at_ns is None else detected_at_ns
+        self.matches: Optional[List[dict]] = None
+        self.score: Optional[int] = None
+        self.category_scores: Optional[Dict[str, int]] = None
+        self.overloaded = False
+        self._timestamp: Optional[str] = None
+
+    @property
+    def timestamp(self) -> str:
+        """台灣時間字串；第一次讀取時才格式化。"""
+        if self._timestamp is None:
+            self._timestamp = format_tw(self.detected_at_ns)
+        return self._timestamp
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "timestamp":
+            return self.timestamp
+        if key.startswith("_") or key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def to_dict(self) -> dict:
+        result = {
+            "is_attack": self.is_attack,
+            "attack_type": self.attack_type,
+            "severity": self.severity,
+            "payload": self.payload,
+            "should_block": self.should_block,
+            "ip_address": self.ip_address,
+            "timestamp": self.timestamp,
+            "detected_at_ns": self.detected_at_ns,
+        }
+        if self.matches is not None:
+            result["matches"] = self.matches
+            result["score"] = self.score
+        if self.category_scores is not None:
+            result["category_scores"] = self.category_scores
+        if self.overloaded:
+            result["overloaded"] = True
+        return result
+
+    def __repr__(self) -> str:
+        return f"DetectionResult({self.to_dict()!r})"
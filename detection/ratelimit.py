@@ -0,0 +1,176 @@
+# ratelimit.py
+
+"""
+通用的 token bucket 限流（RATE_LIMIT 攻擊類型）。
+
+暴力登入只看 POST /login；掃描器對 /api/search、/api/file 狂打時，
+除非剛好命中關鍵字，否則抓不到。這裡對每個請求依序扣三個 bucket：
+
+- 以 IP 為 key            （PER_IP）
+- 以 (IP, 路徑) 為 key     （PER_ROUTE）
+- 全域一個 bucket          （GLOBAL）
+
+前面的 bucket 已經拒絕就不再扣後面的（被擋下的請求不佔全域額度）。
+PER_IP / PER_ROUTE 超過是這個 IP 的問題（RATE_LIMIT 攻擊）；
+GLOBAL 超過只代表整體流量太大（負載卸除），不能算在剛好進來的那個 IP 頭上。
+
+bucket 都在行程的記憶體裡。用 DetectionWorkerPool 分給 N 個子行程時，
+PER_IP / PER_ROUTE 因為同一個 IP 固定送到同一個子行程所以不受影響；
+GLOBAL 則是每個子行程各一個，子行程會用 split_global(N) 把 RATE / BURST 平分，
+加起來才是設定的全域額度（各子行程流量不平均時只是近似值）。
+
+rules.json 設定：
+"RATE_LIMITS": {
+  "ENABLED": true,
+  "PER_IP":    {"RATE": 20,  "BURST": 40},     # 每秒補 RATE 個 token，最多存 BURST 個
+  "PER_ROUTE": {"RATE": 10,  "BURST": 20},
+  "GLOBAL":    {"RATE": 500, "BURST": 1000},
+  "MAX_KEYS": 10000,                           # 最多記幾個 key，超過就淘汰最久沒用的
+  "IDLE_SECONDS": 300                          # 超過這麼久沒出現的 key 直接丟掉
+}
+沒寫的 bucket 就不檢查。
+
+每次更新都是 O(1)：bucket 放在 OrderedDict，用到就移到最後面，
+所以最前面永遠是最久沒用的，淘汰時只看開頭幾個。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MAX_KEYS = 10000
+DEFAULT_IDLE_SECONDS = 300
+
+# rules.json 裡的三種 bucket，也是檢查順序
+_SCOPES: Tuple[str, ...] = ("PER_IP", "PER_ROUTE", "GLOBAL")
+
+
+class RateLimitConfig:
+    """RATE_LIMITS 設定；limits = {"PER_IP": (rate, burst), ...}"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+    ):
+        self.enabled = enabled
+        self.limits = limits or {}
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+
+    @classmethod
+    def from_dict(cls, data) -> "RateLimitConfig":
+        if not isinstance(data, dict):
+            return cls()
+
+        limits: Dict[str, Tuple[float, float]] = {}
+        for scope in _SCOPES:
+            conf = data.get(scope)
+            if not isinstance(conf, dict):
+                continue
+            rate = conf.get("RATE")
+            if not isinstance(rate, (int, float)) or rate <= 0:
+                continue
+            burst = conf.get("BURST", rate)
+            if not isinstance(burst, (int, float)) or burst < 1:
+                burst = max(rate, 1)
+            limits[scope] = (float(rate), float(burst))
+
+        max_keys = data.get("MAX_KEYS")
+        idle = data.get("IDLE_SECONDS")
+        return cls(
+            enabled=bool(data.get("ENABLED", False)) and bool(limits),
+            limits=limits,
+            max_keys=max_keys if isinstance(max_keys, int) and max_keys > 0 else DEFAULT_MAX_KEYS,
+            idle_seconds=idle if isinstance(idle, (int, float)) and idle > 0 else DEFAULT_IDLE_SECONDS,
+        )
+
+    def split_global(self, shares: int) -> "RateLimitConfig":
+        """回傳 GLOBAL 的 RATE / BURST 平分成 shares 份的設定（給每個偵測子行程用）。"""
+        if shares <= 1 or "GLOBAL" not in self.limits:
+            return self
+        rate, burst = self.limits["GLOBAL"]
+        limits = dict(self.limits)
+        limits["GLOBAL"] = (rate / shares, max(burst / shares, 1.0))
+        return RateLimitConfig(self.enabled, limits, self.max_keys, self.idle_seconds)
+
+
+class RateLimiter:
+    """
+    token bucket 表。
+    _buckets: {key: [剩餘 token, 上次更新時間]}，依最近使用時間排序（最舊的在前）。
+    """
+
+    def __init__(self):
+        self._buckets: "OrderedDict[tuple, List[float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def _take(self, key: tuple, rate: float, burst: float, now: float) -> bool:
+        """從 key 的 bucket 拿一個 token；拿不到回傳 False。"""
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = [burst, now]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        self._buckets[key] = bucket   # 重新放到最後面 = 最近使用
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def _evict(self, config: RateLimitConfig, now: float) -> None:
+        """從最舊的開始丟：超過 MAX_KEYS 的，以及閒置超過 IDLE_SECONDS 的。"""
+        buckets = self._buckets
+        while len(buckets) > config.max_keys:
+            buckets.popitem(last=False)
+
+        cutoff = now - config.idle_seconds
+        while buckets:
+            key = next(iter(buckets))
+            if buckets[key][1] >= cutoff:
+                break
+            del buckets[key]
+
+    def hit(self, ip: str, route: str, config: RateLimitConfig, now: Optional[float] = None) -> Tuple[str, str]:
+        """
+        記錄一次請求，依序從每個有設定的 bucket 扣一個 token，遇到第一個拿不到的就停。
+        回傳 (超過限制的 bucket, 說明)；沒有超過時是 ("", "")。
+        """
+        if not config.enabled:
+            return "", ""
+        if now is None:
+            now = time.monotonic()
+
+        keys = {
+            "PER_IP": ("ip", ip),
+            "PER_ROUTE": ("route", ip, route),
+            "GLOBAL": ("global",),
+        }
+
+        exceeded, info = "", ""
+        for scope in _SCOPES:
+            limit = config.limits.get(scope)
+            if limit is None:
+                continue
+            rate, burst = limit
+            if not self._take(keys[scope], rate, burst, now):
+                exceeded = scope
+                if scope == "GLOBAL":
+                    info = f"global rate limit exceeded ({rate:g} req/s, burst {burst:g})"
+                elif scope == "PER_ROUTE":
+                    info = f"{ip} exceeded {rate:g} req/s on {route} (burst {burst:g})"
+                else:
+                    info = f"{ip} exceeded {rate:g} req/s (burst {burst:g})"
+                break
+
+        self._evict(config, now)
+        return exceeded, info
@@ -0,0 +1,676 @@
+# rules.py
+
+"""
+規則的載入與編譯。
+
+- 規則來源：明確指定的路徑 → 環境變數 DETECTION_RULES → 套件內附的 rules.json
+- 第一次呼叫 get_rules() 才會讀檔與編譯（import 時不做任何檔案 I/O，也不依賴目前的工作目錄）
+- 所有攻擊類別的關鍵字編譯成同一個 Aho-Corasick 自動機，每個欄位只需要掃描一次
+- 編譯結果會快取在使用者專屬的快取資料夾（見第 4 節，含格式版本、程式碼指紋與 HMAC），
+  worker 啟動時直接 mmap 載入；rules.json 或規則相關程式碼一改就自動重新編譯
+- 也可以用 dump() 產生快取檔，再用 load_rules(compiled_path=...) 直接載入
+  （環境變數 DETECTION_COMPILED_RULES）
+"""
+
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from .banlist import BanConfig
+from .decision_cache import DecisionCacheConfig
+from .ratelimit import RateLimitConfig
+
+# 套件內附的規則檔
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+# =====================================================
+# 1. 預設攻擊關鍵字規則（如果沒有 rules.json 就用這些）
+# =====================================================
+
+DEFAULT_RULES = {
+    "SQLI_PATTERNS": [
+        # 基本 or 1=1 類型
+        " or 1=1",
+        "' or '1'='1",
+        "\" or \"1\"=\"1",
+        " or '1'='1",
+        " or 1=1 --",
+        " or 1=1--",
+        " or 1=1#",
+        " or 1=1/*",
+        " union select",
+        "--",       # SQL 註解
+        ";--",
+        "/*",
+        "*/",
+        # time-based / function 類型 SQLi
+        "sleep(",
+        "benchmark(",
+        "pg_sleep(",
+        "waitfor delay",
+    ],
+    "XSS_PATTERNS": [
+        "<script",      # <script>...</script>
+        "onerror=",     # <img src=x onerror=...>
+        "onload=",      # onload 事件
+        "javascript:",  # href="javascript:alert(1)"
+        "alert(",       # alert(1)
+        # 更多常見事件 handler
+        "onclick=",
+        "onmouseover=",
+        "onmouseenter=",
+        "onfocus=",
+        "onblur=",
+        "onchange=",
+        "onsubmit=",
+    ],
+    "PATH_TRAVERSAL_PATTERNS": [
+        "../",
+        "..\\",
+        "..%2f",        # URL 編碼的 ../（保留，雖然我們也會先解碼）
+        "%2e%2e%2f",    # ../ 的另一種編碼
+        "/etc/passwd",
+        "/etc/shadow",
+        "c:\\windows",
+        "c:/windows",
+        "windows\\system32",
+    ],
+    # 可疑 User-Agent 關鍵字
+    "SUSPICIOUS_UA_PATTERNS": [
+        "sqlmap",
+        "python-requests",
+        "curl",
+        "scanner",
+        "nmap",
+        "acunetix",
+        "burp",
+        "fuzzer",
+    ],
+    # NEW：Command Injection 關鍵字（簡化版）
+    "COMMAND_INJECTION_PATTERNS": [
+        # 管線與指令連接符號（示範用，實務會更嚴謹）
+        ";",
+        "&&",
+        "||",
+        "|",
+        "`",
+        "$(",
+        # 常見惡意指令片段
+        "bash -c",
+        "sh -c",
+        "cmd /c",
+        "powershell",
+        "nc ",
+        "netcat",
+        "wget ",
+        "curl ",
+        " cat /etc/passwd",
+        " rm -rf /",
+    ],
+}
+
+# (attack_type, rules.json 的 key)，順序就是 detect_attack 檢查的優先順序
+PATTERN_CATEGORIES: Tuple[Tuple[str, str], ...] = (
+    ("SQLI", "SQLI_PATTERNS"),
+    ("XSS", "XSS_PATTERNS"),
+    ("PATH_TRAVERSAL", "PATH_TRAVERSAL_PATTERNS"),
+    ("CMD_INJECTION", "COMMAND_INJECTION_PATTERNS"),
+    ("SUSPICIOUS_UA", "SUSPICIOUS_UA_PATTERNS"),
+)
+
+# 預設模式：只記錄不阻擋（可由 rules.json 改成 "BLOCK"）
+DEFAULT_MODE = "LOG_ONLY"
+
+# 暴力登入偵測設定：同一 IP 在 60 秒內超過 5 次 login 嘗試
+DEFAULT_BRUTE_FORCE_WINDOW_SECONDS = 60
+DEFAULT_BRUTE_FORCE_THRESHOLD = 5
+
+# 各攻擊類型的嚴重度，順序就是單一結果模式的檢查優先順序
+ATTACK_SEVERITY: Dict[str, str] = {
+    "BANNED_IP": "HIGH",
+    "SQLI": "HIGH",
+    "XSS": "MEDIUM",
+    "PATH_TRAVERSAL": "HIGH",
+    "CMD_INJECTION": "CRITICAL",   # 報告裡特別強調
+    "BRUTE_FORCE": "MEDIUM",
+    "RATE_LIMIT": "MEDIUM",
+    "SSRF": "HIGH",
+    "SUSPICIOUS_UA": "LOW",
+}
+
+# 嚴重度排序與分數（分數沿用 OWASP CRS 的 critical / warning / notice 配分）
+SEVERITY_RANK = {"LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
+SEVERITY_SCORE = {"LOW": 2, "MEDIUM": 3, "HIGH": 5, "CRITICAL": 5}
+
+# 異常分數模式（rules.json 的 "ANOMALY_SCORING"）的預設門檻
+DEFAULT_LOG_THRESHOLD = 3
+DEFAULT_BLOCK_THRESHOLD = 5
+
+
+# =====================================================
+# 2. 多關鍵字比對：Aho-Corasick 自動機
+# =====================================================
+
+class PatternMatcher:
+    """
+    把所有類別的關鍵字編成一個 Aho-Corasick 自動機。
+    掃描一個字串只需要走一次，就能知道命中了哪些關鍵字 / 類別，
+    結果和對每個關鍵字做 `p in text` 完全一樣。
+
+    只存 trie 的子節點（_goto）與 failure link（_fail），不展開成完整 DFA：
+    狀態數再多，記憶體與快取檔大小都只和關鍵字總長度成正比。
+
+    patterns：[(小寫關鍵字, 類別編號), ...]
+    """
+
+    def __init__(self, patterns: List[Tuple[str, int]]):
+        self.patterns = [(p, cat) for p, cat in patterns if p]
+
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pid, (pattern, _) in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pid)
+
+        # BFS 算 failure link；每個狀態的輸出也合併 failure 狀態的輸出
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                nxt = goto[f].get(ch, 0)
+                fail[t] = nxt if nxt != t else 0
+                out[t].extend(out[fail[t]])
+                queue.append(t)
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(o) for o in out]
+        # 每個狀態命中的類別 bitmask（bit i = 類別 i）
+        self._mask = [
+            self._categories_mask(o) for o in self._out
+        ]
+
+    def _categories_mask(self, pids: Tuple[int, ...]) -> int:
+        mask = 0
+        for pid in pids:
+            mask |= 1 << self.patterns[pid][1]
+        return mask
+
+    @property
+    def state_count(self) -> int:
+        return len(self._goto)
+
+    def category_mask(self, text: str) -> int:
+        """掃描 text（請先轉小寫），回傳命中類別的 bitmask。"""
+        goto = self._goto
+        fail = self._fail
+        masks = self._mask
+        state = 0
+        mask = 0
+        for ch in text:
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            mask |= masks[state]
+        return mask
+
+    def matched_ids(self, text: str) -> Set[int]:
+        """掃描 text（請先轉小寫），回傳命中的關鍵字編號（self.patterns 的 index）。"""
+        goto = self._goto
+        fail = self._fail
+        outs = self._out
+        state = 0
+        found: Set[int] = set()
+        for ch in text:
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if outs[state]:
+                found.update(outs[state])
+        return found
+
+
+# =====================================================
+# 3. 編譯後的規則集
+# =====================================================
+
+class AnomalyScoring:
+    """
+    異常分數模式（仿 OWASP CRS）的設定：
+
+    "ANOMALY_SCORING": {
+      "ENABLED": true,
+      "LOG_THRESHOLD": 3,          # 總分 >= 這個值才算攻擊（記錄）
+      "BLOCK_THRESHOLD": 5,        # 總分 >= 這個值才阻擋（MODE = BLOCK 時）
+      "CATEGORY_THRESHOLDS": {"XSS": {"LOG": 3, "BLOCK": 3}},   # 個別類別自己的門檻
+      "CATEGORY_WEIGHTS": {"SQLI": 5},                          # 類別預設每條規則幾分
+      "PATTERN_WEIGHTS": {"--": 2, "|": 1}                      # 個別關鍵字的分數
+    }
+
+    類別預設分數 = SEVERITY_SCORE[ATTACK_SEVERITY[類別]]；
+    沒有設定門檻的類別就只看總分。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        log_threshold: int = DEFAULT_LOG_THRESHOLD,
+        block_threshold: int = DEFAULT_BLOCK_THRESHOLD,
+        category_thresholds: Optional[Dict[str, Tuple[int, int]]] = None,
+        category_weights: Optional[Dict[str, int]] = None,
+        pattern_weights: Optional[Dict[str, int]] = None,
+    ):
+        self.enabled = enabled
+        self.log_threshold = log_threshold
+        self.block_threshold = block_threshold
+        # {類別: (log 門檻, block 門檻)}
+        self.category_thresholds = category_thresholds or {}
+        self.category_weights = {
+            attack_type: SEVERITY_SCORE[severity]
+            for attack_type, severity in ATTACK_SEVERITY.items()
+        }
+        self.category_weights.update(category_weights or {})
+        # key 是小寫關鍵字
+        self.pattern_weights = {p.lower(): w for p, w in (pattern_weights or {}).items()}
+
+    @classmethod
+    def from_dict(cls, data) -> "AnomalyScoring":
+        if not isinstance(data, dict):
+            return cls()
+
+        def _int(value, default: int) -> int:
+            return int(value) if isinstance(value, int) else default
+
+        thresholds: Dict[str, Tuple[int, int]] = {}
+        for attack_type, conf in (data.get("CATEGORY_THRESHOLDS") or {}).items():
+            if isinstance(conf, dict):
+                thresholds[attack_type] = (
+                    _int(conf.get("LOG"), _int(data.get("LOG_THRESHOLD"), DEFAULT_LOG_THRESHOLD)),
+                    _int(conf.get("BLOCK"), _int(data.get("BLOCK_THRESHOLD"), DEFAULT_BLOCK_THRESHOLD)),
+                )
+
+        weights = data.get("CATEGORY_WEIGHTS") or {}
+        patterns = data.get("PATTERN_WEIGHTS") or {}
+        return cls(
+            enabled=bool(data.get("ENABLED", False)),
+            log_threshold=_int(data.get("LOG_THRESHOLD"), DEFAULT_LOG_THRESHOLD),
+            block_threshold=_int(data.get("BLOCK_THRESHOLD"), DEFAULT_BLOCK_THRESHOLD),
+            category_thresholds=thresholds,
+            category_weights={k: v for k, v in weights.items() if isinstance(v, int)},
+            pattern_weights={k: v for k, v in patterns.items() if isinstance(v, int)},
+        )
+
+    def thresholds(self, attack_type: str) -> Tuple[int, int]:
+        """回傳 (log 門檻, block 門檻)；類別沒設定就用總分門檻。"""
+        return self.category_thresholds.get(
+            attack_type, (self.log_threshold, self.block_threshold)
+        )
+
+
+class RuleSet:
+    """一份編譯好的規則：關鍵字自動機 + MODE + 暴力登入參數 + 異常分數 / 限流 / 封鎖 / 判斷快取設定。"""
+
+    def __init__(
+        self,
+        patterns: Dict[str, List[str]],
+        mode: str = DEFAULT_MODE,
+        brute_force_window: int = DEFAULT_BRUTE_FORCE_WINDOW_SECONDS,
+        brute_force_threshold: int = DEFAULT_BRUTE_FORCE_THRESHOLD,
+        scoring: Optional[AnomalyScoring] = None,
+        rate_limits: Optional[RateLimitConfig] = None,
+        bans: Optional[BanConfig] = None,
+        decision_cache: Optional[DecisionCacheConfig] = None,
+        source: str = "<defaults>",
+        version: str = "",
+    ):
+        self.patterns = patterns
+        self.mode = mode
+        self.brute_force_window = brute_force_window
+        self.brute_force_threshold = brute_force_threshold
+        self.scoring = scoring or AnomalyScoring()
+        self.rate_limits = rate_limits or RateLimitConfig()
+        self.bans = bans or BanConfig()
+        self.decision_cache = decision_cache or DecisionCacheConfig()
+        self.source = source
+        self.version = version
+
+        self.categories = [attack_type for attack_type, _ in PATTERN_CATEGORIES]
+        compiled: List[Tuple[str, int]] = []
+        for idx, (_, key) in enumerate(PATTERN_CATEGORIES):
+            for p in patterns.get(key, []):
+                compiled.append((p.lower(), idx))
+        self.matcher = PatternMatcher(compiled)
+
+        # 每條關鍵字的分數（index 和 matcher.patterns 對齊），編譯時就算好
+        self.pattern_weights = [
+            self.scoring.pattern_weights.get(
+                p, self.scoring.category_weights[self.categories[cat]]
+            )
+            for p, cat in self.matcher.patterns
+        ]
+
+    @classmethod
+    def from_dict(cls, data: dict, source: str = "<dict>", version: str = "") -> "RuleSet":
+        """只採用我們認得的 key，其餘忽略；缺少的類別用 DEFAULT_RULES 補上。"""
+        patterns = {key: list(value) for key, value in DEFAULT_RULES.items()}
+        for key in DEFAULT_RULES.keys():
+            if key in data and isinstance(data[key], list):
+                patterns[key] = data[key]
+
+        # 從 JSON 調整 MODE（允許 LOG_ONLY 或 BLOCK）
+        mode = DEFAULT_MODE
+        if isinstance(data.get("MODE"), str) and data["MODE"].upper() in ("LOG_ONLY", "BLOCK"):
+            mode = data["MODE"].upper()
+
+        # （選擇性）也可以讓 JSON 調整暴力登入參數
+        window = DEFAULT_BRUTE_FORCE_WINDOW_SECONDS
+        threshold = DEFAULT_BRUTE_FORCE_THRESHOLD
+        if isinstance(data.get("BRUTE_FORCE_WINDOW_SECONDS"), int):
+            window = int(data["BRUTE_FORCE_WINDOW_SECONDS"])
+        if isinstance(data.get("BRUTE_FORCE_THRESHOLD"), int):
+            threshold = int(data["BRUTE_FORCE_THRESHOLD"])
+
+        scoring = AnomalyScoring.from_dict(data.get("ANOMALY_SCORING"))
+        rate_limits = RateLimitConfig.from_dict(data.get("RATE_LIMITS"))
+        # PERSIST_PATH 的相對路徑以規則檔所在目錄為準
+        base_dir = "" if source.startswith("<") else os.path.dirname(os.path.abspath(source))
+        bans = BanConfig.from_dict(data.get("BAN_LIST"), base_dir)
+        decision_cache = DecisionCacheConfig.from_dict(data.get("DECISION_CACHE"))
+
+        return cls(
+            patterns, mode, window, threshold, scoring, rate_limits, bans, decision_cache,
+            source=source, version=version,
+        )
+
+    @classmethod
+    def from_file(cls, filename: str, use_cache: bool = True) -> "RuleSet":
+        """
+        從 rules.json 載入規則與模式。
+        如果檔案不存在或格式錯誤，就使用 DEFAULT_RULES + 預設 MODE。
+
+        use_cache=True 時會先找這份 rules.json 在快取資料夾裡的快取（cache_path_for）：
+        來源 hash 與程式碼指紋都相同就直接載入編譯好的結果；不同或壞掉就重新編譯，並重寫快取。
+        """
+        try:
+            with open(filename, "rb") as f:
+                raw = f.read()
+        except OSError:
+            # 找不到檔案就維持預設規則與模式
+            return cls.from_dict({}, source="<defaults>")
+
+        version = hashlib.sha256(raw).hexdigest()
+        cache_path = None
+        if use_cache:
+            try:
+                cache_path = cache_path_for(filename)
+            except OSError:
+                # 快取資料夾建不起來或權限不安全：不用快取
+                use_cache = False
+        if use_cache:
+            cached = _read_cache(cache_path, expected_version=version)
+            if cached is not None:
+                return cached
+
+        try:
+            data = json.loads(raw.decode("utf-8"))
+            if not isinstance(data, dict):
+                raise ValueError("rules file must contain a JSON object")
+        except Exception:
+            # 有問題就直接忽略，維持預設
+            return cls.from_dict({}, source="<defaults>")
+
+        rules = cls.from_dict(data, source=filename, version=version)
+        if use_cache:
+            try:
+                rules.dump(cache_path)
+            except OSError:
+                # 例如快取資料夾唯讀：沒有快取也能正常運作
+                pass
+        return rules
+
+    def dump(self, filename: str) -> None:
+        """把編譯好的規則集寫成快取檔（格式見 _write_cache），給 worker 啟動時直接載入。"""
+        _write_cache(filename, self)
+
+    @classmethod
+    def load_compiled(cls, filename: str) -> "RuleSet":
+        """
+        載入 dump() 產生的快取檔（不檢查來源 hash，只檢查格式、程式碼指紋與 HMAC）。
+        HMAC 金鑰在快取資料夾裡，所以只能載入同一個使用者（同一個 DETECTION_RULES_CACHE_DIR）dump 出來的檔案。
+        """
+        rules = _read_cache(filename)
+        if rules is None:
+            raise ValueError(f"{filename} is not a valid compiled rules file")
+        return rules
+
+
+# =====================================================
+# 4. 編譯結果快取
+# =====================================================
+#
+# 快取不放在 rules.json 旁邊，而是放在目前使用者專屬的快取資料夾
+# （DETECTION_RULES_CACHE_DIR，預設 ~/.cache/web-attack-monitoring，權限 0700），
+# 檔名是 rules.json 絕對路徑的 hash，檔案權限 0600。
+# 快取內容是 pickle，所以 payload 用資料夾裡的隨機金鑰做 HMAC，驗證通過才會 unpickle；
+# 別人就算能寫 rules.json 所在的資料夾，也沒辦法放一個會被載入的快取檔。
+#
+# 檔案格式（全部 big-endian）：
+#   8 bytes   MAGIC
+#   2 bytes   CACHE_FORMAT_VERSION
+#   64 bytes  來源 rules.json 的 sha256（hex）
+#   32 bytes  程式碼指紋（見 _code_fingerprint）
+#   32 bytes  HMAC-SHA256（金鑰見 _cache_key，涵蓋上面所有欄位與 payload）
+#   其餘      pickle 後的 RuleSet
+#
+# 讀取時用 mmap，不必先把整個檔案複製進記憶體再解 pickle。
+
+CACHE_SUFFIX = ".compiled"
+CACHE_MAGIC = b"WAFRULES"
+CACHE_FORMAT_VERSION = 6   # 檔案格式有改就要加 1，舊快取會自動失效
+CACHE_DIR_ENV = "DETECTION_RULES_CACHE_DIR"
+
+_HEADER = struct.Struct(">8sH64s32s32s")
+_KEY_FILE = "cache.key"
+_KEY_SIZE = 32
+
+# 編譯結果不只取決於 rules.json，也取決於程式內的預設值（DEFAULT_RULES、ATTACK_SEVERITY、
+# 分數門檻…）與編譯邏輯，這些都寫在下面幾個檔案裡，內容一改快取就失效
+_CODE_FILES = ("rules.py", "banlist.py", "ratelimit.py", "decision_cache.py")
+
+_FINGERPRINT: Optional[bytes] = None
+
+
+def _code_fingerprint() -> bytes:
+    global _FINGERPRINT
+    if _FINGERPRINT is None:
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_FORMAT_VERSION}:{sys.version_info[0]}.{sys.version_info[1]}".encode("ascii"))
+        here = os.path.dirname(os.path.abspath(__file__))
+        try:
+            for name in _CODE_FILES:
+                with open(os.path.join(here, name), "rb") as f:
+                    digest.update(name.encode("ascii") + b"\0" + f.read())
+        except OSError:
+            # 讀不到原始碼（例如只裝了 .pyc）就用隨機值：這個行程不會沿用任何舊快取
+            digest.update(os.urandom(16))
+        _FINGERPRINT = digest.digest()
+    return _FINGERPRINT
+
+
+def cache_dir() -> str:
+    """回傳（必要時建立）目前使用者專屬的快取資料夾；權限不對就丟 PermissionError。"""
+    base = os.environ.get(CACHE_DIR_ENV)
+    if not base:
+        root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        base = os.path.join(root, "web-attack-monitoring")
+    os.makedirs(base, mode=0o700, exist_ok=True)
+    if os.name == "posix":
+        st = os.stat(base)
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise PermissionError(f"{base} must be owned by the current user with mode 0700")
+    return base
+
+
+def cache_path_for(filename: str) -> str:
+    """rules.json 對應的快取檔路徑。"""
+    name = hashlib.sha256(os.path.abspath(filename).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir(), name + CACHE_SUFFIX)
+
+
+def _cache_key() -> bytes:
+    """讀取快取資料夾裡的 HMAC 金鑰；第一次用到時產生（多個 worker 同時產生只會留下一把）。"""
+    path = os.path.join(cache_dir(), _KEY_FILE)
+    try:
+        with open(path, "rb") as f:
+            key = f.read()
+        if len(key) == _KEY_SIZE:
+            return key
+    except FileNotFoundError:
+        pass
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(_KEY_SIZE))
+        try:
+            # link 在目標已存在時會失敗，先建立的那把金鑰勝出
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+
+    with open(path, "rb") as f:
+        key = f.read()
+    if len(key) != _KEY_SIZE:
+        raise OSError(f"{path} is not a valid cache key")
+    return key
+
+
+def _sign(key: bytes, header: bytes, payload) -> bytes:
+    mac = hmac.new(key, header, hashlib.sha256)
+    mac.update(payload)
+    return mac.digest()
+
+
+def _write_cache(filename: str, rules: RuleSet) -> None:
+    key = _cache_key()
+    payload = pickle.dumps(rules, protocol=pickle.HIGHEST_PROTOCOL)
+    fields = _HEADER.pack(
+        CACHE_MAGIC,
+        CACHE_FORMAT_VERSION,
+        rules.version.encode("ascii").ljust(64, b"\0")[:64],
+        _code_fingerprint(),
+        b"\0" * 32,
+    )
+    signed = fields[:-32]
+    header = signed + _sign(key, signed, payload)
+    # 先寫暫存檔再 rename，多個 worker 同時寫也不會讀到寫一半的檔案
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp, filename)
+
+
+def _read_cache(filename: str, expected_version: Optional[str] = None) -> Optional[RuleSet]:
+    """讀取快取；不存在、格式版本 / 程式碼指紋 / 來源 hash 不同或 HMAC 驗證失敗都回傳 None。"""
+    try:
+        with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < _HEADER.size:
+                return None
+            magic, fmt, version, fingerprint, signature = _HEADER.unpack_from(mm, 0)
+            if magic != CACHE_MAGIC or fmt != CACHE_FORMAT_VERSION:
+                return None
+            if fingerprint != _code_fingerprint():
+                return None
+            source_version = version.rstrip(b"\0").decode("ascii")
+            if expected_version is not None and source_version != expected_version:
+                return None
+
+            signed = mm[:_HEADER.size - 32]
+            view = memoryview(mm)[_HEADER.size:]
+            try:
+                if not hmac.compare_digest(_sign(_cache_key(), signed, view), signature):
+                    return None
+                rules = pickle.loads(view)
+            finally:
+                view.release()
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+    return rules if isinstance(rules, RuleSet) else None
+
+
+# =====================================================
+# 5. 目前使用中的規則（第一次用到才載入）
+# =====================================================
+
+_ACTIVE: Optional[RuleSet] = None
+_LOCK = threading.Lock()
+
+
+def load_rules(path: Optional[str] = None, compiled_path: Optional[str] = None) -> RuleSet:
+    """
+    立即載入並啟用一份規則。
+    - compiled_path：dump() 產生的快取檔，有給就優先使用
+    - path：rules.json 路徑；沒給就用環境變數 DETECTION_RULES，再沒有就用套件內附的 rules.json
+      編譯結果快取會自動使用 / 更新（DETECTION_RULES_CACHE=0 可關閉，位置見 cache_dir）
+    """
+    global _ACTIVE
+
+    compiled_path = compiled_path or os.environ.get("DETECTION_COMPILED_RULES")
+    if compiled_path:
+        rules = RuleSet.load_compiled(compiled_path)
+    else:
+        rules = RuleSet.from_file(
+            path or os.environ.get("DETECTION_RULES") or DEFAULT_RULES_PATH,
+            use_cache=os.environ.get("DETECTION_RULES_CACHE", "1") != "0",
+        )
+
+    _ACTIVE = rules
+    return rules
+
+
+def get_rules() -> RuleSet:
+    """回傳目前使用中的規則；還沒載入過就用預設來源載入一次。"""
+    rules = _ACTIVE
+    if rules is None:
+        # 多個執行緒同時第一次呼叫時，只讓一個去載入
+        with _LOCK:
+            rules = _ACTIVE
+            if rules is None:
+                rules = load_rules()
+    return rules
@@ -1,6 +1,6 @@
-# test_detect.py
+# test_detect.py（在專案根目錄執行：python -m detection.test_detect）
 
-from detector import detect_attack
+from detection import detect_attack
 
 # 1️⃣ SQLi：POST body 裡的 username
 req1 = {
@@ -193,3 +193,115 @@ print("case11 (Suspicious UA):              ", detect_attack(req_ua))
 print("case12 (Command Injection):          ", detect_attack(req_cmd))
 print("case13 (SSRF - internal target):     ", detect_attack(req_ssrf1))
 print("case14 (SSRF - normal external):     ", detect_attack(req_ssrf2))
+
+# 1️⃣5️⃣ 同時是 SQLi 又是 XSS：預設回傳第一個命中的類別，collect_all=True 會把兩個類別都列出來並排序
+req_multi = {
+    "ip_address": "6.6.6.6",
+    "url": "/api/search",
+    "http_method": "POST",
+    "params": {
+        "q": "<script>alert(1)</script>"
+    },
+    "body": {
+        "keyword": "' OR 1=1 --"
+    },
+    "user_agent": "sqlmap/1.6.0"
+}
+
+print("case15 (SQLi + XSS, first hit):      ", detect_attack(req_multi))
+print("case15 (SQLi + XSS, collect_all):    ", detect_attack(req_multi, collect_all=True))
+
+# 以下案例要用到內附 rules.json 裡預設關閉（"ENABLED": false）的功能：
+# 複製一份規則檔，把異常分數 / 限流 / 封鎖名單 / 判斷快取都打開再載入
+import json
+import os
+import tempfile
+
+from detection.rules import DEFAULT_RULES_PATH, load_rules
+
+with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+    rules_data = json.load(f)
+for section in ("ANOMALY_SCORING", "RATE_LIMITS", "BAN_LIST", "DECISION_CACHE"):
+    rules_data[section]["ENABLED"] = True
+
+with tempfile.TemporaryDirectory() as tmp:
+    rules_path = os.path.join(tmp, "rules.json")
+    with open(rules_path, "w", encoding="utf-8") as f:
+        json.dump(rules_data, f)
+    load_rules(rules_path)
+
+print("case15 (SQLi + XSS, scoring on):     ", detect_attack(req_multi))
+
+# 1️⃣6️⃣ 異常分數模式：只有 "--" 這種低分規則（2 分）不到門檻，不算攻擊
+req_low_score = {
+    "ip_address": "7.7.7.7",
+    "url": "/api/search",
+    "http_method": "POST",
+    "params": {},
+    "body": {
+        "keyword": "2024--2025 年度報告"
+    },
+    "user_agent": "NormalBrowser"
+}
+
+print("case16 (low score, under threshold): ", detect_attack(req_low_score))
+
+# 1️⃣7️⃣ 限流：同一 IP 對同一路徑狂打（PER_ROUTE 預設每秒 10 次、burst 20），第 21 次開始是 RATE_LIMIT
+flood_results = []
+for i in range(25):
+    flood_results.append(detect_attack({
+        "ip_address": "11.11.11.11",
+        "url": "/api/search",
+        "http_method": "POST",
+        "params": {},
+        "body": {"keyword": f"product {i}"},
+        "user_agent": "NormalBrowser"
+    }))
+
+print("case17 (rate limit, request #20):     ", flood_results[19]["attack_type"])
+print("case17 (rate limit, request #21):     ", flood_results[20])
+
+# 1️⃣8️⃣ 封鎖名單：暴力登入的 IP（123.45.67.89）再試一次被擋下，之後連一般頁面也直接回傳 BANNED_IP
+print("case18 (brute force again, blocked):  ", detect_attack(brute_force_requests[-1])["should_block"])
+
+req_banned = {
+    "ip_address": "123.45.67.89",
+    "url": "/",
+    "http_method": "GET",
+    "params": {},
+    "body": {},
+    "user_agent": "NormalBrowser"
+}
+
+print("case18 (banned IP):                   ", detect_attack(req_banned))
+
+# 1️⃣9️⃣ 判斷快取：一模一樣的請求第二次直接用快取（結果相同），印出命中率
+from detection import decision_cache_stats
+
+detect_attack(req4)   # 打開判斷快取後第一次，結果寫進快取
+print("case19 (repeat XSS, cached):         ", detect_attack(req4)["attack_type"])
+print("case19 (decision cache stats):       ", decision_cache_stats())
+
+# 2️⃣0️⃣ 全域限流：很多 IP 各自都沒超過自己的額度，加起來超過 GLOBAL（burst 1000）
+#     之後進來的正常請求標成 overloaded（負載卸除），不是 RATE_LIMIT 攻擊，也不會被封鎖
+for n in range(60):
+    for i in range(19):
+        detect_attack({
+            "ip_address": f"20.0.0.{n}",
+            "url": f"/api/page{i % 2}",
+            "http_method": "GET",
+            "params": {},
+            "body": {},
+            "user_agent": "NormalBrowser"
+        })
+
+req_after_global = {
+    "ip_address": "1.2.3.4",
+    "url": "/",
+    "http_method": "GET",
+    "params": {},
+    "body": {},
+    "user_agent": "NormalBrowser"
+}
+print("case20 (global limit, innocent IP):  ", detect_attack(req_after_global))
+print("case20 (not banned afterwards):      ", detect_attack(req_after_global)["attack_type"])
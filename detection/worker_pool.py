@@ -0,0 +1,292 @@
+# worker_pool.py
+
+"""
+多行程偵測服務（選擇性）。
+
+detect() 是純 Python 的 CPU 運算，受 GIL 限制，一個 uvicorn worker 最多只用得到一顆核心。
+DetectionWorkerPool 開 N 個子行程，每個子行程自己載入編譯好的規則（有編譯結果快取就很快），
+主行程透過 Pipe 把請求分批送過去：
+
+- 依 ip_address 的 hash 分到固定的子行程，所以暴力登入 / 限流 / 封鎖名單這些
+  以 IP 計算的狀態仍然正確；全域限流（GLOBAL）的 bucket 變成每個子行程各一個，
+  每個子行程只拿 1/N 的 RATE / BURST（見 RateLimitConfig.split_global）
+- 同一輪 event loop 內送進來的請求合併成一批（最多 batch_size 筆）才送，減少 pickle / 系統呼叫次數
+- 每個子行程有一條送出執行緒與一條接收執行緒，event loop 本身不會被 Pipe 卡住
+- 子行程掛掉時，下一個分到它的請求會先重開一個子行程；每筆請求都有等待上限（timeout，預設 2 秒），
+  逾時或子行程掛掉都丟出 DetectionUnavailable，不會讓 request 一直等下去
+- 逾時的時候如果子行程整整一個 timeout 都沒有回任何結果，就當成卡死：直接 kill 掉再重開一個
+
+用法：
+    pool = DetectionWorkerPool(processes=4)
+    pool.start()
+    result = await pool.detect(DetectionInput(...))   # DetectionResult
+    pool.shutdown()
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from .models import DetectionInput, DetectionResult
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_TIMEOUT = 2.0      # 一筆請求最多等子行程幾秒（vuln-site 可用 DETECTION_WORKER_TIMEOUT 調整）
+
+_STOP = None
+_STATS = "stats"           # 特殊請求：回傳子行程的判斷快取統計
+
+
+class DetectionUnavailable(RuntimeError):
+    """子行程掛掉或逾時，這筆請求沒有偵測結果（呼叫端應該回 503）。"""
+
+
+def _worker_main(conn, rules_path: Optional[str], shards: int = 1) -> None:
+    """子行程：載入規則後，一直收一批請求、回一批結果，直到收到 _STOP。"""
+    from .detector import decision_cache_stats, detect
+    from .rules import get_rules, load_rules
+
+    if rules_path:
+        rules = load_rules(rules_path)
+    else:
+        rules = get_rules()
+    # 全域額度由 shards 個子行程平分
+    rules.rate_limits = rules.rate_limits.split_global(shards)
+
+    while True:
+        try:
+            batch = conn.recv()
+        except (EOFError, OSError):
+            break
+        if batch is _STOP:
+            break
+        results = []
+        for req_id, input_data, collect_all in batch:
+            try:
+                if input_data == _STATS:
+                    results.append((req_id, decision_cache_stats(), None))
+                    continue
+                results.append((req_id, detect(input_data, collect_all), None))
+            except Exception as e:  # 單筆失敗不要拖垮整個子行程
+                results.append((req_id, None, f"{type(e).__name__}: {e}"))
+        conn.send(results)
+    conn.close()
+
+
+class _Shard:
+    """主行程這邊對應一個子行程的狀態。"""
+
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.last_reply = time.monotonic()   # 上一次收到結果（或啟動）的時間，用來判斷是不是卡死
+        self.outbox: "queue.Queue" = queue.Queue()
+        self.buffer: List[tuple] = []
+        self.flush_scheduled = False
+        self.pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self.lock = threading.Lock()
+
+
+class DetectionWorkerPool:
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        rules_path: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rules_path = rules_path
+        self.timeout = timeout
+        self._shards: List[_Shard] = []
+        self._ids = itertools.count()
+        self._started = False
+        self.respawned = 0
+        self.timeouts = 0
+        self.killed = 0
+
+    # ---------- 啟動 / 關閉 ----------
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._shards = [self._spawn(index) for index in range(self.processes)]
+        self._started = True
+
+    def _spawn(self, index: int) -> _Shard:
+        # spawn：主行程已經有執行緒（event loop、背景 logger），fork 不安全
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=_worker_main, args=(child_conn, self.rules_path, self.processes), daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        shard = _Shard(index, process, parent_conn)
+        threading.Thread(target=self._send_loop, args=(shard,), daemon=True).start()
+        threading.Thread(target=self._recv_loop, args=(shard,), daemon=True).start()
+        return shard
+
+    def _respawn(self, index: int) -> _Shard:
+        """子行程掛掉了：換一個新的（舊的送出執行緒收到 _STOP 後結束，接收執行緒會把還在等的請求回報錯誤）。"""
+        old = self._shards[index]
+        old.outbox.put(_STOP)
+        old.process.join(0)
+        shard = self._spawn(index)
+        self._shards[index] = shard
+        self.respawned += 1
+        return shard
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        if not self._started:
+            return
+        for shard in self._shards:
+            shard.outbox.put(_STOP)
+        for shard in self._shards:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+        self._shards = []
+        self._started = False
+
+    # ---------- 對外 API ----------
+
+    def _shard_for(self, ip: str) -> _Shard:
+        # hash() 每個行程的 seed 不同，這裡要穩定的值
+        index = zlib.crc32(ip.encode("utf-8", "replace")) % len(self._shards)
+        shard = self._shards[index]
+        if not shard.process.is_alive():
+            shard = self._respawn(index)
+        return shard
+
+    async def _submit(self, shard: _Shard, payload, collect_all: bool):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        req_id = next(self._ids)
+
+        with shard.lock:
+            shard.pending[req_id] = (loop, future)
+        shard.buffer.append((req_id, payload, collect_all))
+        if len(shard.buffer) >= self.batch_size:
+            self._flush(shard)
+        elif not shard.flush_scheduled:
+            # 這一輪 event loop 裡其他 request 送進來的也一起送
+            shard.flush_scheduled = True
+            loop.call_soon(self._flush, shard)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._kill_if_hung(shard)
+            raise DetectionUnavailable(f"detection worker did not answer within {self.timeout:g}s")
+        finally:
+            with shard.lock:
+                shard.pending.pop(req_id, None)
+
+    def _kill_if_hung(self, shard: _Shard) -> None:
+        """
+        子行程整整一個 timeout 都沒回任何結果（不只是這一筆慢）就當成卡死：kill 掉再重開，
+        不然之後分到它的請求每一筆都要等滿 timeout。
+        舊的接收執行緒會收到 EOF，把還在等的請求全部回報錯誤。
+        """
+        if shard.index >= len(self._shards) or self._shards[shard.index] is not shard:
+            return   # 已經被別的請求重開過了（或 pool 已經關掉）
+        if time.monotonic() - shard.last_reply < self.timeout:
+            return
+        self.killed += 1
+        shard.process.kill()
+        self._respawn(shard.index)
+
+    async def detect(self, input_data: Union[DetectionInput, dict], collect_all: bool = False) -> DetectionResult:
+        """把一筆請求交給對應的子行程偵測，回傳 DetectionResult。"""
+        if not self._started:
+            self.start()
+        if not isinstance(input_data, DetectionInput):
+            input_data = DetectionInput.from_dict(input_data)
+        shard = self._shard_for(str(input_data.ip_address or ""))
+        return await self._submit(shard, input_data, collect_all)
+
+    async def cache_stats(self) -> List[dict]:
+        """每個子行程各自的判斷快取統計（主行程自己的快取在這個模式下沒有用到）。"""
+        if not self._started:
+            self.start()
+        stats = []
+        for index in range(len(self._shards)):
+            shard = self._shards[index]
+            if not shard.process.is_alive():
+                shard = self._respawn(index)
+            try:
+                stats.append(await self._submit(shard, _STATS, False))
+            except (DetectionUnavailable, RuntimeError) as e:
+                stats.append({"error": str(e)})
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "processes": len(self._shards),
+            "batch_size": self.batch_size,
+            "alive": sum(1 for s in self._shards if s.process.is_alive()),
+            "pending": sum(len(s.pending) for s in self._shards),
+            "respawned": self.respawned,
+            "timeouts": self.timeouts,
+            "killed": self.killed,
+        }
+
+    # ---------- 內部 ----------
+
+    @staticmethod
+    def _flush(shard: _Shard) -> None:
+        shard.flush_scheduled = False
+        if shard.buffer:
+            batch, shard.buffer = shard.buffer, []
+            shard.outbox.put(batch)
+
+    @staticmethod
+    def _send_loop(shard: _Shard) -> None:
+        while True:
+            batch = shard.outbox.get()
+            try:
+                shard.conn.send(batch)
+            except (OSError, ValueError):
+                break
+            if batch is _STOP:
+                break
+
+    def _recv_loop(self, shard: _Shard) -> None:
+        while True:
+            try:
+                results = shard.conn.recv()
+            except (EOFError, OSError):
+                break
+            shard.last_reply = time.monotonic()
+            by_loop: Dict[asyncio.AbstractEventLoop, list] = {}
+            with shard.lock:
+                for req_id, result, error in results:
+                    entry = shard.pending.pop(req_id, None)
+                    if entry is not None:
+                        by_loop.setdefault(entry[0], []).append((entry[1], result, error))
+            for loop, items in by_loop.items():
+                loop.call_soon_threadsafe(_resolve, items)
+
+        # 子行程結束了：還在等的 request 全部回報錯誤
+        with shard.lock:
+            leftovers, shard.pending = shard.pending, {}
+        for loop, future in leftovers.values():
+            loop.call_soon_threadsafe(_resolve, [(future, None, "detection worker exited")])
+
+
+def _resolve(items: list) -> None:
+    for future, result, error in items:
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(DetectionUnavailable(error))
+        else:
+            future.set_result(result)
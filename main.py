@@ -1,3 +1,4 @@
+import asyncio
 import os
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
@@ -5,19 +6,94 @@ import uvicorn
 
 # 1. 引用你的後端模組
 # 注意：你的資料夾名稱現在是 app_logging，所以這裡要用 app_logging
-from app_logging.db import engine, Base
+from app_logging.db import engine, Base, dispose_async_engine
+from app_logging.ingest_spool import INGEST_SPOOL
+from app_logging.sketches import SKETCHES, run_sketch_checkpoints
+from app_logging.partitions import PARTITION_GRANULARITY, PartitionManager, run_partition_maintenance
 from app_logging.router import router as logging_router
+from app_logging.search import ensure_search_index
 
 # 2. 初始化資料庫
 # 這行會檢查資料庫連線，並自動建立 attack_logs 資料表 (如果不存在的話)
 Base.metadata.create_all(bind=engine)
+# payload 全文索引（MySQL FULLTEXT / SQLite FTS5），已經有了就不會重建
+ensure_search_index(engine)
 
 app = FastAPI()
 
+# 回應壓縮：/api/logs 之類的大 JSON 超過 1 KB 才壓；有裝 brotli-asgi 就用 brotli（瀏覽器不支援時它會退回 gzip）
+# /api/logs/export 自己就是 gzip（或 zstd 壓縮的 parquet）串流，不再壓第二次
+UNCOMPRESSED_PATHS = ("/api/logs/export",)
+
+
+class CompressionExcept:
+    """路徑在 paths 裡的直接交給 app，其他的經過壓縮 middleware。"""
+
+    def __init__(self, app, compressor, paths=UNCOMPRESSED_PATHS, **options):
+        self.app = app
+        self.compressed = compressor(app, **options)
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
+
+
+try:
+    from brotli_asgi import BrotliMiddleware as _Compressor
+except ImportError:
+    from fastapi.middleware.gzip import GZipMiddleware as _Compressor
+app.add_middleware(CompressionExcept, compressor=_Compressor, minimum_size=1000)
+
 # 3. 掛載 API 路由
 # 這樣前端才能透過 /api/logs 拿到資料
 app.include_router(logging_router)
 
+
+# DB 掛掉時 /api/report-attack 先寫進本機 spool，背景 drainer 等 DB 恢復再批次補寫
+@app.on_event("startup")
+async def start_ingest_spool():
+    await INGEST_SPOOL.start()
+
+
+# attack_logs 依時間分區（MySQL）+ 保留期限：定期補未來分區、刪過期分區
+PARTITION_TASK = None
+
+
+@app.on_event("startup")
+async def start_partition_maintenance():
+    global PARTITION_TASK
+    if PARTITION_GRANULARITY != "off":
+        PARTITION_TASK = asyncio.create_task(run_partition_maintenance(PartitionManager()))
+
+
+# /api/top 的排行 sketch：啟動時讀回上次的存檔，之後定期存檔
+SKETCH_TASK = None
+
+
+@app.on_event("startup")
+async def start_sketch_checkpoints():
+    global SKETCH_TASK
+    SKETCHES.load()
+    SKETCH_TASK = asyncio.create_task(run_sketch_checkpoints(SKETCHES))
+
+
+@app.on_event("shutdown")
+async def close_db_pools():
+    if PARTITION_TASK is not None:
+        PARTITION_TASK.cancel()
+    if SKETCH_TASK is not None:
+        SKETCH_TASK.cancel()
+        try:
+            SKETCHES.save()
+        except OSError:
+            pass
+    await INGEST_SPOOL.stop()
+    await dispose_async_engine()
+
+
 # 4. 設定 Dashboard 頁面路由
 @app.get("/admin/monitor", response_class=HTMLResponse)
 async def read_dashboard():
@@ -1,19 +1,49 @@
 # 檔案位置：/vuln-site/app.py
 import sqlite3
 import os
-import requests
 from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict
-
-# 🔗 A + B 串接：匯入偵測模組
-from detector import detect_attack
+from starlette.background import BackgroundTask
+
+# 🔗 A + B 串接：偵測改由 ASGI middleware 統一處理
+from detection import DetectionResult, decision_cache_stats
+from detection.worker_pool import DEFAULT_TIMEOUT, DetectionWorkerPool
+from common.spool import Spool
+from waf_middleware import DetectionMiddleware
+from blocking_pool import BlockingPool, PoolFullError
+from http_client import OutboundClient, decode_prefix
+from detect_log import DetectionLogger
+from shipper import AttackShipper
+from file_stream import FILE_MAX_BYTES, RangeNotSatisfiable, close_stream, iter_file, open_for_stream, parse_range
 
 # 建立 FastAPI 實例
 app = FastAPI(title="Vulnerable Web App (Module A)")
 DB_NAME = "vuln_site.db"
 
+# ========= 阻塞工作的執行緒池 =========
+# 檔案讀取、SQLite、對外 HTTP 都會卡住 event loop，一律丟到這個池子裡跑
+POOL_MAX_WORKERS = 16     # 同時執行的執行緒數
+POOL_MAX_QUEUE = 256      # 最多排隊幾個工作，超過回 503
+
+BLOCKING_POOL = BlockingPool(max_workers=POOL_MAX_WORKERS, max_queue=POOL_MAX_QUEUE)
+
+
+@app.exception_handler(PoolFullError)
+async def pool_full_handler(request: Request, exc: PoolFullError):
+    return JSONResponse(status_code=503, content={"error": "Server busy, try again later"})
+
+
+# ========= 共用的對外 HTTP client（連線池 + keep-alive） =========
+PROXY_SAMPLE_CHARS = 100   # /api/proxy 只回傳前 100 個字
+
+OUTBOUND_CLIENT = OutboundClient()
+
+
+# ========= 偵測紀錄（JSON Lines，背景寫入） =========
+DETECT_LOG = DetectionLogger()   # 路徑、輪替大小、正常流量抽樣率見 detect_log.py
+
+
 # --- 定義 Request Body 模型 (Pydantic) ---
 class LoginRequest(BaseModel):
     username: str
@@ -26,61 +56,84 @@ class ProxyRequest(BaseModel):
     url: str
 
 
-# ========= A+B 串接：把 FastAPI Request 轉成 DetectionInput =========
+# ========= 偵測服務模式（多行程） =========
+# DETECTION_WORKERS=N（N > 0）時，偵測交給 N 個子行程，可以用到多顆 CPU；
+# 預設 0 = 直接在 request 所在的行程偵測
+# DETECTION_WORKER_TIMEOUT：一筆請求最多等子行程幾秒（預設 2 秒），逾時回 503
+DETECTION_WORKERS = int(os.environ.get("DETECTION_WORKERS", "0"))
+DETECTION_WORKER_TIMEOUT = float(os.environ.get("DETECTION_WORKER_TIMEOUT", DEFAULT_TIMEOUT))
+DETECTION_POOL = (
+    DetectionWorkerPool(DETECTION_WORKERS, timeout=DETECTION_WORKER_TIMEOUT) if DETECTION_WORKERS > 0 else None
+)
 
-def build_detection_input(request: Request, body: Optional[Dict] = None) -> dict:
-    """
-    轉成 B 模組 detect_attack 需要的格式：
-
-    {
-      "ip_address": "string",
-      "url": "string",
-      "http_method": "string",
-      "params": dict,
-      "body": dict,
-      "user_agent": "string"
-    }
-    """
-    if body is None:
-        body = {}
-
-    return {
-        "ip_address": request.client.host if request.client else "",
-        "url": request.url.path,                   # 例如 /api/login
-        "http_method": request.method,            # GET / POST ...
-        "params": dict(request.query_params),     # Query string
-        "body": body,                             # 我們自己塞進去的 body
-        "user_agent": request.headers.get("user-agent", "")
-    }
 
 # ========= 將攻擊發送給 Logging Service（C 模組） =========
 
 LOGGING_SERVER_BASE = "http://127.0.0.1:8000"   # ← C 模組的網址與 port，依你們實際環境調整
 
-def send_attack_to_logger(detection_result: dict, request: Request):
+# Logging Service 連不上時，攻擊事件先寫進本機 spool，恢復後整批用 /api/report-attacks 重送
+ATTACK_SPOOL_DIR = os.path.join("logs", "spool")
+
+ATTACK_SHIPPER = AttackShipper(
+    OUTBOUND_CLIENT,
+    f"{LOGGING_SERVER_BASE}/api/report-attack",
+    DETECT_LOG,
+    spool=Spool(ATTACK_SPOOL_DIR),
+    batch_url=f"{LOGGING_SERVER_BASE}/api/report-attacks",
+)
+
+
+def send_attack_to_logger(detection_result: DetectionResult, request: Request):
     """
     如果偵測到攻擊，將攻擊資料送給 Logging Service 的 /api/report-attack。
+    這裡只把事件排進 ATTACK_SHIPPER 的 queue，實際 POST 在背景進行。
     """
-    if not detection_result.get("is_attack"):
+    if not detection_result.is_attack:
         return  # 沒偵測到攻擊不送
 
-    try:
-        url = f"{LOGGING_SERVER_BASE}/api/report-attack"
-
-        payload = {
-            "ip_address": detection_result.get("ip_address") or (request.client.host if request.client else ""),
-            "url": str(request.url),
-            "payload": detection_result.get("payload") or "",
-            "attack_type": detection_result.get("attack_type") or "OTHER",
-            "severity": detection_result.get("severity") or "LOW",
-            "user_agent": request.headers.get("user-agent", "")
-        }
+    payload = {
+        "ip_address": detection_result.ip_address or (request.client.host if request.client else ""),
+        "url": str(request.url),
+        "payload": detection_result.payload or "",
+        "attack_type": detection_result.attack_type or "OTHER",
+        "severity": detection_result.severity or "LOW",
+        # 偵測當下的時間（epoch 奈秒），Logging Service 用它當 AttackLog.timestamp
+        "detected_at_ns": detection_result.detected_at_ns,
+        "user_agent": request.headers.get("user-agent", "")
+    }
+    ATTACK_SHIPPER.submit(payload)
 
-        requests.post(url, json=payload, timeout=2)
-        print("[LOGGING] Attack sent to logging service:", payload)
 
-    except Exception as e:
-        print("[LOGGING ERROR] 無法送到 Logging Service:", e)
+async def on_detection(detection_result: DetectionResult, request: Request):
+    """每個 request 偵測完之後呼叫一次（由 DetectionMiddleware 觸發）。"""
+    DETECT_LOG.log_detection(detection_result, request.url.path, request.method)
+    send_attack_to_logger(detection_result, request)
+
+
+# 🔗 A + B 串接：所有 request 在進到路由之前都先經過偵測，
+# MODE = BLOCK 時攻擊直接在這裡回 403，不會進到下面的 handler
+middleware_options = {"on_result": on_detection}
+if DETECTION_POOL is not None:
+    middleware_options["detect"] = DETECTION_POOL.detect
+app.add_middleware(DetectionMiddleware, **middleware_options)
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    DETECT_LOG.start()
+    await ATTACK_SHIPPER.start()
+    if DETECTION_POOL is not None:
+        DETECTION_POOL.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await ATTACK_SHIPPER.stop()
+    await OUTBOUND_CLIENT.aclose()
+    DETECT_LOG.stop()
+    BLOCKING_POOL.shutdown()
+    if DETECTION_POOL is not None:
+        DETECTION_POOL.shutdown()
 
 
 # --- 資料庫初始化 ---
@@ -111,6 +164,46 @@ def init_db():
 
 init_db()
 
+
+# --- 會阻塞的小工具（只在 BLOCKING_POOL 的執行緒裡呼叫） ---
+
+def _query_one(sql: str):
+    """執行一條 SQL 並回傳第一筆結果。每次都開新連線，避免跨執行緒共用。"""
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+# 觀察執行緒池壓力：目前執行中 / 排隊中 / 被拒絕的工作數
+@app.get("/api/pool-stats")
+async def pool_stats():
+    return BLOCKING_POOL.stats()
+
+
+# 偵測紀錄的背景寫入狀態：排隊中 / 已寫入 / 因 queue 滿被丟掉的筆數
+@app.get("/api/log-stats")
+async def log_stats():
+    return DETECT_LOG.stats()
+
+
+# 偵測判斷快取的命中率（相同內容的請求不用重新掃描）
+@app.get("/api/detection-cache-stats")
+async def detection_cache_stats():
+    if DETECTION_POOL is not None:
+        # 多行程模式：快取在各個子行程裡，主行程的是空的
+        return {"workers": await DETECTION_POOL.cache_stats(), "pool": DETECTION_POOL.stats()}
+    return decision_cache_stats()
+
+
+# Logging Service 連不上時暫存的攻擊事件：還有幾段沒重送
+@app.get("/api/ship-spool-stats")
+async def ship_spool_stats():
+    return ATTACK_SHIPPER.spool.stats()
+
 # --- 漏洞 API 實作 ---
 
 # root 路由回傳 login.html
@@ -128,47 +221,21 @@ async def dashboard():
 # 目標：POST /api/login
 # 說明：使用 f-string 拼接 SQL，導致 ' OR '1'='1 可繞過驗證
 @app.post("/api/login")
-async def login(request: Request, data: LoginRequest):
-    # --- 先做攻擊偵測 ---
-    detection_input = build_detection_input(
-        request,
-        body={"username": data.username, "password": data.password}
-    )
-    detection_result = detect_attack(detection_input)
-    print("[DETECT] /api/login ->", detection_result)
-
-    send_attack_to_logger(detection_result, request)
-
-
-    if detection_result.get("should_block"):
-        return JSONResponse(
-            status_code=403,
-            content={
-                "message": "Blocked by WAF (login)",
-                "attack_type": detection_result.get("attack_type"),
-                "severity": detection_result.get("severity"),
-                "payload": detection_result.get("payload"),
-            }
-        )
-
+async def login(data: LoginRequest):
     # --- 原本不安全的登入邏輯 ---
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
     # 錯誤寫法：直接將 Pydantic 驗證過的字串拼接到 SQL 中
     sql = f"SELECT * FROM users WHERE username = '{data.username}' AND password = '{data.password}'"
     
     print(f"[DEBUG] SQL Executed: {sql}")  # 讓你在後台看到攻擊語句
 
     try:
-        cursor.execute(sql)
-        user = cursor.fetchone()
+        # SQLite 查詢會阻塞，丟到執行緒池
+        user = await BLOCKING_POOL.run(_query_one, sql)
+    except PoolFullError:
+        raise
     except Exception as e:
-        conn.close()
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-    conn.close()
-
     if user:
         # 登入成功
         return {
@@ -185,24 +252,7 @@ async def login(request: Request, data: LoginRequest):
 # 目標：POST /api/search
 # 說明：直接回傳 HTML，未經過濾
 @app.post("/api/search", response_class=HTMLResponse)
-async def search(request: Request, data: SearchRequest):
-    # --- 先做攻擊偵測 ---
-    detection_input = build_detection_input(
-        request,
-        body={"keyword": data.keyword}
-    )
-    detection_result = detect_attack(detection_input)
-    print("[DETECT] /api/search ->", detection_result)
-
-    send_attack_to_logger(detection_result, request)
-
-    if detection_result.get("should_block"):
-        # 被判定為攻擊時直接擋下
-        return HTMLResponse(
-            content=f"<h2>搜尋請求已被阻擋：疑似 {detection_result.get('attack_type')}</h2>",
-            status_code=403
-        )
-
+async def search(data: SearchRequest):
     # --- 原本不安全的回傳方式 ---
     unsafe_html = f"<h2>搜尋結果： {data.keyword} </h2>"
     # 使用 HTMLResponse 模擬後端直接渲染頁面 (Server-Side Rendering)
@@ -214,33 +264,52 @@ async def search(request: Request, data: SearchRequest):
 # 說明：未檢查 filename 是否包含 "../"，可讀取系統檔案
 @app.get("/api/file")
 async def get_file(request: Request, filename: str):
-    # --- 先做攻擊偵測 ---
-    detection_input = build_detection_input(request)
-    detection_result = detect_attack(detection_input)
-    print("[DETECT] /api/file ->", detection_result)
-
-    send_attack_to_logger(detection_result, request)
-
-    if detection_result.get("should_block"):
-        return JSONResponse(
-            status_code=403,
-            content={
-                "error": "Blocked by WAF (file access)",
-                "attack_type": detection_result.get("attack_type"),
-                "payload": detection_result.get("payload"),
-            }
-        )
-
     # --- 原本不安全的檔案讀取 ---
     try:
         # 錯誤寫法：直接 open 使用者提供的路徑
         # 攻擊：/api/file?filename=app.py 或 ../../../etc/passwd
-        if not os.path.exists(filename):
-            return JSONResponse(status_code=404, content={"error": "File not found"})
-             
-        with open(filename, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return Response(content=content, media_type="text/plain")
+        # 整個回應（開檔 + 每個 chunk 的 read）佔同一個名額：滿了在送出 header 之前就回 503
+        slot = BLOCKING_POOL.reserve()
+        streaming = False
+        try:
+            opened = await slot.run(open_for_stream, filename)
+            if opened is None:
+                return JSONResponse(status_code=404, content={"error": "File not found"})
+            f, size = opened
+
+            # 不再 f.read() 整個檔案：用 chunk 串流，並支援 Range 與單次回應上限
+            try:
+                byte_range = parse_range(request.headers.get("range"), size)
+            except RangeNotSatisfiable:
+                f.close()
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = min(max(end - start + 1, 0), FILE_MAX_BYTES)
+
+            headers = {"Accept-Ranges": "bytes", "Content-Length": str(length)}
+            status_code = 200
+            if byte_range:
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+            elif length < size:
+                headers["X-Content-Truncated"] = "true"   # 超過 FILE_MAX_BYTES 被截斷
+
+            response = StreamingResponse(
+                iter_file(slot, f, start, length),
+                status_code=status_code,
+                media_type="text/plain; charset=utf-8",
+                headers=headers,
+                # 回應沒送完（或沒開始送）也會關檔、還名額；重複呼叫沒關係
+                background=BackgroundTask(close_stream, slot, f),
+            )
+            streaming = True
+            return response
+        finally:
+            if not streaming:
+                slot.release()
+    except PoolFullError:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -249,36 +318,19 @@ async def get_file(request: Request, filename: str):
 # 目標：POST /api/proxy
 # 說明：Server 代替使用者發請求，未檢查是否為內網 IP
 @app.post("/api/proxy")
-def proxy(request: Request, data: ProxyRequest):
+async def proxy(data: ProxyRequest):
     target_url = data.url
 
-    # --- 先做攻擊偵測 ---
-    detection_input = build_detection_input(
-        request,
-        body={"url": target_url}
-    )
-    detection_result = detect_attack(detection_input)
-    print("[DETECT] /api/proxy ->", detection_result)
-
-    send_attack_to_logger(detection_result, request)
-
-    if detection_result.get("should_block"):
-        return JSONResponse(
-            status_code=403,
-            content={
-                "error": "Blocked by WAF (SSRF)",
-                "attack_type": detection_result.get("attack_type"),
-                "payload": detection_result.get("payload"),
-            }
-        )
-
     # --- 原本不安全的 SSRF 邏輯 ---
     try:
         print(f"[DEBUG] Server fetching: {target_url}")
-        resp = requests.get(target_url, timeout=3)
+        # 只讀前面需要的 bytes（UTF-8 一個字最多 4 bytes），不下載整個 body
+        status_code, head, encoding = await OUTBOUND_CLIENT.fetch_prefix(
+            target_url, max_bytes=PROXY_SAMPLE_CHARS * 4
+        )
         return {
-            "status_code": resp.status_code,
-            "sample_content": resp.text[:100]  # 回傳前100字
+            "status_code": status_code,
+            "sample_content": decode_prefix(head, encoding, PROXY_SAMPLE_CHARS)  # 回傳前100字
         }
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -287,7 +339,7 @@ def proxy(request: Request, data: ProxyRequest):
 # 【漏洞 5】Suspicious User-Agent
 # 這是一個被動漏洞，FastAPI 本身不擋任何 UA。
 # 只要有 request 帶著例如 "sqlmap"、"curl" 等 UA，
-# 在 build_detection_input + detect_attack 的流程中就會被標記為 SUSPICIOUS_UA。
+# 在 DetectionMiddleware 的偵測流程中就會被標記為 SUSPICIOUS_UA。
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,124 @@
+# 檔案位置：/vuln-site/bench_pool.py
+
+"""
+簡單壓力測試：用不同的並發數打 /api/file，觀察吞吐量是否隨並發數上升。
+
+使用方式：
+    python bench_pool.py
+    python bench_pool.py --requests 400 --concurrency 1 4 16 32
+    python bench_pool.py --url http://127.0.0.1:5000      # 打已經在跑的 app.py
+
+阻塞工作都在 BLOCKING_POOL 裡跑之後，並發數變大時 req/s 應該跟著上升，
+而不是卡在單一 request 的速度。每一輪結束會印出 /api/pool-stats。
+
+沒給 --url 時會自己開一個 app.py（uvicorn 子行程），並用 DETECTION_RULES 指向一份
+把 RATE_LIMITS / BAN_LIST 關掉的規則檔（以目前的 DETECTION_RULES 或內附 rules.json 為底），
+壓測的大量請求不會被判成 RATE_LIMIT 而回 403、也不會把本機 IP 封鎖。
+給 --url 時請自己確認那個伺服器的規則沒有開啟限流 / 封鎖名單。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from detection.rules import DEFAULT_RULES_PATH
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 避免被 SUSPICIOUS_UA 規則（python-requests / curl）擋下
+HEADERS = {"User-Agent": "VulnSiteLoadTest/1.0"}
+
+
+def _worker(session: requests.Session, url: str, n: int) -> int:
+    ok = 0
+    for _ in range(n):
+        resp = session.get(url, headers=HEADERS, timeout=30)
+        if resp.status_code == 200:
+            ok += 1
+    return ok
+
+
+def run_round(base_url: str, total: int, concurrency: int, filename: str) -> None:
+    url = f"{base_url}/api/file?filename={filename}"
+    per_worker = max(total // concurrency, 1)
+    sessions = [requests.Session() for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_worker, s, url, per_worker) for s in sessions]
+        ok = sum(f.result() for f in futures)
+    elapsed = time.perf_counter() - start
+
+    sent = per_worker * concurrency
+    stats = requests.get(f"{base_url}/api/pool-stats", headers=HEADERS, timeout=5).json()
+    print(
+        f"concurrency={concurrency:>3}  requests={sent:>5}  ok={ok:>5}  "
+        f"{sent / elapsed:8.1f} req/s  pool={stats}"
+    )
+
+
+def write_bench_rules(directory: str) -> str:
+    """複製一份規則檔，關掉限流與封鎖名單（壓測的請求全部來自同一個 IP）。"""
+    with open(os.environ.get("DETECTION_RULES") or DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    for section in ("RATE_LIMITS", "BAN_LIST"):
+        data.setdefault(section, {})["ENABLED"] = False
+    path = os.path.join(directory, "rules.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return path
+
+
+def start_server(port: int, rules_path: str) -> subprocess.Popen:
+    """在子行程開 app.py，等 /api/pool-stats 有回應才回傳。"""
+    env = dict(os.environ, DETECTION_RULES=rules_path)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {proc.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/pool-stats", headers=HEADERS, timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("app.py did not start within 30 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for vuln-site /api/file")
+    parser.add_argument("--url", default=None, help="已經在跑的伺服器；沒給就自己開一個")
+    parser.add_argument("--port", type=int, default=5055, help="自己開伺服器時用的 port")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--filename", default="login.html")
+    args = parser.parse_args()
+
+    if args.url:
+        for c in args.concurrency:
+            run_round(args.url, args.requests, c, args.filename)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        proc = start_server(args.port, write_bench_rules(directory))
+        try:
+            for c in args.concurrency:
+                run_round(f"http://127.0.0.1:{args.port}", args.requests, c, args.filename)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
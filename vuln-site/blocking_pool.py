@@ -0,0 +1,121 @@
+# 檔案位置：/vuln-site/blocking_pool.py
+
+"""
+有界的執行緒池（Bounded Thread Pool）
+
+FastAPI 的 async handler 跑在同一個 event loop 上，
+只要在裡面直接做 open().read()、sqlite3、requests.get 這類「會卡住」的動作，
+其他同時進來的 request 就全部要排隊等它。
+
+這裡把所有阻塞工作統一丟到固定大小的執行緒池：
+- max_workers：同時執行的執行緒數量
+- max_queue  ：最多允許多少工作在排隊，超過就直接拒絕（回 503），避免無限堆積
+- stats()    ：回傳目前執行中 / 排隊中的數量，方便觀察壓力
+- reserve()  ：一次佔住一個名額做好幾次阻塞呼叫（例如串流讀檔：送出 header 之前就確定拿得到名額，
+               之後每個 chunk 不會再被拒絕、把送到一半的 body 截斷）
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class PoolFullError(RuntimeError):
+    """排隊的工作已經滿了，呼叫端應該回 503。"""
+
+
+class BlockingPool:
+    def __init__(self, max_workers: int = 16, max_queue: int = 256):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="blocking-pool",
+        )
+        self._lock = threading.Lock()
+        self._pending = 0      # 已送出但還沒結束的工作（包含執行中）
+        self._running = 0      # 正在執行緒裡跑的工作
+        self._completed = 0
+        self._rejected = 0
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolFullError(
+                    f"blocking pool is full ({self._pending} pending)"
+                )
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    async def _execute(self, func: Callable, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._call, func, args, kwargs
+        )
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """
+        在執行緒池裡執行 func(*args, **kwargs)，並 await 它的結果。
+        排隊數量超過上限時丟出 PoolFullError。
+        """
+        self._acquire()
+        try:
+            return await self._execute(func, args, kwargs)
+        finally:
+            self._release()
+
+    def reserve(self) -> "Reservation":
+        """
+        佔住一個名額（滿了就丟出 PoolFullError），之後用 Reservation.run() 執行，
+        用完一定要 release()。
+        """
+        self._acquire()
+        return Reservation(self)
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict):
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """目前執行緒池的狀態（給 /api/pool-stats 用）。"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": max(self._pending - self._running, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class Reservation:
+    """BlockingPool.reserve() 佔住的一個名額；release() 可以重複呼叫。"""
+
+    def __init__(self, pool: BlockingPool):
+        self._pool = pool
+        self._released = False
+
+    async def run(self, func: Callable, *args, **kwargs):
+        if self._released:
+            raise RuntimeError("reservation already released")
+        return await self._pool._execute(func, args, kwargs)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool._release()
@@ -0,0 +1,203 @@
+# 檔案位置：/vuln-site/detect_log.py
+
+"""
+結構化、非同步的偵測紀錄（JSON Lines）。
+
+原本每個 request 都 print("[DETECT] ...")，正常流量也一樣，
+stdout 是同步寫入，會直接拖慢 request。
+
+現在：
+- request 路徑上只做 queue.put_nowait()，不做任何 I/O 與 JSON 序列化
+- 背景執行緒批次取出、序列化成一行一筆 JSON、一次寫入
+- 正常（非攻擊）結果可以抽樣記錄：BENIGN_SAMPLE_RATE
+- 檔案超過 max_bytes 自動輪替：detections.jsonl → detections.jsonl.1 → ...
+- queue 滿了就丟掉並計數（dropped），絕不讓 request 等待
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+DETECT_LOG_PATH = os.path.join("logs", "detections.jsonl")
+DETECT_LOG_MAX_BYTES = 10 * 1024 * 1024   # 單檔 10 MB 就輪替
+DETECT_LOG_BACKUP_COUNT = 5                # 最多保留幾個舊檔
+DETECT_LOG_QUEUE_SIZE = 10000              # queue 上限，滿了就丟
+BENIGN_SAMPLE_RATE = 0.01                  # 正常流量只記 1%（0 = 不記、1 = 全記）
+
+_BATCH_SIZE = 256
+_STOP = object()
+
+
+def _json_default(obj):
+    """DetectionResult 之類有 to_dict() 的物件，在背景執行緒才轉成 dict。"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return str(obj)
+
+
+class DetectionLogger:
+    def __init__(
+        self,
+        path: str = DETECT_LOG_PATH,
+        max_bytes: int = DETECT_LOG_MAX_BYTES,
+        backup_count: int = DETECT_LOG_BACKUP_COUNT,
+        queue_size: int = DETECT_LOG_QUEUE_SIZE,
+        benign_sample_rate: float = BENIGN_SAMPLE_RATE,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.benign_sample_rate = benign_sample_rate
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.rotate_errors = 0
+        self.last_error: Optional[str] = None
+
+    # ---------- request 路徑上呼叫（不可阻塞） ----------
+
+    def log_detection(self, detection_result, path: str, method: str) -> None:
+        """
+        記錄一次偵測結果（dict 或 DetectionResult）；正常流量依 benign_sample_rate 抽樣。
+        DetectionResult 直接放進 queue，由背景執行緒轉成 dict 再序列化。
+        """
+        if not detection_result.get("is_attack"):
+            if self.benign_sample_rate <= 0 or random.random() >= self.benign_sample_rate:
+                return
+        # 有偵測時間就用偵測時間，不再另外取一次
+        detected_at_ns = detection_result.get("detected_at_ns")
+        self._enqueue({
+            "ts": detected_at_ns / 1_000_000_000 if detected_at_ns else time.time(),
+            "event": "detect",
+            "path": path,
+            "method": method,
+            "result": detection_result,
+        })
+
+    def log_event(self, event: str, **fields) -> None:
+        """記錄其他事件（例如送 log 成功 / 失敗）。"""
+        fields["ts"] = time.time()
+        fields["event"] = event
+        self._enqueue(fields)
+
+    def _enqueue(self, record: Dict) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # ---------- 背景寫入 ----------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name="detect-log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """把 queue 裡剩下的寫完再結束。"""
+        if self._thread is None:
+            return
+        try:
+            # queue 滿的時候不能一直等（寫入執行緒卡住的話 shutdown 會跟著卡住）
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        f = None
+        size = 0
+        try:
+            while True:
+                batch: List = [self._queue.get()]
+                # 一次把目前排隊的都拿出來，合併成一次 write
+                while len(batch) < _BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = False
+                lines = []
+                for record in batch:
+                    if record is _STOP:
+                        stop = True
+                        continue
+                    lines.append(json.dumps(record, ensure_ascii=False, default=_json_default))
+
+                if lines:
+                    # 寫檔失敗（磁碟滿、權限）只丟掉這一批並計數，執行緒繼續跑
+                    try:
+                        if f is None:
+                            f = open(self.path, "a", encoding="utf-8")
+                            size = f.tell()
+                        data = "\n".join(lines) + "\n"
+                        f.write(data)
+                        f.flush()
+                        size += len(data.encode("utf-8"))
+                        self.written += len(lines)
+                    except OSError as e:
+                        self.write_errors += 1
+                        self.dropped += len(lines)
+                        self.last_error = str(e)
+                        f = self._close_quietly(f)
+                        size = 0
+
+                    if f is not None and size >= self.max_bytes:
+                        # 這一批已經寫進去了：輪替失敗另外計數，不算 dropped（下一批接著寫原本的檔）
+                        f = self._close_quietly(f)
+                        try:
+                            self._rotate()
+                        except OSError as e:
+                            self.rotate_errors += 1
+                            self.last_error = str(e)
+
+                if stop:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+    @staticmethod
+    def _close_quietly(f):
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+        return None
+
+    def _rotate(self) -> None:
+        """detections.jsonl.4 → .5、…、detections.jsonl → .1（最舊的刪掉）"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "rotate_errors": self.rotate_errors,
+            "last_error": self.last_error,
+        }
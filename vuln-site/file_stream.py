@@ -0,0 +1,115 @@
+# 檔案位置：/vuln-site/file_stream.py
+
+"""
+/api/file 用的串流讀檔工具。
+
+原本是 f.read() 一次把整個檔案讀進記憶體，檔案多大、每個 request 就吃多少 RAM。
+這裡改成：
+- 固定大小的 chunk 一塊一塊讀、一塊一塊送出（每個 request 記憶體固定）
+- 支援 HTTP Range（bytes=start-end / bytes=start- / bytes=-suffix）
+- 每個回應最多送 FILE_MAX_BYTES，超過就截斷
+開檔、seek()、read() 都在 BlockingPool 裡做，不會卡住 event loop。
+每個回應在開檔前先佔一個名額（BlockingPool.reserve()，滿了回 503），整個串流都用同一個名額，
+送出 header 之後不會因為池子滿了而把 body 截斷。
+"""
+
+import os
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+
+from blocking_pool import Reservation
+
+FILE_CHUNK_SIZE = 64 * 1024          # 每次讀 64 KB
+FILE_MAX_BYTES = 10 * 1024 * 1024    # 單一回應最多 10 MB
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range header 超出檔案大小，應回 416。"""
+
+
+def open_for_stream(filename: str) -> Optional[Tuple[BinaryIO, int]]:
+    """
+    （阻塞，請在執行緒池裡呼叫）
+    開啟檔案並回傳 (檔案物件, 檔案大小)；檔案不存在時回傳 None。
+    """
+    if not os.path.exists(filename):
+        return None
+    f = open(filename, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+    except Exception:
+        f.close()
+        raise
+    return f, size
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析單一區段的 Range header，回傳 (start, end)（end 包含在內）。
+    沒有 Range 或格式看不懂時回傳 None（當作一般 200 回應）。
+    多段 Range（bytes=0-1,5-6）不支援，一樣當作沒有 Range。
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        first_n = int(first) if first else None
+        last_n = int(last) if last else None
+    except ValueError:
+        return None
+    if first_n is None and last_n is None:
+        return None   # bytes=-
+
+    # RangeNotSatisfiable 一定要在上面的 try 外面丟，不然會被 except ValueError 吃掉變成 200
+    if first_n is None:
+        # bytes=-500：最後 500 bytes
+        if last_n <= 0:
+            raise RangeNotSatisfiable(header)
+        start, end = max(size - last_n, 0), size - 1
+    else:
+        start = first_n
+        end = last_n if last_n is not None else size - 1
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+async def iter_file(
+    slot: Reservation,
+    f: BinaryIO,
+    start: int,
+    length: int,
+    chunk_size: int = FILE_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    從 start 開始讀 length bytes，一次一個 chunk；結束（或中斷）時關檔。
+    回應根本沒開始送的時候 generator 不會執行到 finally，呼叫端要另外用 background task
+    關檔並 release() 名額。
+    """
+    try:
+        if start:
+            await slot.run(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await slot.run(f.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+        slot.release()
+
+
+def close_stream(slot: Reservation, f: BinaryIO) -> None:
+    """回應結束後的 background task：關檔、還名額（iter_file 已經做過的話什麼都不會發生）。"""
+    f.close()
+    slot.release()
@@ -0,0 +1,124 @@
+# 檔案位置：/vuln-site/http_client.py
+
+"""
+共用的非同步對外 HTTP client（給 /api/proxy 與送 log 用）。
+
+原本每次都 requests.get()，沒有 session 重用：
+- 每個請求都重新建立 TCP / TLS 連線
+- 上游很慢時，會佔住一個執行緒直到 timeout
+- 只為了回傳前 100 個字，卻把整個 body 下載完
+
+這裡改用一個全域的 httpx.AsyncClient：
+- 連線池 + keep-alive，連到同一個 host 會重用連線
+- 每個 host 有並發上限（PROXY_PER_HOST_LIMIT），避免某個慢 host 吃光連線池
+- fetch_prefix() 只讀需要的前幾個 bytes，最多 PROXY_MAX_BYTES
+"""
+
+import asyncio
+import codecs
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
+
+PROXY_TIMEOUT_SECONDS = 3.0
+PROXY_MAX_CONNECTIONS = 100          # 整個連線池最多幾條連線
+PROXY_MAX_KEEPALIVE = 20             # 最多保留幾條閒置連線
+PROXY_KEEPALIVE_EXPIRY = 30.0        # 閒置連線保留幾秒
+PROXY_PER_HOST_LIMIT = 8             # 同一個 host 同時最多幾個請求
+PROXY_MAX_BYTES = 1024 * 1024        # 單次回應最多讀 1 MB
+
+# per-host semaphore 超過這個數量時，清掉目前沒人在用的（沒有人持有、也沒有人在等）
+_MAX_TRACKED_HOSTS = 1024
+
+
+class OutboundClient:
+    def __init__(
+        self,
+        timeout: float = PROXY_TIMEOUT_SECONDS,
+        max_connections: int = PROXY_MAX_CONNECTIONS,
+        max_keepalive: int = PROXY_MAX_KEEPALIVE,
+        keepalive_expiry: float = PROXY_KEEPALIVE_EXPIRY,
+        per_host_limit: int = PROXY_PER_HOST_LIMIT,
+    ):
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._per_host_limit = per_host_limit
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}   # 每個 host 目前持有 + 等待 semaphore 的請求數
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 第一次用到才建立，確保是在 event loop 裡建立的
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._client
+
+    @asynccontextmanager
+    async def _host_limit(self, url: str):
+        host = urlsplit(url).netloc.lower()
+        sem = self._host_limits.get(host)
+        if sem is None:
+            if len(self._host_limits) >= _MAX_TRACKED_HOSTS:
+                # 只保留還有人在用 / 在等的 semaphore
+                # （不能看 locked()：那只代表名額全部用完，用了一部分的也會被丟掉，下一個請求就拿到新的、繞過上限）
+                self._host_limits = {
+                    h: s for h, s in self._host_limits.items() if self._host_users.get(h)
+                }
+            sem = asyncio.Semaphore(self._per_host_limit)
+            self._host_limits[host] = sem
+
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with sem:
+                yield
+        finally:
+            users = self._host_users[host] - 1
+            if users:
+                self._host_users[host] = users
+            else:
+                del self._host_users[host]
+
+    async def fetch_prefix(self, url: str, max_bytes: int) -> Tuple[int, bytes, str]:
+        """
+        GET url，但只讀 body 的前 max_bytes（最多 PROXY_MAX_BYTES）。
+        回傳 (status_code, 讀到的 bytes, 回應的編碼)。
+        """
+        max_bytes = min(max_bytes, PROXY_MAX_BYTES)
+        async with self._host_limit(url):
+            async with self._get_client().stream("GET", url) as resp:
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    buf += chunk
+                    if len(buf) >= max_bytes:
+                        break
+                # 提早離開 stream() 會直接關掉這條連線，不會把剩下的 body 下載完
+                return resp.status_code, bytes(buf[:max_bytes]), resp.encoding or "utf-8"
+
+    async def post_json(self, url: str, payload: Union[dict, List[dict]], timeout: Optional[float] = None) -> int:
+        """POST 一個 JSON（物件或陣列），回傳 status code。"""
+        async with self._host_limit(url):
+            resp = await self._get_client().post(
+                url, json=payload, timeout=timeout or self._timeout
+            )
+            return resp.status_code
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def decode_prefix(data: bytes, encoding: str, max_chars: int) -> str:
+    """把截斷的 bytes 解碼成最多 max_chars 個字（最後被切斷的多位元組字元會被丟掉）。"""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    # final=False：結尾不完整的位元組先留著不解碼，不會變成亂碼字元
+    return decoder.decode(data, final=False)[:max_chars]
@@ -0,0 +1,149 @@
+# 檔案位置：/vuln-site/shipper.py
+
+"""
+把攻擊事件送到 Logging Service（C 模組）的背景工作。
+
+request 路徑上只呼叫 submit()（asyncio.Queue.put_nowait），
+真正的 HTTP POST 由背景 task 用共用的 OutboundClient 送出，
+成功 / 失敗都寫進 DetectionLogger，不再 print。
+
+有給 spool 時，送不出去的事件不會丟掉：
+- POST 失敗（連線錯誤、5xx）或 queue 滿了 → 寫進本機 spool
+- 失敗後 SHIPPER_RETRY_SECONDS 內，新的事件直接進 spool，不再一筆一筆等 timeout
+- 背景 replay task 把 spool 的分段用 batch_url 整段一次 POST，成功才刪掉分段
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+from detect_log import DetectionLogger
+from common.spool import Spool
+from http_client import OutboundClient
+
+SHIPPER_QUEUE_SIZE = 1000     # 最多暫存幾筆還沒送出的攻擊事件
+SHIPPER_WORKERS = 4           # 同時送出的 task 數
+SHIPPER_TIMEOUT_SECONDS = 2.0
+SHIPPER_RETRY_SECONDS = 5.0   # 送失敗後多久再試著直接送
+SHIPPER_REPLAY_INTERVAL = 1.0 # 每幾秒檢查一次 spool
+
+
+class AttackShipper:
+    def __init__(
+        self,
+        client: OutboundClient,
+        url: str,
+        log: DetectionLogger,
+        queue_size: int = SHIPPER_QUEUE_SIZE,
+        workers: int = SHIPPER_WORKERS,
+        timeout: float = SHIPPER_TIMEOUT_SECONDS,
+        spool: Optional[Spool] = None,
+        batch_url: Optional[str] = None,
+    ):
+        self.client = client
+        self.url = url
+        self.log = log
+        self.workers = workers
+        self.timeout = timeout
+        self.spool = spool
+        self.batch_url = batch_url
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._tasks: List[asyncio.Task] = []
+        self._down_until = 0.0
+
+    def submit(self, payload: dict) -> None:
+        """（不阻塞）排入一筆要送出的攻擊事件；queue 滿了改寫 spool（沒有 spool 才丟掉並記錄）。"""
+        if self._queue is None:
+            self._fallback(payload, "shipper not started")
+            return
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self._fallback(payload, "queue full")
+
+    def _fallback(self, payload: dict, reason: str) -> None:
+        if self.spool is not None and self.spool.append(payload):
+            self.log.log_event("ship_spooled", reason=reason, payload=payload)
+        else:
+            self.log.log_event("ship_dropped", reason=reason, payload=payload)
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self) -> None:
+        self._down_until = time.monotonic() + SHIPPER_RETRY_SECONDS
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        if self.spool is not None:
+            self.spool.start()
+            if self.batch_url:
+                self._tasks.append(asyncio.create_task(self._replay()))
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """等 queue 送完（最多 timeout 秒）再停止背景 task。"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.spool is not None:
+            self.spool.stop()
+
+    async def _run(self) -> None:
+        while True:
+            payload = await self._queue.get()
+            try:
+                if self.spool is not None and not self._available():
+                    self._fallback(payload, "logging service down")
+                    continue
+                status = await self.client.post_json(self.url, payload, timeout=self.timeout)
+                if status >= 500 and self.spool is not None:
+                    self._mark_down()
+                    self._fallback(payload, f"status {status}")
+                    continue
+                self.log.log_event("shipped", status=status, payload=payload)
+            except Exception as e:
+                self.log.log_event("ship_failed", error=str(e), payload=payload)
+                if self.spool is not None:
+                    self._mark_down()
+                    self._fallback(payload, "post failed")
+            finally:
+                self._queue.task_done()
+
+    async def _replay(self) -> None:
+        """把 spool 裡已封存的分段依序 POST 到 batch_url，成功才刪掉分段。"""
+        while True:
+            await asyncio.sleep(SHIPPER_REPLAY_INTERVAL)
+            if not self._available():
+                continue
+            for path in self.spool.segments():
+                if not await self._replay_segment(path):
+                    self._mark_down()
+                    break
+                self.spool.ack(path)
+
+    async def _replay_segment(self, path: str) -> bool:
+        # 一段最多 4 MB 的 JSON，讀檔 + 解析丟到執行緒，不卡 event loop
+        # （背景工作，用預設 executor，不跟 request 搶 BLOCKING_POOL）
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(None, Spool.read_segment, path)
+        if not records:
+            return True
+        # 整段一次送：Logging Service 那邊一個交易寫入，失敗就整段重送，不會重複
+        try:
+            status = await self.client.post_json(self.batch_url, records, timeout=self.timeout * 5)
+        except Exception as e:
+            self.log.log_event("replay_failed", error=str(e), segment=path)
+            return False
+        if status >= 300:
+            self.log.log_event("replay_failed", status=status, segment=path)
+            return False
+        self.log.log_event("replayed", count=len(records), segment=path)
+        return True
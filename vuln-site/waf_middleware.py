@@ -0,0 +1,191 @@
+# 檔案位置：/vuln-site/waf_middleware.py
+
+"""
+把 B 模組的 detect 包成 ASGI middleware。
+
+原本每個 handler 都要自己：
+  build_detection_input → detect_attack → print → send_attack_to_logger → 判斷 should_block
+而且 body 會被解析兩次（一次 Pydantic、一次手動組 body=）。
+
+現在每個 request 只在這裡做一次偵測：
+- 直接用原始的 query string 與 body bytes 組 DetectionInput
+- body 只緩衝一次，之後原封不動交給後面的 app（不會再複製一份）
+- MODE = BLOCK 且 should_block 時，在路由 / Pydantic 驗證之前就回 403
+- 全域限流額度用完（overloaded）時回 503：這是負載卸除，不算任何 IP 的攻擊
+- 沒有寫偵測的路由（/、/dashboard、不存在的路徑）也一樣會被保護
+偵測結果（detection.DetectionResult）放在 scope["state"]["detection"]，
+handler 需要時可以用 request.state.detection 取得。
+偵測輸入直接建成 DetectionInput（__slots__），不再多組一個 dict。
+"""
+
+import inspect
+import json
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from urllib.parse import parse_qsl
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from detection import DetectionInput, DetectionResult, detect
+from detection.worker_pool import DetectionUnavailable
+
+# 最多緩衝多少 body，超過直接回 413
+MAX_BODY_BYTES = 1024 * 1024
+
+ResultHook = Callable[[DetectionResult, Request], Awaitable[None]]
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _parse_body(body: bytes, content_type: str) -> Dict:
+    """
+    把原始 body bytes 攤成 detect_attack 要的 dict：
+    - application/json（物件）：直接用最外層的 key / value
+    - application/x-www-form-urlencoded：解析表單
+    - 其他：整段文字放在 "raw"
+    """
+    if not body:
+        return {}
+
+    ctype = content_type.split(";", 1)[0].strip().lower()
+    text = body.decode("utf-8", errors="replace")
+
+    if ctype == "application/json" or ctype.endswith("+json"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return {"raw": text}
+        if isinstance(data, dict):
+            return data
+        return {"raw": text}
+
+    if ctype == "application/x-www-form-urlencoded":
+        return dict(parse_qsl(text, keep_blank_values=True))
+
+    return {"raw": text}
+
+
+def build_detection_input(scope, body: bytes) -> DetectionInput:
+    """
+    轉成 B 模組 detect() 需要的 DetectionInput：
+    ip_address / url / http_method / params (dict) / body (dict) / user_agent
+    """
+    client = scope.get("client")
+    query = scope.get("query_string", b"").decode("latin-1")
+
+    return DetectionInput(
+        client[0] if client else "",
+        scope.get("path", ""),                              # 例如 /api/login
+        scope.get("method", ""),                            # GET / POST ...
+        dict(parse_qsl(query, keep_blank_values=True)) if query else None,
+        _parse_body(body, _header(scope, b"content-type")),
+        _header(scope, b"user-agent"),
+    )
+
+
+class DetectionMiddleware:
+    def __init__(
+        self,
+        app,
+        detect: Callable[[DetectionInput], Union[DetectionResult, Awaitable[DetectionResult]]] = detect,
+        on_result: Optional[ResultHook] = None,
+        max_body_bytes: int = MAX_BODY_BYTES,
+    ):
+        self.app = app
+        self.detect = detect
+        self.on_result = on_result
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await JSONResponse(status_code=413, content={"error": "Request body too large"})(
+                scope, receive, send
+            )
+            return
+
+        try:
+            detection_result = self.detect(build_detection_input(scope, body))
+            if inspect.isawaitable(detection_result):
+                # 例如 DetectionWorkerPool.detect：偵測在子行程進行
+                detection_result = await detection_result
+        except DetectionUnavailable:
+            # 偵測子行程掛掉 / 逾時：沒檢查過的請求不放行，直接回 503
+            await JSONResponse(status_code=503, content={"error": "Detection unavailable, try again later"})(
+                scope, receive, send
+            )
+            return
+        scope.setdefault("state", {})["detection"] = detection_result
+
+        if self.on_result is not None:
+            await self.on_result(detection_result, Request(scope))
+
+        if detection_result.should_block:
+            response = JSONResponse(
+                status_code=403,
+                content={
+                    "message": "Blocked by WAF",
+                    "attack_type": detection_result.attack_type,
+                    "severity": detection_result.severity,
+                    "payload": detection_result.payload,
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        if detection_result.overloaded:
+            response = JSONResponse(
+                status_code=503,
+                content={"error": "Server busy, try again later"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, self._replay(body, receive), send)
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """把 body 收完；大部分 request 只有一個 chunk，就直接用它不再複製。"""
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            if chunk:
+                size += len(chunk)
+                if size > self.max_body_bytes:
+                    return None
+                chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        if not chunks:
+            return b""
+        if len(chunks) == 1:
+            return chunks[0]
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        """第一次 receive() 回傳已緩衝的 body，之後交回原本的 receive（例如斷線通知）。"""
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive